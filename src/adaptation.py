@@ -0,0 +1,152 @@
+import numpy as np
+
+def top_c_posteriors(log_prob, top_c):
+    """
+    Sparse responsibilities from weighted component log-probabilities:
+    the top_c most likely components of every frame, renormalized to sum to one.
+
+    Args:
+        log_prob (ndarray): Shape (n_frames, n_components)
+        top_c (int): Components kept per frame
+
+    Returns:
+        tuple: (component indices int32, responsibilities float32), both
+               of shape (n_frames, top_c)
+    """
+    n_components = log_prob.shape[1]
+    top_c = min(top_c, n_components)
+    top = np.argpartition(log_prob, n_components - top_c, axis=1)[:, n_components - top_c:]
+    values = np.take_along_axis(log_prob, top, axis=1)
+    values = np.exp(values - values.max(axis=1, keepdims=True))
+    values /= values.sum(axis=1, keepdims=True)
+    return top.astype(np.int32), values.astype(np.float32)
+
+class AdaptationEngine:
+    def __init__(self, ubm, top_c=None, chunk_size=8192, dtype=np.float64):
+        """
+        Sufficient statistics for MAP adaptation, for many speakers at once.
+
+        Frames are processed chunk_size at a time: the UBM responsibilities
+        of a chunk are folded into the zeroth- and first-order statistics
+        (n_k, f_k) and dropped, so the full (n_frames, n_components)
+        responsibility matrix is never held. Frames of consecutive files
+        and speakers share a chunk, so short files and small enrollments
+        still make large matrix products.
+
+        With top_c only the top_c most likely components of every frame keep
+        a (renormalized) responsibility, so f_k costs top_c instead of
+        n_components products per frame, and the posteriors kept by
+        StreamingUBMTrainer(keep_top_c=...) can be reused without
+        evaluating the UBM again.
+
+        Args:
+            ubm (GaussianMixture): Diagonal-covariance UBM
+            top_c (int): Components kept per frame, None for exact posteriors
+            chunk_size (int): Frames per chunk
+            dtype: Type of the per-frame computations; the statistics are
+                   always accumulated in float64
+        """
+        self.ubm = ubm
+        self.top_c = top_c
+        self.chunk_size = chunk_size
+        self.dtype = np.dtype(dtype)
+        means = np.asarray(ubm.means_, dtype=np.float64)
+        precisions = 1.0 / np.asarray(ubm.covariances_, dtype=np.float64)
+        mean_precisions = means * precisions
+        self.n_components, self.n_features = means.shape
+        self.constants = (np.log(ubm.weights_) - 0.5 * (
+            self.n_features * np.log(2 * np.pi)
+            - np.sum(np.log(precisions), axis=1)
+            + np.sum(means * mean_precisions, axis=1)
+        )).astype(self.dtype)
+        self.precisions = precisions.astype(self.dtype)
+        self.mean_precisions = mean_precisions.astype(self.dtype)
+
+    def log_probabilities(self, chunk):
+        """Weighted component log-probabilities, shape (n_frames, n_components)."""
+        log_prob = np.dot(chunk, self.mean_precisions.T) + self.constants
+        log_prob -= 0.5 * np.dot(chunk ** 2, self.precisions.T)
+        return log_prob
+
+    def posteriors(self, chunk):
+        """
+        UBM responsibilities of a chunk of frames: a dense array, or a sparse
+        matrix holding the top_c components of every frame.
+        """
+        log_prob = self.log_probabilities(chunk)
+        if self.top_c:
+            return self.sparse_posteriors(top_c_posteriors(log_prob, self.top_c))
+        log_prob -= log_prob.max(axis=1, keepdims=True)
+        np.exp(log_prob, out=log_prob)
+        log_prob /= log_prob.sum(axis=1, keepdims=True)
+        return log_prob
+
+    def sparse_posteriors(self, posteriors):
+        """CSR responsibility matrix from (indices, values) of top_c_posteriors()."""
+        from scipy import sparse
+        indices, values = posteriors
+        n_frames, top_c = indices.shape
+        return sparse.csr_matrix((values.ravel(), indices.ravel(), np.arange(0, n_frames * top_c + 1, top_c)),
+                                 shape=(n_frames, self.n_components))
+
+    def _fold(self, responsibilities, frames, n_k, f_k):
+        """Add the statistics of frames to the n_k and f_k rows of one speaker in place."""
+        n_k += np.asarray(responsibilities.sum(axis=0), dtype=np.float64).ravel()
+        f_k += responsibilities.T @ frames
+
+    def _flush(self, pending, n_k, f_k):
+        """Score the pending pieces of frames as one chunk and fold them per speaker."""
+        chunk = np.concatenate([frames for _, frames in pending]).astype(self.dtype, copy=False)
+        responsibilities = self.posteriors(chunk)
+        # Consecutive pieces of one speaker fold in one product
+        speakers = np.array([speaker for speaker, _ in pending])
+        bounds = np.concatenate([[0], np.cumsum([len(frames) for _, frames in pending])])
+        firsts = np.flatnonzero(np.diff(speakers, prepend=-1))
+        for first, last in zip(firsts, np.append(firsts[1:], len(pending))):
+            start, stop = bounds[first], bounds[last]
+            self._fold(responsibilities[start:stop], chunk[start:stop],
+                       n_k[speakers[first]], f_k[speakers[first]])
+
+    def accumulate_speakers(self, blocks, n_speakers):
+        """
+        Accumulate the statistics of many speakers in one pass.
+
+        Args:
+            blocks: Iterable of (speaker index, features, posteriors) with
+                    posteriors None, or (indices, values) kept from UBM
+                    training for exactly these frames
+            n_speakers (int): Number of speakers
+
+        Returns:
+            tuple: n_k of shape (n_speakers, n_components) and f_k of shape
+                   (n_speakers, n_components, n_features), in float64
+        """
+        n_k = np.zeros((n_speakers, self.n_components))
+        f_k = np.zeros((n_speakers, self.n_components, self.n_features))
+        pending = []
+        n_pending = 0
+        for speaker, features, posteriors in blocks:
+            if posteriors is not None:
+                # No UBM evaluation needed
+                self._fold(self.sparse_posteriors(posteriors), np.asarray(features, dtype=self.dtype),
+                           n_k[speaker], f_k[speaker])
+                continue
+            start = 0
+            while start < len(features):
+                # Fill the current chunk up to chunk_size frames
+                frames = features[start:start + self.chunk_size - n_pending]
+                start += len(frames)
+                pending.append((speaker, frames))
+                n_pending += len(frames)
+                if n_pending >= self.chunk_size:
+                    self._flush(pending, n_k, f_k)
+                    pending = []
+                    n_pending = 0
+        if pending:
+            self._flush(pending, n_k, f_k)
+        return n_k, f_k
+
+    def accumulate(self, features, posteriors=None):
+        """Return the statistics (n_k, f_k) of one feature matrix."""
+        n_k, f_k = self.accumulate_speakers([(0, features, posteriors)], 1)
+        return n_k[0], f_k[0]
@@ -0,0 +1,283 @@
+import io
+import math
+import struct
+import functools
+import numpy as np
+
+# (format tag, bits per sample) of the encodings read without scipy
+_WAV_DTYPES = {
+    (1, 8): np.dtype('u1'),
+    (1, 16): np.dtype('<i2'),
+    (1, 32): np.dtype('<i4'),
+    (3, 32): np.dtype('<f4'),
+    (3, 64): np.dtype('<f8')
+}
+
+def pcm_to_float(signal):
+    """
+    Convert PCM samples to a float32 mono signal in [-1, 1].
+    Integer samples are scaled in one pass straight into the float32 output,
+    multi-channel audio is mixed down by averaging the channels.
+    """
+    signal = np.asarray(signal)
+    offset = 0.0
+    scale = None
+    if signal.dtype == np.uint8:
+        # 8-bit WAV is unsigned, centred on 128
+        offset, scale = 128.0, np.float32(1.0 / 128)
+    elif np.issubdtype(signal.dtype, np.integer):
+        scale = np.float32(1.0 / (float(np.iinfo(signal.dtype).max) + 1))
+    if signal.ndim > 1:
+        signal = signal.mean(axis=1, dtype=np.float32)
+    if scale is None:
+        return signal.astype(np.float32, copy=False)
+    if offset:
+        signal = np.subtract(signal, np.float32(offset), dtype=np.float32)
+    return np.multiply(signal, scale, dtype=np.float32)
+
+def _wav_layout(f, total_size):
+    """
+    Parse the RIFF header of a plain PCM or float WAV file.
+
+    Returns:
+        tuple: (sample rate, sample dtype, channels, data offset, number of
+               samples), or None for anything else, which is left to scipy
+    """
+    header = f.read(12)
+    if len(header) < 12 or header[:4] != b'RIFF' or header[8:12] != b'WAVE':
+        return None
+    fmt = None
+    while True:
+        chunk = f.read(8)
+        if len(chunk) < 8:
+            return None
+        chunk_id, size = chunk[:4], struct.unpack('<I', chunk[4:])[0]
+        if chunk_id == b'fmt ':
+            body = f.read(size)
+            if len(body) < 16:
+                return None
+            format_tag, channels, sample_rate, _, _, bits = struct.unpack('<HHIIHH', body[:16])
+            if format_tag == 0xFFFE and len(body) >= 26:
+                # WAVE_FORMAT_EXTENSIBLE keeps the real format in its sub-format GUID
+                format_tag = struct.unpack('<H', body[24:26])[0]
+            fmt = (_WAV_DTYPES.get((format_tag, bits)), channels, sample_rate)
+            f.seek(size % 2, 1)
+        elif chunk_id == b'data':
+            if fmt is None or fmt[0] is None or fmt[1] == 0:
+                return None
+            dtype, channels, sample_rate = fmt
+            offset = f.tell()
+            # Streamed files may declare more data than they hold
+            size = max(min(size, total_size - offset), 0)
+            return sample_rate, dtype, channels, offset, size // (dtype.itemsize * channels) * channels
+        else:
+            f.seek(size + size % 2, 1)
+
+def read_wav_data(path, mmap=False):
+    """
+    Like scipy.io.wavfile.read(), returning (sample rate, samples) with
+    shape (n,) or (n, channels). Plain PCM and float files are parsed
+    here, because importing scipy.io costs more than reading a short file;
+    other encodings (e.g. 24-bit PCM) go to scipy.
+    """
+    with open(path, 'rb') as f:
+        f.seek(0, io.SEEK_END)
+        total_size = f.tell()
+        f.seek(0)
+        layout = _wav_layout(f, total_size)
+    if layout is None:
+        from scipy.io import wavfile
+        return wavfile.read(path, mmap=mmap)
+    sample_rate, dtype, channels, offset, n_samples = layout
+    if mmap and n_samples:
+        data = np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=(n_samples,))
+    else:
+        data = np.fromfile(path, dtype=dtype, count=n_samples, offset=offset)
+    if channels > 1:
+        data = data.reshape(-1, channels)
+    return sample_rate, data
+
+def read_wav(path, mmap=True):
+    """
+    Read a PCM or float WAV file without librosa.
+
+    The file is memory-mapped, so the samples are only read once, while
+    they are converted to float.
+
+    Returns:
+        tuple: (float32 mono signal, sample rate)
+
+    Raises:
+        ValueError: If the file is not a WAV file scipy can read
+    """
+    try:
+        sample_rate, data = read_wav_data(path, mmap=mmap)
+    except ValueError:
+        if not mmap:
+            raise
+        # Some encodings (e.g. 24-bit PCM) cannot be memory-mapped
+        sample_rate, data = read_wav_data(path)
+    signal = pcm_to_float(data)
+    if np.may_share_memory(signal, data):
+        # Float files would otherwise keep the mapping open
+        signal = np.array(signal)
+    return signal, sample_rate
+
+def decode_wav_bytes(data):
+    """Decode WAV file bytes into a float32 mono signal and its sample rate."""
+    layout = _wav_layout(io.BytesIO(data), len(data))
+    if layout is None:
+        from scipy.io import wavfile
+        sample_rate, signal = wavfile.read(io.BytesIO(data))
+        return pcm_to_float(signal), sample_rate
+    sample_rate, dtype, channels, offset, n_samples = layout
+    signal = np.frombuffer(data, dtype=dtype, count=n_samples, offset=offset)
+    if channels > 1:
+        signal = signal.reshape(-1, channels)
+    return pcm_to_float(signal), sample_rate
+
+# 'polyphase' is the native resampler; 'soxr_hq' is librosa's default,
+# used by models trained before it (see AudioFeatureExtractor.resampler)
+RESAMPLERS = ('polyphase', 'soxr_hq')
+
+@functools.lru_cache(maxsize=16)
+def _polyphase_filter(up, down):
+    """
+    Anti-aliasing FIR filter for an up/down ratio, designed once: the
+    windowed-sinc low-pass of scipy.signal.resample_poly (Kaiser window,
+    beta 5.0, cutoff at the lower Nyquist rate), without importing scipy.
+    """
+    max_rate = max(up, down)
+    half_len = 10 * max_rate
+    n_taps = 2 * half_len + 1
+    cutoff = 1.0 / max_rate
+    taps = cutoff * np.sinc(cutoff * (np.arange(n_taps) - half_len)) * np.kaiser(n_taps, 5.0)
+    taps /= taps.sum()
+    taps.setflags(write=False)
+    return taps
+
+@functools.lru_cache(maxsize=16)
+def _polyphase_plan(up, down):
+    """
+    The filter split into its up phases (reversed, for dot products with
+    the input) and the number of leading outputs to drop, laid out as
+    resample_poly() pads it so output samples are centred.
+    """
+    taps = _polyphase_filter(up, down)
+    half_len = (len(taps) - 1) // 2
+    n_pre_pad = down - half_len % down
+    padded = np.concatenate([np.zeros(n_pre_pad), taps * up])
+    phases = np.zeros((up, -(-len(padded) // up)))
+    for phase in range(up):
+        phase_taps = padded[phase::up]
+        phases[phase, :len(phase_taps)] = phase_taps
+    phases = np.ascontiguousarray(phases[:, ::-1])
+    phases.setflags(write=False)
+    return phases, (half_len + n_pre_pad) // down
+
+def resample(signal, orig_sr, target_sr, method='polyphase'):
+    """
+    Resampling of a mono signal, returned as float32.
+
+    The polyphase method gives the samples of scipy.signal.resample_poly
+    with numpy only. Output k * up + first always uses the same phase of
+    the filter on inputs down samples apart, so each of the up phases is
+    one matrix-vector product over a strided view of the input. The plan
+    for each rate pair is computed once and reused, e.g. for every
+    44.1 kHz recording scored by a 16 kHz model.
+    method='soxr_hq' resamples with librosa like older models were trained.
+    """
+    if orig_sr == target_sr:
+        return signal
+    if method == 'soxr_hq':
+        import librosa
+        return librosa.resample(np.asarray(signal, dtype=np.float32), orig_sr=orig_sr,
+                                target_sr=target_sr, res_type='soxr_hq')
+    if method != 'polyphase':
+        raise ValueError(f"Unknown resampler {method}, expected one of {RESAMPLERS}")
+    divisor = math.gcd(int(orig_sr), int(target_sr))
+    up, down = int(target_sr) // divisor, int(orig_sr) // divisor
+    phases, n_skip = _polyphase_plan(up, down)
+    n_phase_taps = phases.shape[1]
+    n_output = -(-len(signal) * up // down)
+    padded = np.concatenate([np.zeros(n_phase_taps - 1), np.asarray(signal, dtype=np.float64),
+                             np.zeros(n_phase_taps + down)])
+    windows = np.lib.stride_tricks.sliding_window_view(padded, n_phase_taps)
+    resampled = np.empty(n_output, dtype=np.float32)
+    for first in range(min(up, n_output)):
+        position = (first + n_skip) * down
+        count = len(range(first, n_output, up))
+        resampled[first::up] = windows[position // up::down][:count] @ phases[position % up]
+    return resampled
+
+def load_audio(path, sample_rate=None, resampler='polyphase'):
+    """
+    Load an audio file as a float32 mono signal.
+
+    WAV files are read directly by read_wav(). Other formats, and WAV
+    encodings scipy cannot read, fall back to librosa, which is only
+    imported when that happens.
+
+    Args:
+        path (str): Audio file
+        sample_rate (int): Rate to resample to, or None to keep the file's rate
+        resampler (str): Resampling method, see resample()
+
+    Returns:
+        tuple: (signal, sample rate of the signal)
+    """
+    try:
+        signal, file_rate = read_wav(path)
+    except ValueError:
+        import librosa
+        signal, file_rate = librosa.load(path, sr=None, mono=True)
+    if sample_rate is None or file_rate == sample_rate:
+        return signal, file_rate
+    return resample(signal, file_rate, sample_rate, resampler), sample_rate
+
+def iter_audio_blocks(path, sample_rate=None, block_seconds=30.0, resampler='polyphase'):
+    """
+    Yield an audio file as consecutive float32 mono blocks at sample_rate,
+    holding about one block in memory however long the file is.
+
+    WAV files are memory-mapped and converted block by block. Blocks that
+    need resampling are cut from input overlapping the polyphase filter's
+    reach, so together they equal resample() of the whole file. Other
+    formats, and files resampled with 'soxr_hq', are loaded whole by
+    load_audio() and then split.
+
+    Args:
+        path (str): Audio file
+        sample_rate (int): Rate of the blocks, None to keep the file's rate
+        block_seconds (float): Input duration of a block
+        resampler (str): Resampling method, see resample()
+    """
+    try:
+        file_rate, data = read_wav_data(path, mmap=True)
+    except ValueError:
+        data, file_rate = load_audio(path)
+    if resampler != 'polyphase' and sample_rate and file_rate != sample_rate:
+        data, file_rate = load_audio(path, sample_rate, resampler)
+    target_rate = sample_rate or file_rate
+    if file_rate == target_rate:
+        block = max(int(block_seconds * file_rate), 1)
+        for start in range(0, len(data), block):
+            signal = pcm_to_float(data[start:start + block])
+            yield np.array(signal) if np.may_share_memory(signal, data) else signal
+        return
+
+    divisor = math.gcd(int(file_rate), int(target_rate))
+    up, down = int(target_rate) // divisor, int(file_rate) // divisor
+    # Input blocks and margins are multiples of down, so every block
+    # starts exactly on an output sample
+    block = max(int(block_seconds * file_rate) // down, 1) * down
+    half_len = (len(_polyphase_filter(up, down)) - 1) // 2
+    margin = -(-(half_len // up + 2) // down) * down
+    n_output = -(-len(data) * up // down)
+    for start in range(0, len(data), block):
+        stop = min(start + block, len(data))
+        first = max(start - margin, 0)
+        segment = pcm_to_float(data[first:min(stop + margin, len(data))])
+        offset = (start - first) * up // down
+        count = (stop - start) * up // down if stop < len(data) else n_output - start * up // down
+        yield resample(segment, file_rate, target_rate)[offset:offset + count]
@@ -0,0 +1,278 @@
+import sys
+import time
+import queue
+import asyncio
+import argparse
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+import numpy as np
+#Custom
+from speaker_identification import SpeakerIdentification, apply_unknown_threshold
+from instrumentation import instrumented
+
+class BatchingIdentifier:
+    def __init__(self, identifier, max_wait=0.005, max_batch_size=32, n_workers=4,
+                 top_c=None, normalize=True):
+        """
+        Concurrent identification that coalesces requests into shared scoring passes.
+
+        Requests are queued by submit() (or identify_async()) from any
+        thread or event loop. A dispatcher thread takes the first waiting
+        request, waits at most max_wait seconds for others to arrive, and
+        handles up to max_batch_size of them together: their features are
+        extracted in parallel on the worker pool, the speech frames of all of
+        them are concatenated and scored in one pass, split into n_workers
+        slices whose matrix products release the GIL, and every request's
+        scores are the averages of its own [start, stop) rows.
+
+        max_wait trades latency for batch size: a lone request waits at most
+        max_wait, while under bursty load many requests share one pass.
+        stats() reports the batch sizes, queueing and end-to-end latency.
+        Scores equal those of identify_features() up to summation order;
+        top_n candidate search is per query and not batched.
+
+        Args:
+            identifier (SpeakerIdentification): Trained models
+            max_wait (float): Seconds to wait for more requests after the first
+            max_batch_size (int): Most requests per scoring pass
+            n_workers (int): Threads for feature extraction and scoring
+            top_c (int): Optional top-C fast scoring, see SpeakerBank
+            normalize (bool): Normalized decisions, see identify_features()
+        """
+        self.identifier = identifier
+        self.max_wait = max_wait
+        self.max_batch_size = max_batch_size
+        self.n_workers = n_workers
+        self.top_c = top_c
+        self.normalize = normalize
+        self.executor = ThreadPoolExecutor(max_workers=n_workers)
+        self.reset_stats()
+        self._queue = queue.Queue()
+        self._dispatcher = threading.Thread(target=self._dispatch, name="identification-batcher", daemon=True)
+        self._dispatcher.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Finish the queued requests and stop the dispatcher and workers."""
+        self._queue.put(None)
+        self._dispatcher.join()
+        self.executor.shutdown(wait=True)
+
+    def reset_stats(self):
+        self._stats_lock = threading.Lock()
+        self.batch_sizes = []
+        self.queue_seconds = []
+        self.latencies = []
+
+    def stats(self):
+        """
+        Return the batching measurements since the last reset_stats().
+
+        Returns:
+            dict: requests, batches, mean batch size, and the mean, 95th
+                  percentile and max end-to-end latency and mean queueing
+                  time (first request of a batch to its dispatch) in seconds
+        """
+        with self._stats_lock:
+            latencies = np.array(self.latencies)
+            batch_sizes = np.array(self.batch_sizes)
+            queue_seconds = np.array(self.queue_seconds)
+        if len(latencies) == 0:
+            return {'requests': 0, 'batches': len(batch_sizes)}
+        return {
+            'requests': len(latencies),
+            'batches': len(batch_sizes),
+            'mean_batch_size': float(batch_sizes.mean()),
+            'mean_latency': float(latencies.mean()),
+            'p95_latency': float(np.percentile(latencies, 95)),
+            'max_latency': float(latencies.max()),
+            'mean_queue_seconds': float(queue_seconds.mean())
+        }
+
+    def submit(self, audio_path=None, signal=None, sample_rate=None):
+        """
+        Queue an audio file, or an in-memory mono signal, for identification.
+
+        Returns:
+            Future: Resolves to (speaker, scores) like identify_speaker()
+        """
+        if (audio_path is None) == (signal is None):
+            raise ValueError("Pass either audio_path or signal")
+        future = Future()
+        self._queue.put((audio_path, signal, sample_rate, future, time.perf_counter()))
+        return future
+
+    def identify(self, audio_path=None, signal=None, sample_rate=None):
+        """Blocking identification, batched with concurrent callers."""
+        return self.submit(audio_path, signal, sample_rate).result()
+
+    async def identify_async(self, audio_path=None, signal=None, sample_rate=None):
+        """Identification awaitable from an asyncio event loop."""
+        return await asyncio.wrap_future(self.submit(audio_path, signal, sample_rate))
+
+    def _dispatch(self):
+        stopping = False
+        while not stopping:
+            request = self._queue.get()
+            if request is None:
+                break
+            batch = [request]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.perf_counter()
+                try:
+                    request = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if request is None:
+                    # Handle what is queued, then stop
+                    stopping = True
+                    break
+                batch.append(request)
+            queued = time.perf_counter() - batch[0][4]
+            try:
+                self._process(batch)
+            except Exception as e:
+                for request in batch:
+                    if not request[3].done():
+                        request[3].set_exception(e)
+            finished = time.perf_counter()
+            with self._stats_lock:
+                self.batch_sizes.append(len(batch))
+                self.queue_seconds.append(queued)
+                self.latencies.extend(finished - request[4] for request in batch)
+
+    def _features(self, identifier, request):
+        audio_path, signal, sample_rate = request[:3]
+        if audio_path is not None:
+            return identifier.extract_features(audio_path)
+        return identifier.feature_extractor.extract_from_array(signal, sample_rate)
+
+    def _score(self, bank, frames):
+        """Speaker and UBM scores of a slice of the concatenated frames."""
+        if self.top_c:
+            frame_scores = bank.score_frames_top_c(frames, self.top_c)
+        else:
+            frame_scores = bank.score_frames(frames)
+        return frame_scores, bank.score_ubm_frames(frames)
+
+    @instrumented('batcher.process_batch')
+    def _process(self, batch):
+        """Extract, score and answer one batch of requests."""
+        # The model may be swapped (e.g. reloaded) between batches
+        identifier = self.identifier
+        bank = identifier.speaker_bank
+
+        # Feature extraction of every request in parallel
+        extractions = [self.executor.submit(self._features, identifier, request) for request in batch]
+        requests = []
+        features = []
+        for request, extraction in zip(batch, extractions):
+            try:
+                request_features = extraction.result()
+            except Exception as e:
+                request[3].set_exception(e)
+                continue
+            if identifier.vad_scoring:
+                request_features = identifier.select_speech(request_features)
+            if len(request_features) == 0:
+                request[3].set_exception(ValueError("No frames to score"))
+                continue
+            requests.append(request)
+            features.append(request_features)
+        if not requests:
+            return
+
+        # One scoring pass over the frames of every request
+        lengths = np.array([len(request_features) for request_features in features])
+        starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+        frames = np.concatenate(features).astype(bank.dtype, copy=False)
+        n_slices = max(1, min(self.n_workers, len(frames) // bank.frame_chunk_size))
+        bounds = np.linspace(0, len(frames), n_slices + 1).astype(int)
+        parts = list(self.executor.map(lambda bound: self._score(bank, frames[bound[0]:bound[1]]),
+                                       zip(bounds[:-1], bounds[1:])))
+        frame_scores = np.concatenate([part[0] for part in parts])
+        ubm_scores = np.concatenate([part[1] for part in parts])
+
+        # Per-request averages of their own rows
+        speaker_scores = np.add.reduceat(frame_scores, starts, axis=0, dtype=np.float64) / lengths[:, np.newaxis]
+        ubm_averages = np.add.reduceat(ubm_scores, starts, dtype=np.float64) / lengths
+        normalizer = identifier.score_normalizer if self.normalize else None
+        speaker_names = bank.speaker_names
+        for index, request in enumerate(requests):
+            if normalizer is not None:
+                normalized = normalizer.normalize(speaker_scores[index] - ubm_averages[index], None, bank)
+                result = (normalizer.decide(speaker_names, normalized), dict(zip(speaker_names, normalized)))
+            else:
+                scores = dict(zip(speaker_names, speaker_scores[index]))
+                speaker = max(scores.items(), key=lambda x: x[1])[0]
+                if self.normalize:
+                    speaker = apply_unknown_threshold(speaker, scores)
+                result = (speaker, scores)
+            request[3].set_result(result)
+
+def load_test(identifier, audio_paths, concurrency=32, **kwargs):
+    """
+    Compare sequential identify_speaker() calls with a burst of concurrent
+    requests through a BatchingIdentifier.
+
+    Args:
+        identifier (SpeakerIdentification): Trained models
+        audio_paths (list): Query files, all submitted at once
+        concurrency (int): Client threads submitting the burst
+        **kwargs: BatchingIdentifier settings
+
+    Returns:
+        dict: Sequential and batched queries per second, the batching
+              stats() and the fraction of identical decisions
+    """
+    normalize = kwargs.get('normalize', True)
+    top_c = kwargs.get('top_c')
+    start = time.perf_counter()
+    sequential = [identifier.identify_speaker(audio_path, top_c=top_c, normalize=normalize)[0]
+                  for audio_path in audio_paths]
+    sequential_seconds = time.perf_counter() - start
+
+    with BatchingIdentifier(identifier, **kwargs) as batcher:
+        with ThreadPoolExecutor(max_workers=concurrency) as clients:
+            start = time.perf_counter()
+            batched = list(clients.map(lambda audio_path: batcher.identify(audio_path)[0], audio_paths))
+            batched_seconds = time.perf_counter() - start
+        report = {
+            'requests': len(audio_paths),
+            'sequential_qps': len(audio_paths) / sequential_seconds,
+            'batched_qps': len(audio_paths) / batched_seconds,
+            'agreement': float(np.mean([a == b for a, b in zip(sequential, batched)])),
+            'batching': batcher.stats()
+        }
+    print(f"Sequential {report['sequential_qps']:.1f} queries/s, batched {report['batched_qps']:.1f} queries/s, "
+          f"mean batch {report['batching']['mean_batch_size']:.1f}, "
+          f"p95 latency {report['batching']['p95_latency'] * 1000:.1f} ms, "
+          f"agreement {report['agreement'] * 100:.1f}%")
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test of batched concurrent identification")
+    parser.add_argument('audio', nargs='+', help="Query .wav files, or one directory of speaker folders")
+    parser.add_argument('--model', default="speaker_models.pkl", help=".pkl file or model directory")
+    parser.add_argument('--concurrency', type=int, default=32, help="Concurrent client threads")
+    parser.add_argument('--max-wait', type=float, default=0.005, help="Batching window in seconds")
+    parser.add_argument('--max-batch', type=int, default=32, help="Most requests per scoring pass")
+    parser.add_argument('--workers', type=int, default=4, help="Extraction and scoring threads")
+    parser.add_argument('--top-c', type=int, default=None, help="Enable top-C fast scoring")
+    args = parser.parse_args(argv)
+
+    identifier = SpeakerIdentification.load_models(args.model)
+    audio_paths = args.audio
+    if len(audio_paths) == 1 and not audio_paths[0].endswith('.wav'):
+        audio_paths = [audio_path for _, paths in identifier.list_corpus(audio_paths[0]) for audio_path in paths]
+    load_test(identifier, audio_paths, args.concurrency, max_wait=args.max_wait,
+              max_batch_size=args.max_batch, n_workers=args.workers, top_c=args.top_c)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,334 @@
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import itertools
+import contextlib
+import numpy as np
+from scipy.io import wavfile
+from scipy.signal import lfilter
+#Custom
+from speaker_identification import SpeakerIdentification
+from speaker_bank import SpeakerBank, QuantizedSpeakerBank
+from ubm_training import StreamingUBMTrainer
+
+# 2: ubm_fit times train_ubm(), the fixed-iteration streaming fit is ubm_fit_streaming
+# 3: log_mel and cepstra time the extractor's methods, replacing mel_dct and deltas
+BENCHMARK_VERSION = 3
+
+def synthesize_voice(speaker, duration, sample_rate=16000, seed=0):
+    """
+    Deterministic synthetic speech-like signal for one speaker.
+
+    A glottal pulse train at a speaker-specific pitch with vibrato is shaped
+    by speaker-specific formant resonators and cut into syllables separated
+    by short pauses, so the signal has voiced frames, silence and a spectral
+    envelope that differs between speakers.
+
+    Args:
+        speaker (int): Speaker index, sets pitch and formants
+        duration (float): Length in seconds
+        sample_rate (int): Sample rate of the signal
+        seed (int): Seed for the syllable timing and noise
+
+    Returns:
+        ndarray: float32 signal in [-1, 1]
+    """
+    voice = np.random.RandomState(1000 + speaker)
+    rng = np.random.RandomState(seed)
+    n_samples = int(duration * sample_rate)
+    t = np.arange(n_samples) / sample_rate
+
+    # Source: pulse train from the integrated instantaneous frequency
+    pitch = voice.uniform(90, 240)
+    f0 = pitch * (1 + 0.05 * np.sin(2 * np.pi * voice.uniform(3, 6) * t))
+    phase = np.cumsum(f0) / sample_rate
+    source = (np.diff(np.floor(phase), prepend=0) > 0).astype(np.float64)
+    source += 0.02 * rng.standard_normal(n_samples)
+
+    # Filter: cascade of two-pole formant resonators
+    signal = source
+    for base in (500, 1500, 2500, 3500):
+        frequency = base * voice.uniform(0.8, 1.2)
+        radius = np.exp(-np.pi * voice.uniform(60, 150) / sample_rate)
+        a = [1, -2 * radius * np.cos(2 * np.pi * frequency / sample_rate), radius ** 2]
+        signal = lfilter([1 - radius], a, signal)
+
+    # Syllable envelope with pauses
+    envelope = np.zeros(n_samples)
+    position = 0
+    while position < n_samples:
+        length = int(rng.uniform(0.15, 0.4) * sample_rate)
+        envelope[position:position + length] = np.hanning(length)[:n_samples - position]
+        position += length + int(rng.uniform(0.05, 0.3) * sample_rate)
+    signal = signal * envelope
+
+    return (0.9 * signal / (np.abs(signal).max() + 1e-12)).astype(np.float32)
+
+def generate_corpus(data_dir, n_speakers, n_files, duration, sample_rate=16000, seed=0):
+    """
+    Write a synthetic corpus laid out like audio/: one directory per speaker
+    holding n_files 16-bit .wav files. The same arguments give the same files.
+
+    Returns:
+        list: (speaker, [audio paths]) pairs
+    """
+    corpus = []
+    for speaker in range(n_speakers):
+        speaker_dir = os.path.join(data_dir, f"speaker{speaker:03d}")
+        os.makedirs(speaker_dir, exist_ok=True)
+        audio_paths = []
+        for index in range(n_files):
+            audio_path = os.path.join(speaker_dir, f"{index:03d}.wav")
+            signal = synthesize_voice(speaker, duration, sample_rate, seed=seed + 7919 * speaker + index)
+            wavfile.write(audio_path, sample_rate, (signal * 32767).astype(np.int16))
+            audio_paths.append(audio_path)
+        corpus.append((os.path.basename(speaker_dir), audio_paths))
+    return corpus
+
+def time_call(function, repeat=5):
+    """Run function repeat times, return (median, min) seconds and the last result."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings)), float(np.min(timings)), result
+
+class Benchmark:
+    def __init__(self, durations=(5.0, 30.0), n_components=(64, 256), n_speakers=(2, 8),
+                 files_per_speaker=3, repeat=5, ubm_iterations=5, seed=0):
+        """
+        Time every pipeline stage on synthetic audio.
+
+        Feature stages are measured for every duration; model stages (UBM
+        fit, adaptation, identification, model save/load) for every
+        combination of n_components and n_speakers on files of the first
+        duration. Each stage reports the median and minimum over repeat runs.
+
+        Args:
+            durations (tuple): File lengths in seconds
+            n_components (tuple): UBM sizes
+            n_speakers (tuple): Numbers of enrolled speakers
+            files_per_speaker (int): Training files per speaker
+            repeat (int): Runs per timed stage (UBM fits at most 3)
+            ubm_iterations (int): Fixed number of EM passes of the streaming UBM fit
+            seed (int): Seed of the synthetic audio
+        """
+        self.durations = list(durations)
+        self.n_components = list(n_components)
+        self.n_speakers = list(n_speakers)
+        self.files_per_speaker = files_per_speaker
+        self.repeat = repeat
+        self.ubm_iterations = ubm_iterations
+        self.seed = seed
+        self.results = []
+
+    def record(self, stage, params, median, minimum, **extra):
+        result = dict({'stage': stage, 'params': params, 'seconds': median, 'min_seconds': minimum}, **extra)
+        self.results.append(result)
+        print(f"{stage:<20} {json.dumps(params):<45} {median * 1000:10.2f} ms")
+
+    def run_feature_stages(self, work_dir):
+        """Time loading and each feature extraction step for every duration."""
+        identifier = SpeakerIdentification()
+        extractor = identifier.feature_extractor
+        for duration in self.durations:
+            audio_path = os.path.join(work_dir, f"features_{duration:g}s.wav")
+            signal = synthesize_voice(0, duration, extractor.sample_rate, self.seed)
+            wavfile.write(audio_path, extractor.sample_rate, (signal * 32767).astype(np.int16))
+            params = {'duration': duration}
+            repeat = self.repeat
+
+            median, minimum, signal = time_call(lambda: extractor.load_audio(audio_path), repeat)
+            self.record('audio_load', params, median, minimum)
+
+            median, minimum, frames = time_call(
+                lambda: np.ascontiguousarray(extractor.framing(extractor.preemphasis(signal))), repeat)
+            self.record('preemphasis_framing', params, median, minimum, n_frames=len(frames))
+
+            frames = np.asarray(frames, dtype=extractor.dtype)
+            median, minimum, power_spec = time_call(
+                lambda: extractor.power_spectrum(extractor.apply_window(frames)), repeat)
+            self.record('window_fft', params, median, minimum)
+
+            median, minimum, log_mel_spec = time_call(lambda: extractor.log_mel_spectrum(power_spec), repeat)
+            self.record('log_mel', params, median, minimum)
+
+            # The DCT and the deltas are one product in the extractor
+            median, minimum, _ = time_call(lambda: extractor.cepstra(log_mel_spec), repeat)
+            self.record('cepstra', params, median, minimum)
+
+            median, minimum, _ = time_call(lambda: extractor.extract_features(audio_path), repeat)
+            self.record('extract_features', params, median, minimum,
+                        audio_seconds_per_second=duration / median)
+
+    def run_model_stages(self, work_dir):
+        """Time UBM fit, adaptation, identification and model save/load."""
+        duration = self.durations[0]
+        max_speakers = max(self.n_speakers)
+        corpus = generate_corpus(os.path.join(work_dir, 'corpus'), max_speakers,
+                                 self.files_per_speaker, duration, seed=self.seed)
+        test_paths = generate_corpus(os.path.join(work_dir, 'test'), 1, 1, duration,
+                                     seed=self.seed + 1)[0][1]
+        extractor = SpeakerIdentification().feature_extractor
+        corpus_features = {speaker: np.vstack([extractor.extract_features(audio_path)
+                                               for audio_path in audio_paths])
+                           for speaker, audio_paths in corpus}
+
+        for n_components, n_speakers in itertools.product(self.n_components, self.n_speakers):
+            params = {'n_components': n_components, 'n_speakers': n_speakers, 'duration': duration}
+            speakers = [speaker for speaker, _ in corpus[:n_speakers]]
+            identifier = SpeakerIdentification(n_components=n_components)
+
+            # UBM fit as train() runs it: seeded initializations fitted to convergence
+            speaker_features = {speaker: [corpus_features[speaker]] for speaker in speakers}
+            def fit_ubm():
+                with contextlib.redirect_stdout(io.StringIO()):
+                    identifier.train_ubm(None, speaker_features)
+                return identifier.ubm
+            median, minimum, ubm = time_call(fit_ubm, min(self.repeat, 3))
+            self.record('ubm_fit', params, median, minimum, n_iter=int(ubm.n_iter_))
+
+            # Streaming EM with a fixed number of passes (tol=0 never stops early)
+            blocks = [corpus_features[speaker] for speaker in speakers]
+            trainer = StreamingUBMTrainer(n_components=n_components, max_iter=self.ubm_iterations,
+                                          tol=0.0, random_state=self.seed)
+            median, minimum, _ = time_call(lambda: trainer.fit(lambda: iter(blocks)), min(self.repeat, 3))
+            self.record('ubm_fit_streaming', params, median, minimum,
+                        seconds_per_iteration=median / self.ubm_iterations)
+
+            median, minimum, _ = time_call(
+                lambda: identifier.adapt_model(corpus_features[speakers[0]], ubm), self.repeat)
+            self.record('adapt_model', params, median, minimum)
+
+            # Every speaker in one batched pass, exact and with top-5 posteriors
+            for top_c in (None, 5):
+                identifier.adaptation_top_c = top_c
+                median, minimum, _ = time_call(lambda: identifier.adapt_speakers(
+                    ((index, corpus_features[speaker], None) for index, speaker in enumerate(speakers)),
+                    len(speakers)), self.repeat)
+                self.record('adapt_speakers' + ('_top_c' if top_c else ''), params, median, minimum)
+            identifier.adaptation_top_c = None
+
+            identifier.speaker_bank = SpeakerBank.from_ubm(ubm)
+            identifier.speaker_bank.set_speakers(
+                speakers, [identifier.adapt_means(corpus_features[speaker], ubm) for speaker in speakers])
+            median, minimum, _ = time_call(lambda: identifier.identify_speaker(test_paths[0]), self.repeat)
+            self.record('identify_speaker', params, median, minimum)
+
+            # Full-precision and compact banks on the same features
+            test_features = extractor.extract_features(test_paths[0])
+            full_bank = identifier.speaker_bank
+            for quantization in (None, 'int8'):
+                bank = full_bank if quantization is None else QuantizedSpeakerBank.from_bank(full_bank, quantization)
+                median, minimum, _ = time_call(lambda: bank.score(test_features), self.repeat)
+                self.record('bank_score' + (f'_{quantization}' if quantization else ''), params, median, minimum,
+                            bytes_per_speaker=bank.nbytes / n_speakers)
+
+            for suffix in ('.pkl', ''):
+                model_path = os.path.join(work_dir, f"models_{n_components}_{n_speakers}{suffix}")
+                median, minimum, _ = time_call(lambda: identifier.save_models(model_path), self.repeat)
+                self.record('model_save' + ('_pkl' if suffix else '_dir'), params, median, minimum)
+                median, minimum, _ = time_call(lambda: SpeakerIdentification.load_models(model_path), self.repeat)
+                self.record('model_load' + ('_pkl' if suffix else '_dir'), params, median, minimum)
+
+    def run(self):
+        """Run every stage and return the JSON-serialisable report."""
+        self.results = []
+        with tempfile.TemporaryDirectory() as work_dir:
+            self.run_feature_stages(work_dir)
+            self.run_model_stages(work_dir)
+        return {
+            'version': BENCHMARK_VERSION,
+            'environment': {
+                'python': platform.python_version(),
+                'numpy': np.__version__,
+                'platform': platform.platform(),
+                'cpu_count': os.cpu_count()
+            },
+            'config': {
+                'durations': self.durations,
+                'n_components': self.n_components,
+                'n_speakers': self.n_speakers,
+                'files_per_speaker': self.files_per_speaker,
+                'repeat': self.repeat,
+                'ubm_iterations': self.ubm_iterations,
+                'seed': self.seed
+            },
+            'results': self.results
+        }
+
+def _result_key(result):
+    return result['stage'], json.dumps(result['params'], sort_keys=True)
+
+def compare(report, baseline, threshold=0.2, min_difference=0.002):
+    """
+    Compare stage times against a baseline report. The fastest run of each
+    stage is compared, since it is the least affected by other load, and
+    slowdowns under min_difference seconds are treated as timer noise.
+
+    Returns:
+        list: (stage, params, baseline seconds, seconds, ratio) of every
+              stage slower than the baseline by more than threshold
+    """
+    if baseline.get('version') != report['version']:
+        print(f"Baseline is from benchmark version {baseline.get('version')}, not {report['version']}: "
+              f"stages that changed meaning are not comparable")
+    baseline_results = {_result_key(result): result for result in baseline['results']}
+    regressions = []
+    print(f"\n{'stage':<20} {'params':<45} {'baseline':>10} {'current':>10} {'ratio':>7}")
+    for result in report['results']:
+        reference = baseline_results.get(_result_key(result))
+        if reference is None:
+            continue
+        seconds, reference_seconds = result['min_seconds'], reference['min_seconds']
+        ratio = seconds / reference_seconds if reference_seconds > 0 else float('inf')
+        regressed = ratio > 1 + threshold and seconds - reference_seconds > min_difference
+        flag = " REGRESSION" if regressed else ""
+        print(f"{result['stage']:<20} {json.dumps(result['params']):<45} "
+              f"{reference_seconds * 1000:8.2f}ms {seconds * 1000:8.2f}ms {ratio:6.2f}x{flag}")
+        if flag:
+            regressions.append((result['stage'], result['params'], reference_seconds, seconds, ratio))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark every pipeline stage on synthetic audio")
+    parser.add_argument('--output', default="benchmark.json", help="Where to write the JSON report")
+    parser.add_argument('--baseline', default=None, help="Previous report to compare against")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="Allowed slowdown relative to the baseline (0.2 = 20%%)")
+    parser.add_argument('--min-difference', type=float, default=0.002,
+                        help="Ignore slowdowns smaller than this many seconds")
+    parser.add_argument('--durations', type=float, nargs='+', default=[5.0, 30.0])
+    parser.add_argument('--components', type=int, nargs='+', default=[64, 256])
+    parser.add_argument('--speakers', type=int, nargs='+', default=[2, 8])
+    parser.add_argument('--files-per-speaker', type=int, default=3)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--ubm-iterations', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    benchmark = Benchmark(args.durations, args.components, args.speakers, args.files_per_speaker,
+                          args.repeat, args.ubm_iterations, args.seed)
+    report = benchmark.run()
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote {len(report['results'])} results to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold, args.min_difference)
+        if regressions:
+            print(f"\n{len(regressions)} stages regressed by more than {args.threshold * 100:.0f}%")
+            return 1
+        print("\nNo regressions")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
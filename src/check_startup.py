@@ -0,0 +1,132 @@
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Entry points of the identification path; train+predict.py is loaded from
+# its file since its name is not importable
+ENTRY_POINTS = ['speaker_identification', 'streaming_identification', 'identification_client',
+                'identification_server', 'batch_identification', 'segmentation']
+SCRIPTS = ['train+predict.py']
+
+# Heavy or optional packages that importing the entry points must not load
+FORBIDDEN_ON_IMPORT = ['sklearn', 'joblib', 'librosa', 'python_speech_features', 'pyaudio', 'pynput',
+                       'scipy.io', 'scipy.signal', 'scipy.sparse', 'scipy.fftpack']
+# ...and that identifying a WAV file with a model directory must not load
+FORBIDDEN_ON_IDENTIFY = ['sklearn', 'joblib', 'librosa', 'python_speech_features', 'pyaudio', 'pynput',
+                         'scipy.signal']
+
+# Written before the checked code runs, so interpreter start-up is not counted
+MARKER = 'check_startup: begin'
+
+def _import_code():
+    lines = [f"import sys; sys.stderr.write({MARKER!r} + '\\n')", "import importlib, importlib.util"]
+    lines += [f"import {module}" for module in ENTRY_POINTS]
+    for index, script in enumerate(SCRIPTS):
+        lines.append(f"spec = importlib.util.spec_from_file_location('script_{index}', {script!r})")
+        lines.append("spec.loader.exec_module(importlib.util.module_from_spec(spec))")
+    return "\n".join(lines)
+
+def _run(code, importtime=False):
+    """Run code in a fresh interpreter in this directory and return the completed process."""
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', code]
+    return subprocess.run(command, cwd=HERE, capture_output=True, text=True, check=True)
+
+def parse_importtime(stderr):
+    """
+    Return {module: cumulative seconds} of the top-level imports in
+    -X importtime output after MARKER, i.e. what the checked code paid for.
+    """
+    cumulative = {}
+    lines = stderr.splitlines()
+    if MARKER in lines:
+        lines = lines[lines.index(MARKER) + 1:]
+    for line in lines:
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        _, microseconds, name = line[len('import time:'):].split('|')
+        if name.startswith(' ') and not name.startswith('  '):
+            cumulative[name.strip()] = int(microseconds) / 1e6
+    return cumulative
+
+def loaded(modules, forbidden):
+    """Forbidden packages (or their submodules) present in a list of loaded modules."""
+    return sorted({name for name in forbidden
+                   if any(module == name or module.startswith(name + '.') for module in modules)})
+
+def check_imports(budget):
+    """Import every entry point in a fresh interpreter, timed and checked for heavy modules."""
+    code = _import_code()
+    imports = parse_importtime(_run(code, importtime=True).stderr)
+    seconds = sum(imports.values())
+    modules = json.loads(_run(code + "\nimport sys, json\nprint(json.dumps(list(sys.modules)))").stdout)
+    report = {
+        'import_seconds': seconds,
+        'budget': budget,
+        'slowest': sorted(imports.items(), key=lambda item: -item[1])[:5],
+        'forbidden': loaded(modules, FORBIDDEN_ON_IMPORT)
+    }
+    report['ok'] = seconds <= budget and not report['forbidden']
+    return report
+
+def check_identify(model_path, audio_path, budget):
+    """Cold start of a short-lived job: import, load a model and identify one file."""
+    code = "\n".join([
+        "import sys, json, time",
+        "start = time.perf_counter()",
+        "from speaker_identification import SpeakerIdentification",
+        f"identifier = SpeakerIdentification.load_models({os.path.abspath(model_path)!r})",
+        f"identifier.identify_speaker({os.path.abspath(audio_path)!r}, normalize=True)",
+        "print(json.dumps({'seconds': time.perf_counter() - start, 'modules': list(sys.modules)}))"
+    ])
+    result = json.loads(_run(code).stdout)
+    report = {
+        'identify_seconds': result['seconds'],
+        'budget': budget,
+        # Unpickling .pkl models needs scikit-learn and joblib by design
+        'forbidden': loaded(result['modules'], FORBIDDEN_ON_IDENTIFY) if os.path.isdir(model_path) else []
+    }
+    if os.path.isdir(model_path):
+        # Models trained before the native resampler resample with librosa
+        from model_io import read_header
+        report['resampler'] = read_header(model_path)['extractor'].get('resampler', 'soxr_hq')
+    report['ok'] = result['seconds'] <= budget and not report['forbidden']
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the start-up time of the identification entry points")
+    parser.add_argument('--budget', type=float, default=0.5,
+                        help="Allowed seconds to import every entry point")
+    parser.add_argument('--model', default=None, help="Model directory (or .pkl) for the cold identify check")
+    parser.add_argument('--audio', default=None, help="WAV file for the cold identify check")
+    parser.add_argument('--identify-budget', type=float, default=1.0,
+                        help="Allowed seconds to import, load the model and identify one file")
+    args = parser.parse_args(argv)
+
+    ok = True
+    report = check_imports(args.budget)
+    print(f"Import of {len(ENTRY_POINTS) + len(SCRIPTS)} entry points: {report['import_seconds']:.3f}s "
+          f"(budget {args.budget:.3f}s)")
+    for name, seconds in report['slowest']:
+        print(f"  {name:<30} {seconds * 1000:8.1f} ms")
+    if report['forbidden']:
+        print(f"  imported at start-up: {', '.join(report['forbidden'])}")
+    ok &= report['ok']
+
+    if args.model and args.audio:
+        report = check_identify(args.model, args.audio, args.identify_budget)
+        print(f"Cold identify: {report['identify_seconds']:.3f}s (budget {args.identify_budget:.3f}s)")
+        if report['forbidden']:
+            print(f"  imported while identifying: {', '.join(report['forbidden'])}")
+        if report.get('resampler') == 'soxr_hq':
+            print("  the model resamples with librosa (soxr_hq); retrain it to use the native resampler")
+        ok &= report['ok']
+
+    print("OK" if ok else "FAILED")
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,291 @@
+import os
+import sys
+import csv
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
+#Custom
+from speaker_identification import SpeakerIdentification
+from feature_cache import FeatureCache
+from feature_store import FeatureStore, feature_config
+
+def read_manifest(path):
+    """
+    Read a manifest of labelled audio files.
+
+    Every line is "audio_path,label"; a first line "path,label" is skipped
+    as a header. Relative paths are resolved against the manifest directory.
+    """
+    base_dir = os.path.dirname(os.path.abspath(path))
+    items = []
+    with open(path, newline='') as f:
+        for row in csv.reader(f):
+            if not row or row[0].startswith('#'):
+                continue
+            if not items and [cell.strip() for cell in row[:2]] == ['path', 'label']:
+                continue
+            audio_path, label = row[0].strip(), row[1].strip()
+            items.append((os.path.join(base_dir, audio_path), label))
+    return items
+
+def list_labelled_files(source, identifier):
+    """Return (audio_path, label) pairs from a directory tree, a FeatureStore or a manifest file."""
+    if isinstance(source, FeatureStore):
+        return [(audio_path, speaker) for speaker, audio_path, _ in source.iter_files()]
+    if os.path.isdir(source):
+        return [(audio_path, speaker)
+                for speaker, audio_paths in identifier.list_corpus(source)
+                for audio_path in audio_paths]
+    return read_manifest(source)
+
+def equal_error_rate(target_scores, nontarget_scores):
+    """
+    Return the equal error rate and the threshold where it is reached.
+    Trials scoring at or above the threshold are accepted.
+    """
+    target_scores = np.asarray(target_scores, dtype=np.float64)
+    nontarget_scores = np.asarray(nontarget_scores, dtype=np.float64)
+    if len(target_scores) == 0 or len(nontarget_scores) == 0:
+        return float('nan'), float('nan')
+
+    # Sweep the threshold over every trial score, lowest first
+    scores = np.concatenate([target_scores, nontarget_scores])
+    is_target = np.concatenate([np.ones(len(target_scores)), np.zeros(len(nontarget_scores))])
+    order = np.argsort(scores, kind='mergesort')
+    scores = scores[order]
+    is_target = is_target[order]
+    # Rejecting everything below scores[i]: misses and false alarms
+    false_rejections = np.concatenate([[0], np.cumsum(is_target)])[:-1] / len(target_scores)
+    false_acceptances = 1 - np.concatenate([[0], np.cumsum(1 - is_target)])[:-1] / len(nontarget_scores)
+
+    index = np.argmin(np.abs(false_rejections - false_acceptances))
+    eer = (false_rejections[index] + false_acceptances[index]) / 2
+    return float(eer), float(scores[index])
+
+class BatchEvaluator:
+    def __init__(self, identifier, n_jobs=-1, score_workers=None, top_c=None, max_pending=256):
+        """
+        Identify a large labelled set of files and measure the results.
+
+        Features are extracted on a process pool and scored on a thread pool
+        at the same time. Every scoring thread shares the identifier's one
+        speaker bank, whose matrix products release the GIL. At most
+        max_pending files are held in memory, whatever the size of the set.
+
+        Args:
+            identifier (SpeakerIdentification): Trained models
+            n_jobs (int): Extraction processes (-1 for all cores, 1 for none)
+            score_workers (int): Scoring threads (default: number of cores)
+            top_c (int): Optional top-C fast scoring, see SpeakerBank
+            max_pending (int): Files in flight per stage
+        """
+        self.identifier = identifier
+        self.n_jobs = os.cpu_count() if n_jobs == -1 else n_jobs
+        self.score_workers = score_workers or os.cpu_count()
+        self.top_c = top_c
+        self.max_pending = max_pending
+
+    def score_features(self, features):
+        """
+        Score one file against every speaker and the UBM.
+
+        Returns:
+            tuple: (speaker scores, UBM score, number of scored frames)
+        """
+        identifier = self.identifier
+        if identifier.vad_scoring:
+            features = identifier.select_speech(features)
+        bank = identifier.speaker_bank
+        return bank.score(features, top_c=self.top_c), bank.score_ubm(features), len(features)
+
+    def duration(self, features):
+        """Audio duration in seconds covered by a feature matrix."""
+        extractor = self.identifier.feature_extractor
+        if len(features) == 0:
+            return 0.0
+        return ((len(features) - 1) * extractor.frame_stride + extractor.frame_size) / extractor.sample_rate
+
+    def run(self, items, features=None):
+        """
+        Identify every labelled file.
+
+        Args:
+            items (list): (audio_path, label) pairs
+            features: Optional iterable of the items' features (e.g. from a
+                      FeatureStore), skipping extraction
+
+        Returns:
+            list: One row dict per file with its label, prediction, duration,
+                  UBM score and a score per speaker, in input order
+        """
+        identifier = self.identifier
+        speaker_names = list(identifier.speaker_bank.speaker_names)
+        audio_paths = [audio_path for audio_path, _ in items]
+
+        def make_row(index, future, duration):
+            scores, ubm_score, n_frames = future.result()
+            audio_path, label = items[index]
+            row = {
+                'path': audio_path,
+                'label': label,
+                'predicted': speaker_names[int(np.argmax(scores))],
+                'duration': duration,
+                'n_frames': n_frames,
+                'ubm_score': ubm_score
+            }
+            row.update({f'score_{name}': float(score) for name, score in zip(speaker_names, scores)})
+            return row
+
+        rows = []
+        extract_executor = identifier.executor
+        own_executor = extract_executor is None and self.n_jobs > 1 and features is None
+        if own_executor:
+            extract_executor = ProcessPoolExecutor(max_workers=self.n_jobs)
+        try:
+            with ThreadPoolExecutor(max_workers=self.score_workers) as score_executor:
+                pending = deque()
+                extracted = features
+                if extracted is None:
+                    extracted = identifier.extract_files(audio_paths, extract_executor, self.max_pending)
+                for index, features in enumerate(extracted):
+                    future = score_executor.submit(self.score_features, features)
+                    pending.append((index, future, self.duration(features)))
+                    if len(pending) >= self.max_pending:
+                        rows.append(make_row(*pending.popleft()))
+                    if (index + 1) % 1000 == 0:
+                        print(f"Scored {index + 1}/{len(items)} files")
+                while pending:
+                    rows.append(make_row(*pending.popleft()))
+        finally:
+            if own_executor:
+                extract_executor.shutdown()
+        return rows
+
+    def evaluate(self, source, output_path=None):
+        """
+        Identify a labelled directory tree or manifest and report metrics.
+
+        Args:
+            source (str): Directory with one sub-directory per speaker, a
+                          manifest file (see read_manifest()), or a feature
+                          store directory (or FeatureStore) built with the
+                          model's extractor configuration
+            output_path (str): Optional per-file score table (.csv or .parquet)
+
+        Returns:
+            dict: Accuracy, confusion matrix, EER and throughput
+        """
+        features = None
+        if not isinstance(source, FeatureStore) and FeatureStore.is_store(source):
+            source = FeatureStore(source)
+        if isinstance(source, FeatureStore):
+            if not source.matches(feature_config(self.identifier.feature_extractor)):
+                raise ValueError(f"Feature store {source.path} was built with a different extractor configuration")
+            features = (features for _, _, features in source.iter_files())
+        items = list_labelled_files(source, self.identifier)
+        if not items:
+            raise ValueError(f"No labelled audio files found in {source}")
+
+        start_time = time.perf_counter()
+        start_cpu = time.process_time()
+        rows = self.run(items, features)
+        elapsed = time.perf_counter() - start_time
+        cpu = time.process_time() - start_cpu
+
+        if output_path:
+            write_scores(rows, output_path)
+        report = compute_metrics(rows, list(self.identifier.speaker_bank.speaker_names))
+        total_duration = sum(row['duration'] for row in rows)
+        report.update({
+            'seconds': elapsed,
+            'cpu_seconds': cpu,
+            'files_per_second': len(rows) / elapsed,
+            'audio_seconds_per_second': total_duration / elapsed
+        })
+        print_report(report)
+        return report
+
+def compute_metrics(rows, speaker_names):
+    """
+    Accuracy, confusion matrix and EER of evaluated rows.
+
+    Accuracy and the confusion matrix only count files whose label is an
+    enrolled speaker. The EER pools one target trial (the labelled speaker)
+    and one non-target trial per other speaker for every such file, scored
+    as the log-likelihood ratio against the UBM.
+    """
+    enrolled = set(speaker_names)
+    known_rows = [row for row in rows if row['label'] in enrolled]
+    confusion = {label: {predicted: 0 for predicted in speaker_names} for label in speaker_names}
+    target_scores = []
+    nontarget_scores = []
+    for row in known_rows:
+        confusion[row['label']][row['predicted']] += 1
+        for name in speaker_names:
+            llr = row[f'score_{name}'] - row['ubm_score']
+            (target_scores if name == row['label'] else nontarget_scores).append(llr)
+
+    correct = sum(confusion[label][label] for label in speaker_names)
+    eer, eer_threshold = equal_error_rate(target_scores, nontarget_scores)
+    return {
+        'n_files': len(rows),
+        'n_scored': len(known_rows),
+        'accuracy': correct / len(known_rows) if known_rows else float('nan'),
+        'confusion': confusion,
+        'eer': eer,
+        'eer_threshold': eer_threshold,
+        'audio_seconds': sum(row['duration'] for row in rows)
+    }
+
+def write_scores(rows, path):
+    """Write per-file rows as CSV, or as Parquet when path ends in .parquet."""
+    if path.endswith('.parquet'):
+        # Optional dependency, only needed for Parquet output
+        import pandas as pd
+        pd.DataFrame(rows).to_parquet(path, index=False)
+        return
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+        writer.writeheader()
+        writer.writerows(rows)
+
+def print_report(report):
+    """Print an evaluation report."""
+    confusion = report['confusion']
+    names = list(confusion.keys())
+    width = max([len(name) for name in names] + [9])
+    print("\nConfusion matrix (rows: label, columns: predicted)")
+    print(" " * width + " " + " ".join(f"{name:>{width}}" for name in names))
+    for label in names:
+        print(f"{label:>{width}} " + " ".join(f"{confusion[label][name]:>{width}}" for name in names))
+    print(f"\nFiles: {report['n_files']} ({report['n_scored']} with an enrolled label), "
+          f"{report['audio_seconds']:.1f}s of audio")
+    print(f"Accuracy: {report['accuracy'] * 100:.2f}%")
+    print(f"EER: {report['eer'] * 100:.2f}% (LLR threshold {report['eer_threshold']:.3f})")
+    print(f"Throughput: {report['files_per_second']:.1f} files/s, "
+          f"{report['audio_seconds_per_second']:.1f} audio-seconds/s "
+          f"({report['seconds']:.2f}s wall, {report['cpu_seconds']:.2f}s CPU)")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch speaker identification and evaluation")
+    parser.add_argument('source', help="Directory with one sub-directory per speaker, a path,label manifest "
+                                       "or a feature store directory")
+    parser.add_argument('--model', default="speaker_models.pkl", help=".pkl file or model directory")
+    parser.add_argument('--output', default=None, help="Per-file scores (.csv or .parquet)")
+    parser.add_argument('--jobs', type=int, default=-1, help="Extraction processes")
+    parser.add_argument('--score-workers', type=int, default=None, help="Scoring threads")
+    parser.add_argument('--top-c', type=int, default=None, help="Enable top-C fast scoring")
+    parser.add_argument('--cache-dir', default=None, help="Feature cache directory")
+    args = parser.parse_args(argv)
+
+    identifier = SpeakerIdentification.load_models(args.model)
+    if args.cache_dir:
+        identifier.feature_cache = FeatureCache(args.cache_dir)
+    evaluator = BatchEvaluator(identifier, n_jobs=args.jobs, score_workers=args.score_workers,
+                               top_c=args.top_c)
+    evaluator.evaluate(args.source, args.output)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+import os
+import hashlib
+import json
+import numpy as np
+
+# Bumped when extraction changes without a config change (2: native WAV loader)
+CACHE_VERSION = 2
+
+class FeatureCache:
+    def __init__(self, cache_dir, max_bytes=1024 ** 3, dtype=np.float32):
+        """
+        Persistent on-disk cache for extracted feature matrices.
+
+        Entries are keyed by the SHA-1 of the audio file content plus the
+        extractor configuration, so a change to any extractor parameter
+        never returns stale features. Least recently used entries are
+        evicted once the cache grows past max_bytes.
+
+        Args:
+            cache_dir (str): Directory holding the cached .npy files
+            max_bytes (int): Size budget of the cache in bytes
+            dtype: Storage dtype of the cached arrays
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.dtype = np.dtype(dtype)
+        os.makedirs(cache_dir, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+        self.total_bytes = sum(size for _, size, _ in self._entries())
+
+    @staticmethod
+    def file_hash(file_path, block_size=1 << 20):
+        """Return the SHA-1 hex digest of a file's content."""
+        sha = hashlib.sha1()
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(block_size), b''):
+                sha.update(block)
+        return sha.hexdigest()
+
+    def key(self, audio_path, extractor):
+        """Build the cache key for an audio file and extractor configuration."""
+        config = {
+            'version': CACHE_VERSION,
+            'dtype': self.dtype.str,
+            'extractor': type(extractor).__name__,
+            'params': extractor.get_config()
+        }
+        sha = hashlib.sha1(self.file_hash(audio_path).encode())
+        sha.update(json.dumps(config, sort_keys=True).encode())
+        return sha.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + '.npy')
+
+    def _entries(self):
+        """List cached entries as (path, size, last access time)."""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.npy'):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def get(self, key):
+        """Return the cached features for key, or None on a miss."""
+        path = self._path(key)
+        try:
+            features = np.load(path)
+        except (FileNotFoundError, ValueError, OSError):
+            self.misses += 1
+            return None
+        # Touch the entry so that it counts as recently used
+        os.utime(path)
+        self.hits += 1
+        return features
+
+    def put(self, key, features):
+        """
+        Store features under key and evict old entries if over budget.
+        Returns the features as stored so that hits and misses agree.
+        """
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        features = np.ascontiguousarray(features, dtype=self.dtype)
+        with open(tmp_path, 'wb') as f:
+            np.save(f, features)
+        os.replace(tmp_path, path)
+        self.total_bytes += os.path.getsize(path)
+        if self.total_bytes > self.max_bytes:
+            self.evict()
+        return features
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits its budget."""
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self.total_bytes = total
+
+    def clear(self):
+        """Remove every cached entry."""
+        for path, _, _ in self._entries():
+            os.remove(path)
+        self.total_bytes = 0
+
+    def get_or_extract(self, audio_path, extractor):
+        """Return cached features for audio_path, extracting them on a miss."""
+        key = self.key(audio_path, extractor)
+        features = self.get(key)
+        if features is None:
+            features = self.put(key, extractor.extract_features(audio_path))
+        return features.astype(extractor.dtype, copy=False)
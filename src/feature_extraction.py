@@ -1,13 +1,45 @@
 import numpy as np
-import librosa
-from scipy.fftpack import dct
-from scipy.signal import lfilter
-from scipy.signal.windows import hamming
+#Custom
+from instrumentation import instrumented, stage
+import audio_io
+
+# Width of the librosa.feature.delta window used for the delta features
+DELTA_WIDTH = 9
+
+def _dct_basis(n_inputs, n_outputs):
+    """Orthonormal DCT-II basis, shape (n_inputs, n_outputs), like scipy's dct(norm='ortho') of an identity."""
+    k = np.arange(n_outputs)
+    n = np.arange(n_inputs)[:, np.newaxis]
+    basis = np.sqrt(2.0 / n_inputs) * np.cos(np.pi * k * (2 * n + 1) / (2 * n_inputs))
+    basis[:, 0] /= np.sqrt(2.0)
+    return basis
+
+def _savgol_matrix(size, window_length, polyorder, deriv):
+    """
+    Linear map of scipy's savgol_filter(..., mode='interp') over a vector of
+    length size: every output is the deriv-th derivative of the least-squares
+    polynomial through the window around it, or through the first or last
+    window at the edges. Built with numpy so scipy.signal is never imported.
+    """
+    half = window_length // 2
+    factorial = np.prod(np.arange(1, deriv + 1))
+    matrix = np.zeros((size, size))
+    for row in range(size):
+        start = min(max(row - half, 0), size - window_length)
+        positions = np.arange(start, start + window_length) - row
+        vandermonde = positions[:, np.newaxis] ** np.arange(polyorder + 1)
+        matrix[row, start:start + window_length] = factorial * np.linalg.pinv(vandermonde)[deriv]
+    return matrix
 
 class AudioFeatureExtractor:
+    # Default for extractors pickled before the dtype option existed
+    dtype = np.dtype(np.float64)
+    # Extractors pickled before the native resampler used librosa's
+    resampler = 'soxr_hq'
+    
     def __init__(self, sample_rate=16000, frame_size=0.025, frame_stride=0.01, 
                  preemphasis_coef=0.97, num_filters=40, num_ceps=13,
-                 min_freq=0, max_freq=None):
+                 min_freq=0, max_freq=None, dtype=np.float64, resampler='polyphase'):
         """
         Initialize the feature extractor with configurable parameters
         
@@ -20,6 +52,9 @@ class AudioFeatureExtractor:
             num_ceps (int): Number of cepstral coefficients
             min_freq (int): Minimum frequency for mel filters
             max_freq (int): Maximum frequency for mel filters
+            dtype: Floating point type of the computed features (float64 or float32)
+            resampler (str): 'polyphase', or 'soxr_hq' (librosa) to reproduce
+                             models trained before the native resampler
         """
         self.sample_rate = sample_rate
         self.frame_size = int(frame_size * sample_rate)
@@ -29,12 +64,91 @@ class AudioFeatureExtractor:
         self.num_ceps = num_ceps
         self.min_freq = min_freq
         self.max_freq = max_freq if max_freq else sample_rate // 2
+        self.dtype = np.dtype(dtype)
+        self.resampler = resampler
+        
+    def get_config(self):
+        """Return the parameters that determine the extracted features."""
+        return {
+            'sample_rate': self.sample_rate,
+            'frame_size': self.frame_size,
+            'frame_stride': self.frame_stride,
+            'preemphasis_coef': self.preemphasis_coef,
+            'num_filters': self.num_filters,
+            'num_ceps': self.num_ceps,
+            'min_freq': self.min_freq,
+            'max_freq': self.max_freq,
+            'dtype': self.dtype.name,
+            'resampler': self.resampler
+        }
+        
+    @classmethod
+    def from_config(cls, config):
+        """Create an extractor from a get_config() dictionary."""
+        extractor = cls(sample_rate=config['sample_rate'],
+                        preemphasis_coef=config['preemphasis_coef'],
+                        num_filters=config['num_filters'],
+                        num_ceps=config['num_ceps'],
+                        min_freq=config['min_freq'],
+                        max_freq=config['max_freq'],
+                        dtype=config.get('dtype', 'float64'),
+                        # Older models were trained with librosa's resampler
+                        resampler=config.get('resampler', 'soxr_hq'))
+        # Frame sizes are stored in samples
+        extractor.frame_size = config['frame_size']
+        extractor.frame_stride = config['frame_stride']
+        return extractor
+        
+    def __getstate__(self):
+        # The precomputed plan is rebuilt on demand after unpickling
+        state = self.__dict__.copy()
+        state.pop('_plan', None)
+        return state
+        
+    def get_plan(self):
+        """
+        Return the arrays that only depend on the configuration, computed once:
+        the Hamming window, the mel filterbank and a (num_filters, 3 * num_ceps)
+        matrix mapping log-mel energies to MFCCs and their deltas.
+        """
+        key = tuple(sorted(self.get_config().items()))
+        plan = getattr(self, '_plan', None)
+        if plan is not None and plan['key'] == key:
+            return plan
+        
+        with stage('feature.plan_build'):
+            return self._build_plan(key)
+        
+    def _build_plan(self, key):
+        """Compute and store the plan returned by get_plan()."""
+        # DCT-II basis truncated to the cepstral coefficients
+        dct_basis = _dct_basis(self.num_filters, self.num_ceps)
+        
+        # librosa.feature.delta is a Savitzky-Golay filter along the cepstral
+        # axis, i.e. a fixed linear map of each frame's MFCC vector
+        delta1 = _savgol_matrix(self.num_ceps, DELTA_WIDTH, polyorder=1, deriv=1).T
+        delta2 = _savgol_matrix(self.num_ceps, DELTA_WIDTH, polyorder=2, deriv=2).T
         
+        self._plan = {
+            'key': key,
+            # Symmetric Hamming window, as scipy.signal.windows.hamming
+            'window': np.hamming(self.frame_size).astype(self.dtype),
+            'filterbank_t': np.ascontiguousarray(self.mel_filterbank().T, dtype=self.dtype),
+            'cepstral_basis': np.hstack([dct_basis, dct_basis @ delta1, dct_basis @ delta2]).astype(self.dtype)
+        }
+        return self._plan
+        
+    @instrumented('feature.load_audio')
     def load_audio(self, file_path):
-        """Load audio file and resample if necessary."""
-        audio, sr = librosa.load(file_path, sr=self.sample_rate)
+        """
+        Load audio file and resample if necessary.
+        WAV files are read natively and only resampled when their rate
+        differs, see audio_io.load_audio().
+        """
+        audio, sr = audio_io.load_audio(file_path, self.sample_rate, self.resampler)
         return audio
         
+    @instrumented('feature.preemphasis')
     def preemphasis(self, signal):
         """
         Apply preemphasis filter to the signal.
@@ -42,6 +156,7 @@ class AudioFeatureExtractor:
         """
         return np.append(signal[0], signal[1:] - self.preemphasis_coef * signal[:-1])
         
+    @instrumented('feature.framing')
     def framing(self, signal):
         """
         Split signal into frames using sliding window approach.
@@ -57,18 +172,17 @@ class AudioFeatureExtractor:
         pad_length = (num_frames - 1) * frame_step + frame_length
         pad_signal = np.pad(signal, (0, pad_length - signal_length))
         
-        # Create indices for frames
-        indices = np.tile(np.arange(0, frame_length), (num_frames, 1)) + \
-                 np.tile(np.arange(0, num_frames * frame_step, frame_step), (frame_length, 1)).T
-                 
-        return pad_signal[indices.astype(np.int32, copy=False)]
+        # Frames are a strided view into the padded signal (no copy)
+        return np.lib.stride_tricks.sliding_window_view(pad_signal, frame_length)[::frame_step]
         
+    @instrumented('feature.window')
     def apply_window(self, frames):
         """
         Apply Hamming window to frames.
         """
-        return frames * hamming(self.frame_size)
+        return frames * self.get_plan()['window']
         
+    @instrumented('feature.fft')
     def power_spectrum(self, frames):
         """
         Calculate power spectrum using FFT.
@@ -81,6 +195,24 @@ class AudioFeatureExtractor:
         
         return pow_frames
         
+    @instrumented('feature.mel')
+    def log_mel_spectrum(self, power_spec):
+        """
+        Apply the mel filterbank to a power spectrum and take the log.
+        """
+        mel_spec = np.dot(power_spec, self.get_plan()['filterbank_t'])
+        return np.log(mel_spec + 1e-8)
+        
+    @instrumented('feature.cepstra')
+    def cepstra(self, log_mel_spec):
+        """
+        Calculate MFCCs and both delta orders from log-mel energies.
+        The DCT and the delta filters are one product with the cepstral
+        basis of the plan.
+        """
+        return np.dot(log_mel_spec, self.get_plan()['cepstral_basis'])
+        
+    @instrumented('feature.mel_filterbank')
     def mel_filterbank(self):
         """
         Create mel filterbank.
@@ -118,37 +250,114 @@ class AudioFeatureExtractor:
         # Load audio
         signal = self.load_audio(audio_path)
         
+        return self.extract_from_array(signal)
+        
+    def speech_mask(self, features, threshold=6.0):
+        """
+        Energy-based voice activity detection on extracted features.
+        A frame counts as speech when its log-mel energy column is within
+        threshold (natural log units, 6.0 is about 26 dB) of the loudest
+        frames (99th percentile). Silence and the zero padding of framing()
+        fall far below that.
+        """
+        energy = features[:, 3 * self.num_ceps]
+        if len(energy) == 0:
+            return np.zeros(0, dtype=bool)
+        return energy >= np.percentile(energy, 99) - threshold
+        
+    def to_signal(self, signal):
+        """
+        Convert a float array, an integer PCM array or 16-bit PCM bytes
+        into a float signal.
+        """
+        if isinstance(signal, (bytes, bytearray, memoryview)):
+            signal = np.frombuffer(signal, dtype='<i2')
+        signal = np.asarray(signal)
+        if np.issubdtype(signal.dtype, np.integer):
+            signal = signal.astype(np.float32) / (float(np.iinfo(signal.dtype).max) + 1)
+        return signal
+        
+    @instrumented('feature.extract')
+    def extract_from_array(self, signal, sample_rate=None):
+        """
+        Extract features from an in-memory mono signal.
+        
+        Args:
+            signal: Float array, integer PCM array or 16-bit PCM bytes
+            sample_rate (int): Rate of the signal, resampled if it differs
+                               from self.sample_rate
+        """
+        signal = self.to_signal(signal)
+        if sample_rate is not None and sample_rate != self.sample_rate:
+            with stage('feature.resample'):
+                signal = audio_io.resample(signal, sample_rate, self.sample_rate, self.resampler)
+        
         # Apply pre-emphasis
         emphasized_signal = self.preemphasis(signal)
         
         # Frame the signal
         frames = self.framing(emphasized_signal)
         
+        return self.features_from_frames(frames)
+        
+    def extract_batch(self, signals, sample_rate=None):
+        """
+        Extract features from several signals in one vectorized pass.
+        Signals are zero-padded to the longest one, which gives the same
+        frames as extracting them one by one.
+        
+        Returns:
+            list: One feature matrix per signal
+        """
+        signals = [self.to_signal(signal) for signal in signals]
+        if sample_rate is not None and sample_rate != self.sample_rate:
+            signals = [audio_io.resample(signal, sample_rate, self.sample_rate, self.resampler)
+                       for signal in signals]
+        if not signals:
+            return []
+        
+        # Frame counts of each signal, as framing() computes them
+        lengths = np.array([len(signal) for signal in signals])
+        num_frames = (np.ceil((lengths - self.frame_size) / self.frame_stride)).astype(int) + 1
+        pad_length = (num_frames.max() - 1) * self.frame_stride + self.frame_size
+        
+        # Pre-emphasize every signal into one zero-padded matrix
+        dtype = np.result_type(*signals)
+        batch = np.zeros((len(signals), pad_length), dtype=dtype)
+        for row, signal in zip(batch, signals):
+            row[:len(signal)] = self.preemphasis(signal)
+        
+        # (n_signals, max_frames, frame_size) strided view
+        frames = np.lib.stride_tricks.sliding_window_view(batch, self.frame_size, axis=1)[:, ::self.frame_stride]
+        features = self.features_from_frames(frames.reshape(-1, self.frame_size))
+        features = features.reshape(len(signals), frames.shape[1], -1)
+        
+        return [features[index, :count] for index, count in enumerate(num_frames)]
+        
+    @instrumented('feature.features_from_frames')
+    def features_from_frames(self, frames):
+        """
+        Compute the feature vectors of pre-emphasized frames.
+        Every output row only depends on its own frame, so frames can be
+        processed in any grouping (e.g. incrementally while streaming).
+        """
+        frames = np.asarray(frames, dtype=self.dtype)
+        
         # Apply Hamming window
         windowed_frames = self.apply_window(frames)
         
         # Compute power spectrum
         power_spec = self.power_spectrum(windowed_frames)
         
-        # Apply mel filterbank
-        filterbank = self.mel_filterbank()
-        mel_spec = np.dot(power_spec, filterbank.T)
-        
-        # Take log
-        log_mel_spec = np.log(mel_spec + 1e-8)
-        
-        # Apply DCT
-        mfcc = dct(log_mel_spec, type=2, axis=1, norm='ortho')[:, :self.num_ceps]
+        # Apply mel filterbank and take log
+        log_mel_spec = self.log_mel_spectrum(power_spec)
         
-        # Calculate delta features
-        delta1 = librosa.feature.delta(mfcc)
-        delta2 = librosa.feature.delta(mfcc, order=2)
+        # MFCC (DCT) and both delta orders
+        cepstra = self.cepstra(log_mel_spec)
         
         # Combine all features
         combined_features = np.hstack([
-            mfcc,
-            delta1,
-            delta2,
+            cepstra,  # MFCC + delta1 + delta2
             np.mean(log_mel_spec, axis=1, keepdims=True),  # Energy feature
             np.std(log_mel_spec, axis=1, keepdims=True)    # Spectral variance
         ])
@@ -0,0 +1,318 @@
+import os
+import sys
+import json
+import argparse
+import numpy as np
+#Custom
+from feature_cache import FeatureCache, CACHE_VERSION
+
+STORE_FORMAT = 'feature-store'
+STORE_VERSION = 2
+INDEX_FILE = 'index.json'
+FRAMES_FILE = 'frames.bin'
+
+def feature_config(extractor):
+    """Extractor configuration the stored features depend on."""
+    return {
+        'version': CACHE_VERSION,
+        'extractor': type(extractor).__name__,
+        'params': extractor.get_config()
+    }
+
+class FeatureStore:
+    def __init__(self, path, dtype=np.float32):
+        """
+        Extracted features of a whole corpus in one memory-mapped file.
+
+        All frames are stored back to back in one frames file. index.json
+        lists every source file with its speaker, SHA-1 checksum, size,
+        modification time and [start, stop) frame offsets, the frame range
+        of every speaker whose files are contiguous, and the extractor
+        config the frames were computed with. Features are read as
+        zero-copy slices of a read-only memory map, so several training
+        processes reading one store share the page cache.
+
+        The store grows incrementally: new files are appended to the frames
+        file and the index is replaced atomically afterwards, so readers
+        never see partially written files. Frames of deleted or changed
+        files stay in the frames file until compact() rewrites it in corpus
+        order. reset() and compact() never touch a published frames file:
+        they write a new one (frames-<generation>.bin) that the next
+        commit() publishes, and only then delete the old file, so memory
+        maps of it stay valid.
+
+        Args:
+            path (str): Store directory, created on the first commit()
+            dtype: Storage dtype of the frames
+        """
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.config = None
+        self.n_features = None
+        self.n_frames = 0
+        self.files = []
+        self._by_path = {}
+        self._frames = None
+        self.generation = 0
+        # Frames files replaced since the last commit, deleted by it
+        self._retired = []
+        index_path = os.path.join(path, INDEX_FILE)
+        if os.path.exists(index_path):
+            with open(index_path) as f:
+                index = json.load(f)
+            if index.get('format') != STORE_FORMAT or not 1 <= index.get('version', 0) <= STORE_VERSION:
+                raise ValueError(f"{path} is not a version {STORE_VERSION} feature store")
+            self.dtype = np.dtype(index['dtype'])
+            self.config = index['config']
+            self.n_features = index['n_features']
+            self.n_frames = index['n_frames']
+            self.files = index['files']
+            # Version 1 stores always use frames.bin
+            self.generation = index.get('generation', 0)
+            self._by_path = {entry['path']: entry for entry in self.files}
+
+    @staticmethod
+    def is_store(path):
+        """Whether path is a feature store directory."""
+        return os.path.isfile(os.path.join(path, INDEX_FILE))
+
+    def __len__(self):
+        return len(self.files)
+
+    @property
+    def frames_path(self):
+        frames_file = FRAMES_FILE if self.generation == 0 else f"frames-{self.generation}.bin"
+        return os.path.join(self.path, frames_file)
+
+    def _next_generation(self):
+        """Switch to a new, unpublished frames file."""
+        self._retired.append(self.frames_path)
+        self.generation += 1
+        self._frames = None
+
+    @property
+    def frames(self):
+        """Every committed frame as a read-only memory map, shape (n_frames, n_features)."""
+        if self._frames is None or len(self._frames) != self.n_frames:
+            if self.n_frames == 0:
+                self._frames = np.zeros((0, self.n_features or 0), dtype=self.dtype)
+            else:
+                self._frames = np.memmap(self.frames_path, dtype=self.dtype, mode='r',
+                                         shape=(self.n_frames, self.n_features))
+        return self._frames
+
+    @property
+    def garbage_frames(self):
+        """Frames of deleted or replaced files still in the frames file."""
+        return self.n_frames - sum(entry['stop'] - entry['start'] for entry in self.files)
+
+    def matches(self, config):
+        return self.config == config
+
+    def reset(self, config, dtype=None):
+        """
+        Drop every file, e.g. when the extractor config changed. New frames
+        go to a new file, readers keep the old one until commit().
+        """
+        self.config = config
+        self.dtype = np.dtype(dtype or self.dtype)
+        self.n_features = None
+        self.n_frames = 0
+        self.files = []
+        self._by_path = {}
+        self._next_generation()
+
+    def plan(self, corpus):
+        """
+        Compare the store with a corpus listing and drop the files that no
+        longer exist. Unchanged size and modification time skip the checksum.
+
+        Args:
+            corpus (list): (speaker, [audio paths]) pairs, see list_corpus()
+
+        Returns:
+            list: (speaker, path, checksum) of every new or changed file
+        """
+        wanted = {}
+        pending = []
+        for speaker, audio_paths in corpus:
+            for audio_path in audio_paths:
+                audio_path = os.path.abspath(audio_path)
+                wanted[audio_path] = speaker
+                stat = os.stat(audio_path)
+                entry = self._by_path.get(audio_path)
+                if entry is not None and entry['speaker'] == speaker and \
+                        entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+                    continue
+                checksum = FeatureCache.file_hash(audio_path)
+                if entry is not None and entry['speaker'] == speaker and entry['sha1'] == checksum:
+                    # Touched but not changed
+                    entry['size'], entry['mtime_ns'] = stat.st_size, stat.st_mtime_ns
+                    continue
+                pending.append((speaker, audio_path, checksum))
+        removed = [entry for entry in self.files if entry['path'] not in wanted]
+        for entry in removed:
+            self._remove(entry['path'])
+        return pending
+
+    def _remove(self, audio_path):
+        entry = self._by_path.pop(audio_path, None)
+        if entry is not None:
+            self.files.remove(entry)
+
+    def append(self, speaker, audio_path, checksum, features):
+        """
+        Append the features of one file, replacing a previous version.
+        Nothing is visible to readers until commit().
+        """
+        features = np.ascontiguousarray(features, dtype=self.dtype)
+        if self.n_features is None:
+            self.n_features = features.shape[1]
+        elif features.shape[1] != self.n_features:
+            raise ValueError(f"Expected {self.n_features} features per frame, got {features.shape[1]}")
+        os.makedirs(self.path, exist_ok=True)
+        row_bytes = self.n_features * self.dtype.itemsize
+        mode = 'r+b' if os.path.exists(self.frames_path) else 'wb'
+        with open(self.frames_path, mode) as f:
+            # Drops anything written after the last committed or appended
+            # frame; readers only map committed frames
+            f.truncate(self.n_frames * row_bytes)
+            f.seek(self.n_frames * row_bytes)
+            f.write(features.tobytes())
+        audio_path = os.path.abspath(audio_path)
+        self._remove(audio_path)
+        stat = os.stat(audio_path)
+        entry = {
+            'path': audio_path,
+            'speaker': speaker,
+            'sha1': checksum,
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'start': self.n_frames,
+            'stop': self.n_frames + len(features)
+        }
+        self.files.append(entry)
+        self._by_path[audio_path] = entry
+        self.n_frames += len(features)
+
+    def _sort(self):
+        self.files.sort(key=lambda entry: (entry['speaker'], entry['path']))
+
+    def speaker_ranges(self):
+        """Frame range [start, stop) of every speaker whose files are stored contiguously, else None."""
+        ranges = {}
+        for speaker, entries in self._grouped():
+            contiguous = all(previous['stop'] == entry['start'] for previous, entry in zip(entries, entries[1:]))
+            ranges[speaker] = [entries[0]['start'], entries[-1]['stop']] if contiguous else None
+        return ranges
+
+    def _grouped(self):
+        """(speaker, entries) pairs in corpus order."""
+        self._sort()
+        groups = []
+        for entry in self.files:
+            if not groups or groups[-1][0] != entry['speaker']:
+                groups.append((entry['speaker'], []))
+            groups[-1][1].append(entry)
+        return groups
+
+    def commit(self):
+        """Atomically publish the index of everything appended so far."""
+        os.makedirs(self.path, exist_ok=True)
+        self._sort()
+        index = {
+            'format': STORE_FORMAT,
+            'version': STORE_VERSION,
+            'generation': self.generation,
+            'dtype': self.dtype.str,
+            'n_features': self.n_features,
+            'n_frames': self.n_frames,
+            'config': self.config,
+            'speakers': self.speaker_ranges(),
+            'files': self.files
+        }
+        index_path = os.path.join(self.path, INDEX_FILE)
+        tmp_path = index_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f)
+        os.replace(tmp_path, index_path)
+        # Unlinking keeps existing memory maps of replaced files valid
+        for retired_path in self._retired:
+            if retired_path != self.frames_path and os.path.exists(retired_path):
+                os.remove(retired_path)
+        self._retired = []
+
+    def compact(self):
+        """
+        Rewrite the frames in corpus order without garbage into a new
+        frames file, so that every speaker's frames are one contiguous
+        slice. Readers holding the old memory map keep reading the old file.
+        """
+        frames = self.frames
+        self._next_generation()
+        start = 0
+        with open(self.frames_path, 'wb') as f:
+            for entry in self.files:
+                features = frames[entry['start']:entry['stop']]
+                f.write(np.ascontiguousarray(features).tobytes())
+                entry['start'], entry['stop'] = start, start + len(features)
+                start += len(features)
+        del frames
+        self.n_frames = start
+        self.commit()
+
+    def file_features(self, audio_path):
+        """Zero-copy features of one stored file."""
+        entry = self._by_path[os.path.abspath(audio_path)]
+        return self.frames[entry['start']:entry['stop']]
+
+    def speaker_features(self, speaker):
+        """All frames of a speaker; zero-copy when its files are contiguous (see compact())."""
+        for name, entries in self._grouped():
+            if name != speaker:
+                continue
+            frame_range = self.speaker_ranges()[speaker]
+            if frame_range is not None:
+                return self.frames[frame_range[0]:frame_range[1]]
+            return np.vstack([self.frames[entry['start']:entry['stop']] for entry in entries])
+        raise KeyError(f"Speaker {speaker} is not in the store")
+
+    def live_frames(self):
+        """Every stored file's frames, zero-copy when there is no garbage."""
+        if self.garbage_frames == 0 and all(previous['stop'] == entry['start']
+                                            for previous, entry in zip(self.files, self.files[1:])):
+            return self.frames
+        return np.vstack([self.frames[entry['start']:entry['stop']] for entry in self.files])
+
+    def list_corpus(self):
+        """(speaker, [audio paths]) pairs in corpus order, like SpeakerIdentification.list_corpus()."""
+        return [(speaker, [entry['path'] for entry in entries]) for speaker, entries in self._grouped()]
+
+    def iter_files(self):
+        """Yield (speaker, audio path, zero-copy features) for every file in corpus order."""
+        frames = self.frames
+        for speaker, entries in self._grouped():
+            for entry in entries:
+                yield speaker, entry['path'], frames[entry['start']:entry['stop']]
+
+    def corpus_features(self):
+        """Speaker -> list of zero-copy feature slices, like extract_corpus()."""
+        corpus_features = {}
+        for speaker, _, features in self.iter_files():
+            corpus_features.setdefault(speaker, []).append(features)
+        return corpus_features
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or update a feature store from an audio directory")
+    parser.add_argument('data_dir', help="Directory with one sub-directory of .wav files per speaker")
+    parser.add_argument('store', help="Feature store directory")
+    parser.add_argument('--jobs', type=int, default=-1, help="Extraction processes")
+    parser.add_argument('--cache-dir', default=None, help="Feature cache directory")
+    args = parser.parse_args(argv)
+
+    from speaker_identification import SpeakerIdentification
+    identifier = SpeakerIdentification(cache_dir=args.cache_dir, n_jobs=args.jobs)
+    identifier.update_feature_store(args.data_dir, args.store)
+
+if __name__ == "__main__":
+    sys.exit(main())
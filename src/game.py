@@ -5,13 +5,14 @@ import pyaudio
 import wave
 import queue
 from PIL import Image, ImageTk
-from recorder import * 
 
 # Custom
-from speaker_identification import *
+from speaker_identification import SpeakerIdentification
+from identification_client import IdentificationClient
+from streaming_identification import StreamingIdentifier
 
 class SpeakerIdentificationGame:
-    def __init__(self, root):
+    def __init__(self, root, streaming=False):
         self.root = root
         self.root.title("Recognition Game                    /esprit/Sagemcom")
         self.root.geometry("400x600")
@@ -22,6 +23,16 @@ class SpeakerIdentificationGame:
         self.is_recording = False
         self.audio = None
         
+        # Identification goes through the local server when it is running,
+        # otherwise the models are loaded once on first use
+        self.client = IdentificationClient()
+        self.speaker_id = None
+        
+        # In streaming mode the speaker is scored while recording and the
+        # recording stops by itself once the decision is clear
+        self.streaming = streaming
+        self.streamer = None
+        
         # Create main container
         self.main_frame = ttk.Frame(root, padding="20")
         self.main_frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
@@ -124,7 +135,7 @@ class SpeakerIdentificationGame:
             self.audio.terminate()
         self.root.destroy()
         
-    def record_voice(self, output_filename="output.wav", sample_rate=44100, channels=1, chunk_size=1024):
+    def record_voice(self, output_filename="output.wav", sample_rate=16000, channels=1, chunk_size=1024):
         """Records audio from the microphone and saves it to a .wav file."""
         self.audio = pyaudio.PyAudio()
         
@@ -141,6 +152,11 @@ class SpeakerIdentificationGame:
         while self.is_recording:
             data = stream.read(chunk_size)
             frames.append(data)
+            if self.streamer is not None:
+                result = self.streamer.feed(data)
+                self.root.after(0, self.show_provisional, result)
+                if result['done']:
+                    self.root.after(0, self.stop_recording)
         
         # Stop and close the stream
         stream.stop_stream()
@@ -165,7 +181,13 @@ class SpeakerIdentificationGame:
         self.progress.start()
         
         # Start recording in a separate thread
-        self.recording_thread = threading.Thread(target=self.record_voice)
+        if self.streaming:
+            self.streamer = StreamingIdentifier(self.get_speaker_id())
+            sample_rate = self.streamer.extractor.sample_rate
+            self.recording_thread = threading.Thread(target=self.record_voice,
+                                                     kwargs={'sample_rate': sample_rate})
+        else:
+            self.recording_thread = threading.Thread(target=self.record_voice)
         self.recording_thread.start()
     
     def stop_recording(self):
@@ -180,24 +202,19 @@ class SpeakerIdentificationGame:
                 output_filename = self.audio_queue.get()
                 
                 try:
-                    # Initialize speaker identification system
-                    speaker_id = SpeakerIdentification.load_models("speaker_models.pkl")
-                    
                     # Identify speaker
-                    identified_speaker, scores = speaker_id.identify_speaker(output_filename)
+                    if self.streamer is not None:
+                        result = self.streamer.finish()
+                        identified_speaker, scores = result['decision'], result['scores']
+                        self.streamer = None
+                    else:
+                        identified_speaker, scores = self.identify(output_filename)
                     
-                    tempscore = 0
-                    # Check confidencecd
-                    for _, score in scores.items():
-                        if score > 0:
-                            identified_speaker = "Unknown"
-                            # Try to load speaker's image
-                        print(f"{_}: {score:.2f}")
-                        #print(f"{speaker}: {score:.2f}")
-                        tempscore += abs(score)
-                    if tempscore > 200 :
-                        identified_speaker = "Unknown" 
+                    # Unknown speakers are already rejected by the decision
+                    for speaker, score in scores.items():
+                        print(f"{speaker}: {score:.2f}")
                     
+                    # Try to load speaker's image
                     speaker_image = self.load_and_resize_image(f"../images/{identified_speaker}.jpeg", (200, 200))
                     
                     if speaker_image:
@@ -214,6 +231,27 @@ class SpeakerIdentificationGame:
             
             threading.Thread(target=process_recording).start()
     
+    def get_speaker_id(self):
+        """Load the models on first use."""
+        if self.speaker_id is None:
+            self.speaker_id = SpeakerIdentification.load_models("speaker_models.pkl")
+        return self.speaker_id
+    
+    def identify(self, audio_path):
+        """
+        Identify the speaker through the server, or with locally loaded
+        models. Returns the decision, "Unknown" for rejected speakers.
+        """
+        if self.client.is_available():
+            result = self.client.identify_file(audio_path)
+            return result['decision'], result['scores']
+        return self.get_speaker_id().identify_speaker(audio_path, normalize=True)
+    
+    def show_provisional(self, result):
+        if self.is_recording and result['speaker'] is not None:
+            self.status_label.config(
+                text=f"Listening... maybe {result['speaker']} ({result['confidence'] * 100:.0f}%)")
+    
     def update_result(self, speaker):
         result_text = f"I think you are...\n{speaker}!"
         self.result_label.config(text=result_text)
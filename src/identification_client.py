@@ -0,0 +1,49 @@
+import json
+import urllib.request
+import urllib.error
+
+DEFAULT_URL = "http://127.0.0.1:8765"
+
+class IdentificationClient:
+    def __init__(self, url=DEFAULT_URL, timeout=30.0):
+        """
+        Thin client for identification_server.py.
+        Only uses the standard library, so it starts instantly.
+
+        Args:
+            url (str): Base URL of the server
+            timeout (float): Request timeout in seconds
+        """
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+
+    def _request(self, path, data=None, content_type=None):
+        request = urllib.request.Request(self.url + path, data=data)
+        if content_type:
+            request.add_header('Content-Type', content_type)
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            raise RuntimeError(json.loads(e.read()).get('error', str(e)))
+
+    def is_available(self):
+        """Return True if a server is listening at the configured URL."""
+        try:
+            self._request('/health')
+            return True
+        except (OSError, RuntimeError, ValueError):
+            return False
+
+    def identify_wav(self, wav_bytes):
+        """Identify the speaker of a WAV file given as bytes."""
+        return self._request('/identify', wav_bytes, 'audio/wav')
+
+    def identify_file(self, audio_path):
+        """Identify the speaker of a .wav file."""
+        with open(audio_path, 'rb') as f:
+            return self.identify_wav(f.read())
+
+    def identify_pcm(self, pcm_bytes, sample_rate):
+        """Identify the speaker of raw 16-bit little-endian mono PCM."""
+        return self._request(f'/identify?sample_rate={sample_rate}', pcm_bytes, 'audio/L16')
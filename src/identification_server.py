@@ -0,0 +1,226 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+import numpy as np
+#Custom
+from speaker_identification import SpeakerIdentification
+from batch_identification import BatchingIdentifier
+from audio_io import decode_wav_bytes, pcm_to_float
+import instrumentation
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+class IdentificationService:
+    def __init__(self, model_path, reload_interval=1.0, top_c=None, top_n=None,
+                 batch_window=None, max_batch_size=32, batch_workers=4):
+        """
+        Keeps a loaded SpeakerIdentification in memory and reloads it when
+        the model file changes on disk.
+
+        Model directories are memory-mapped, so they must be replaced with
+        save_models() (or model_io), which swaps in a new directory instead
+        of rewriting the mapped files. A reload that fails, e.g. on a .pkl
+        still being copied in place, keeps the current model and is retried
+        at the next check.
+
+        Args:
+            model_path (str): .pkl file or model directory
+            reload_interval (float): Minimum seconds between change checks
+            top_c (int): Optional top-C fast scoring, see SpeakerBank
+            top_n (int): Only score the top_n candidates of the supervector index
+            batch_window (float): If set, concurrent requests arriving within
+                                  this many seconds share one scoring pass
+                                  (see BatchingIdentifier); not with top_n
+            max_batch_size (int): Most requests per batched pass
+            batch_workers (int): Extraction and scoring threads of the batcher
+        """
+        if batch_window is not None and top_n:
+            raise ValueError("Batched identification does not support top_n")
+        self.model_path = model_path
+        self.reload_interval = reload_interval
+        self.top_c = top_c
+        self.top_n = top_n
+        self._lock = threading.Lock()
+        self._last_check = 0.0
+        self._stamp = None
+        self.identifier = None
+        self.batcher = None
+        self.reload()
+        if batch_window is not None:
+            self.batcher = BatchingIdentifier(self.identifier, max_wait=batch_window, max_batch_size=max_batch_size,
+                                              n_workers=batch_workers, top_c=top_c)
+
+    def _model_stamp(self):
+        # Every save writes a new header (or .pkl) file, so the inode changes
+        # even when the modification time does not
+        path = self.model_path
+        if os.path.isdir(path):
+            path = os.path.join(path, 'header.json')
+        stat = os.stat(path)
+        return stat.st_ino, stat.st_mtime_ns
+
+    def reload(self):
+        """Load the model and swap it in for new requests."""
+        stamp = self._model_stamp()
+        identifier = SpeakerIdentification.load_models(self.model_path)
+        if self.top_n:
+            # Build the index before the model serves requests
+            identifier.get_index()
+        self.identifier = identifier
+        if self.batcher is not None:
+            self.batcher.identifier = identifier
+        self._stamp = stamp
+        print(f"Loaded {len(identifier.speaker_bank)} speakers from {self.model_path}")
+
+    def maybe_reload(self):
+        """Reload the model if its file changed since the last load."""
+        now = time.monotonic()
+        if now - self._last_check < self.reload_interval:
+            return
+        with self._lock:
+            if now - self._last_check < self.reload_interval:
+                return
+            self._last_check = now
+            try:
+                changed = self._model_stamp() != self._stamp
+            except FileNotFoundError:
+                return
+            if changed:
+                try:
+                    self.reload()
+                except Exception as e:
+                    print(f"Reload of {self.model_path} failed, keeping the current model: {e}")
+
+    def identify(self, signal, sample_rate):
+        """Score a signal and return a JSON-serialisable result."""
+        self.maybe_reload()
+        identifier = self.identifier
+        start = time.perf_counter()
+        # Normalized scores when the models have normalization statistics
+        if self.batcher is not None:
+            decision, scores = self.batcher.identify(signal=signal, sample_rate=sample_rate)
+        else:
+            decision, scores = identifier.identify_signal(signal, sample_rate, top_c=self.top_c,
+                                                          top_n=self.top_n, normalize=True)
+        return {
+            'speaker': max(scores, key=scores.get),
+            'decision': decision,
+            'scores': {speaker: float(score) for speaker, score in scores.items()},
+            'seconds': time.perf_counter() - start
+        }
+
+class IdentificationRequestHandler(BaseHTTPRequestHandler):
+    """
+    POST /identify with a WAV file body (Content-Type: audio/wav) or raw
+    16-bit little-endian mono PCM (any other type, ?sample_rate=16000).
+    GET /health reports the loaded model.
+    """
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if urlparse(self.path).path != '/health':
+            self._send_json(404, {'error': 'not found'})
+            return
+        service = self.server.service
+        health = {
+            'model': service.model_path,
+            'speakers': list(service.identifier.speaker_bank.speaker_names)
+        }
+        if service.batcher is not None:
+            health['batching'] = service.batcher.stats()
+        self._send_json(200, health)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != '/identify':
+            self._send_json(404, {'error': 'not found'})
+            return
+        try:
+            data = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            if self.headers.get('Content-Type', '').startswith(('audio/wav', 'audio/x-wav')):
+                signal, sample_rate = decode_wav_bytes(data)
+            else:
+                query = parse_qs(url.query)
+                sample_rate = int(query.get('sample_rate', [self.server.service.identifier.feature_extractor.sample_rate])[0])
+                signal = pcm_to_float(np.frombuffer(data, dtype='<i2'))
+            result = self.server.service.identify(signal, sample_rate)
+        except Exception as e:
+            self._send_json(400, {'error': str(e)})
+            return
+        self._send_json(200, result)
+
+    def log_message(self, format, *args):
+        pass
+
+class IdentificationServer(HTTPServer):
+    def __init__(self, service, host=DEFAULT_HOST, port=DEFAULT_PORT, max_workers=4):
+        """HTTP server handing requests to a bounded pool of worker threads."""
+        super().__init__((host, port), IdentificationRequestHandler)
+        self.service = service
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self._process_request_thread, request, client_address)
+
+    def _process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=True)
+        if self.service.batcher is not None:
+            self.service.batcher.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local speaker identification server")
+    parser.add_argument('--model', default="speaker_models.pkl", help=".pkl file or model directory")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--workers', type=int, default=4, help="Concurrent requests")
+    parser.add_argument('--top-c', type=int, default=None, help="Enable top-C fast scoring")
+    parser.add_argument('--top-n', type=int, default=None,
+                        help="Only score the N most similar speakers found by the supervector index")
+    parser.add_argument('--batch-window', type=float, default=None,
+                        help="Seconds to coalesce concurrent requests into one scoring pass")
+    parser.add_argument('--max-batch', type=int, default=32, help="Most requests per batched pass")
+    parser.add_argument('--metrics-file', default=None,
+                        help="Write per-stage timings in the Prometheus text format to this file")
+    args = parser.parse_args(argv)
+
+    if args.metrics_file:
+        instrumentation.enable(instrumentation.PrometheusFileSink(args.metrics_file))
+
+    service = IdentificationService(args.model, top_c=args.top_c, top_n=args.top_n,
+                                    batch_window=args.batch_window, max_batch_size=args.max_batch,
+                                    batch_workers=args.workers)
+    server = IdentificationServer(service, args.host, args.port, args.workers)
+    print(f"Serving speaker identification on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        instrumentation.disable()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,333 @@
+import os
+import io
+import time
+import bisect
+import logging
+import threading
+import functools
+import contextlib
+import numpy as np
+
+# Upper bounds (seconds) of the duration histogram buckets
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Active Instrumentation, None while disabled
+_active = None
+
+class StageStats:
+    """Aggregated measurements of one stage."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.calls = 0
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.frames = 0
+        self.bytes = 0
+        self.max_wall_seconds = 0.0
+        # Last slot counts durations above every bucket
+        self.bucket_counts = [0] * (len(buckets) + 1)
+
+    def add(self, wall, cpu, frames, nbytes):
+        self.calls += 1
+        self.wall_seconds += wall
+        self.cpu_seconds += cpu
+        self.frames += frames
+        self.bytes += nbytes
+        self.max_wall_seconds = max(self.max_wall_seconds, wall)
+        self.bucket_counts[bisect.bisect_left(self.buckets, wall)] += 1
+
+    def to_dict(self):
+        return {
+            'calls': self.calls,
+            'wall_seconds': self.wall_seconds,
+            'cpu_seconds': self.cpu_seconds,
+            'mean_wall_seconds': self.wall_seconds / self.calls if self.calls else 0.0,
+            'max_wall_seconds': self.max_wall_seconds,
+            'frames': self.frames,
+            'bytes': self.bytes,
+            'histogram': dict(zip([str(bound) for bound in self.buckets] + ['+Inf'],
+                                  np.cumsum(self.bucket_counts).tolist()))
+        }
+
+class MemorySink:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """
+        In-memory registry of per-stage counters and duration histograms.
+
+        Args:
+            buckets (tuple): Upper bounds in seconds of the histogram buckets
+        """
+        self.buckets = buckets
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, wall, cpu, frames, nbytes):
+        with self._lock:
+            stats = self.stages.get(stage)
+            if stats is None:
+                stats = self.stages[stage] = StageStats(self.buckets)
+            stats.add(wall, cpu, frames, nbytes)
+
+    def flush(self):
+        pass
+
+    def reset(self):
+        with self._lock:
+            self.stages = {}
+
+    def snapshot(self):
+        """Return the aggregated stats as a dict of stage name to dict."""
+        with self._lock:
+            return {stage: stats.to_dict() for stage, stats in sorted(self.stages.items())}
+
+    def report(self):
+        """Print one line per stage, slowest total first."""
+        snapshot = self.snapshot()
+        print(f"{'stage':<32} {'calls':>7} {'wall ms':>10} {'cpu ms':>10} {'mean ms':>9} {'frames':>9} {'MB':>9}")
+        for stage, stats in sorted(snapshot.items(), key=lambda item: -item[1]['wall_seconds']):
+            print(f"{stage:<32} {stats['calls']:>7} {stats['wall_seconds'] * 1000:>10.2f} "
+                  f"{stats['cpu_seconds'] * 1000:>10.2f} {stats['mean_wall_seconds'] * 1000:>9.3f} "
+                  f"{stats['frames']:>9} {stats['bytes'] / 1e6:>9.2f}")
+
+class LogSink:
+    def __init__(self, logger=None, level=logging.INFO):
+        """Log every measurement, one line per stage call."""
+        self.logger = logger or logging.getLogger('speaker_identification.instrumentation')
+        self.level = level
+
+    def record(self, stage, wall, cpu, frames, nbytes):
+        self.logger.log(self.level, "%s wall=%.3fms cpu=%.3fms frames=%d bytes=%d",
+                        stage, wall * 1000, cpu * 1000, frames, nbytes)
+
+    def flush(self):
+        pass
+
+class PrometheusFileSink(MemorySink):
+    def __init__(self, path, flush_interval=10.0, prefix='speaker_id', buckets=DEFAULT_BUCKETS):
+        """
+        Aggregate like MemorySink and write the Prometheus text exposition
+        format to path, e.g. for the node_exporter textfile collector.
+
+        Args:
+            path (str): Output .prom file, replaced atomically
+            flush_interval (float): Seconds between automatic writes
+            prefix (str): Metric name prefix
+        """
+        super().__init__(buckets)
+        self.path = path
+        self.flush_interval = flush_interval
+        self.prefix = prefix
+        self._last_flush = time.monotonic()
+
+    def record(self, stage, wall, cpu, frames, nbytes):
+        super().record(stage, wall, cpu, frames, nbytes)
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def to_text(self):
+        """Return the metrics in the Prometheus text format."""
+        snapshot = self.snapshot()
+        prefix = self.prefix
+        out = io.StringIO()
+        counters = [
+            ('calls_total', 'calls', "Stage calls"),
+            ('wall_seconds_total', 'wall_seconds', "Wall-clock time spent in the stage"),
+            ('cpu_seconds_total', 'cpu_seconds', "Thread CPU time spent in the stage"),
+            ('frames_total', 'frames', "Frames processed by the stage"),
+            ('bytes_total', 'bytes', "Bytes of the arrays produced or consumed by the stage")
+        ]
+        for suffix, key, help_text in counters:
+            out.write(f"# HELP {prefix}_stage_{suffix} {help_text}\n")
+            out.write(f"# TYPE {prefix}_stage_{suffix} counter\n")
+            for stage, stats in snapshot.items():
+                out.write(f'{prefix}_stage_{suffix}{{stage="{stage}"}} {stats[key]}\n')
+
+        name = f"{prefix}_stage_duration_seconds"
+        out.write(f"# HELP {name} Wall-clock duration of stage calls\n")
+        out.write(f"# TYPE {name} histogram\n")
+        for stage, stats in snapshot.items():
+            for bound, count in stats['histogram'].items():
+                out.write(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {count}\n')
+            out.write(f'{name}_sum{{stage="{stage}"}} {stats["wall_seconds"]}\n')
+            out.write(f'{name}_count{{stage="{stage}"}} {stats["calls"]}\n')
+        return out.getvalue()
+
+    def flush(self):
+        self._last_flush = time.monotonic()
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(self.to_text())
+        os.replace(tmp_path, self.path)
+
+class Instrumentation:
+    def __init__(self, sinks):
+        """Fan measurements out to a list of sinks."""
+        self.sinks = list(sinks)
+
+    def record(self, stage, wall, cpu, frames=0, nbytes=0):
+        for sink in self.sinks:
+            sink.record(stage, wall, cpu, frames, nbytes)
+
+    def flush(self):
+        for sink in self.sinks:
+            sink.flush()
+
+def enable(*sinks):
+    """
+    Start recording stage measurements into the given sinks (default: a
+    new MemorySink). Measurements are per process, so workers of a process
+    pool are not recorded.
+
+    Returns:
+        Instrumentation: The active instrumentation
+    """
+    global _active
+    _active = Instrumentation(sinks or [MemorySink()])
+    return _active
+
+def disable():
+    """Stop recording and flush the sinks."""
+    global _active
+    active, _active = _active, None
+    if active is not None:
+        active.flush()
+
+def is_enabled():
+    return _active is not None
+
+def _measure(value):
+    """
+    Leading dimension (frames, or samples of a signal) and bytes of an
+    array, or of the first array in a tuple.
+    """
+    if isinstance(value, tuple) and value:
+        value = value[0]
+    if isinstance(value, np.ndarray):
+        return (value.shape[0] if value.ndim else 1), value.nbytes
+    return 0, 0
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def measure(self, value):
+        return value
+
+_NULL_STAGE = _NullStage()
+
+class _Stage:
+    def __init__(self, instrumentation, name):
+        self.instrumentation = instrumentation
+        self.name = name
+        self.frames = 0
+        self.nbytes = 0
+
+    def __enter__(self):
+        self.start_wall = time.perf_counter()
+        self.start_cpu = time.thread_time()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.instrumentation.record(self.name, time.perf_counter() - self.start_wall,
+                                    time.thread_time() - self.start_cpu, self.frames, self.nbytes)
+        return False
+
+    def measure(self, value):
+        """Count the frames and bytes of value towards this stage, return value."""
+        frames, nbytes = _measure(value)
+        self.frames += frames
+        self.nbytes += nbytes
+        return value
+
+def stage(name):
+    """
+    Context manager timing a block as stage name. Returns a shared no-op
+    object while instrumentation is disabled.
+
+        with stage('feature.mel') as s:
+            mel_spec = s.measure(np.dot(power_spec, filterbank))
+    """
+    active = _active
+    if active is None:
+        return _NULL_STAGE
+    return _Stage(active, name)
+
+def instrumented(name, array_arg=None):
+    """
+    Decorator timing every call as stage name. The frames and bytes of the
+    returned array are recorded, or of positional argument array_arg if
+    given (counting self for methods). Disabled cost is one global lookup.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            active = _active
+            if active is None:
+                return function(*args, **kwargs)
+            start_wall = time.perf_counter()
+            start_cpu = time.thread_time()
+            result = function(*args, **kwargs)
+            frames, nbytes = _measure(result if array_arg is None else args[array_arg])
+            active.record(name, time.perf_counter() - start_wall, time.thread_time() - start_cpu,
+                          frames, nbytes)
+            return result
+        return wrapper
+    return decorator
+
+@contextlib.contextmanager
+def profile(kind='cprofile', output=None, top=20):
+    """
+    Profile a single request with cProfile or tracemalloc.
+
+        with profile('tracemalloc') as result:
+            identifier.identify_speaker(path)
+        print(result['text'])
+
+    Args:
+        kind (str): 'cprofile' (time per function) or 'tracemalloc'
+                    (allocations per line)
+        output (str): Optional file for the raw profile (.prof for cProfile)
+        top (int): Entries in the text summary
+
+    Yields:
+        dict: Filled on exit with 'text' (summary), and 'peak_bytes' for tracemalloc
+    """
+    result = {}
+    if kind == 'cprofile':
+        import cProfile
+        import pstats
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield result
+        finally:
+            profiler.disable()
+            stream = io.StringIO()
+            pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(top)
+            result['text'] = stream.getvalue()
+            if output:
+                profiler.dump_stats(output)
+    elif kind == 'tracemalloc':
+        import tracemalloc
+        was_tracing = tracemalloc.is_tracing()
+        if not was_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        before = tracemalloc.take_snapshot()
+        try:
+            yield result
+        finally:
+            after = tracemalloc.take_snapshot()
+            result['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+            if not was_tracing:
+                tracemalloc.stop()
+            lines = [str(stat) for stat in after.compare_to(before, 'lineno')[:top]]
+            result['text'] = f"Peak traced memory: {result['peak_bytes']} bytes\n" + "\n".join(lines)
+            if output:
+                after.dump(output)
+    else:
+        raise ValueError(f"Unknown profiler {kind}, use 'cprofile' or 'tracemalloc'")
@@ -0,0 +1,152 @@
+import os
+import sys
+import json
+import time
+import shutil
+import numpy as np
+
+MODEL_FORMAT = 'speaker-bank'
+MODEL_FORMAT_VERSION = 2
+HEADER_FILE = 'header.json'
+
+def save_model_dir(identifier, path):
+    """
+    Save a trained SpeakerIdentification as a directory of .npy arrays.
+
+    The directory holds one .npy file per array plus a small JSON header
+    with the format version, speaker names and extractor configuration.
+    Everything is written to a sibling temporary directory first and then
+    renamed into place, so the files of an existing model are never
+    rewritten: processes that memory-mapped it (including this one, when
+    the identifier was loaded from path) keep reading the old files, and
+    new loads see either the old or the new model.
+
+    Args:
+        identifier (SpeakerIdentification): Trained identifier
+        path (str): Output directory
+    """
+    bank = identifier.speaker_bank
+    arrays = {
+        'ubm_means': bank.ubm_means,
+        'ubm_covariances': bank.covariances,
+        'ubm_weights': bank.weights
+    }
+    quantization = getattr(bank, 'quantization', None)
+    if quantization is not None:
+        # Compact bank: quantized mean offsets, dequantized while scoring
+        arrays.update(bank.to_arrays())
+    else:
+        arrays['speaker_means'] = bank.means
+        # Precomputed scoring terms, so loading needs no arithmetic
+        arrays['speaker_mean_precisions'] = bank.mean_precisions
+        arrays['speaker_constants'] = bank.constants
+    if bank.counts is not None:
+        # MAP sufficient statistics for incremental enrollment
+        arrays['speaker_counts'] = bank.counts
+        arrays['speaker_first_order'] = bank.first_order
+    normalization = None
+    if identifier.score_normalizer is not None:
+        # Impostor set and Z-norm statistics aligned with the speakers
+        normalization_arrays, normalization = identifier.score_normalizer.to_arrays(bank)
+        arrays.update(normalization_arrays)
+
+    path = os.path.normpath(path)
+    tmp_dir = f"{path}.tmp-{os.getpid()}"
+    if os.path.exists(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    os.makedirs(tmp_dir)
+
+    array_info = {}
+    for name, array in arrays.items():
+        file_name = name + '.npy'
+        # Memory-mapped arrays are read here and written to new files
+        np.save(os.path.join(tmp_dir, file_name), np.ascontiguousarray(array))
+        array_info[name] = {
+            'file': file_name,
+            'dtype': np.dtype(array.dtype).str,
+            'shape': list(array.shape)
+        }
+
+    header = {
+        'format': MODEL_FORMAT,
+        'version': MODEL_FORMAT_VERSION,
+        'n_components': identifier.n_components,
+        'n_features': bank.n_features,
+        'speakers': list(bank.speaker_names),
+        'extractor': identifier.feature_extractor.get_config(),
+        # Scoring applies VAD like training did (see SpeakerIdentification.vad_scoring)
+        'vad': {'training': bool(identifier.vad_training), 'threshold': float(identifier.vad_threshold)},
+        'arrays': array_info
+    }
+    if quantization is not None:
+        header['quantization'] = quantization
+    if normalization is not None:
+        header['normalization'] = normalization
+    with open(os.path.join(tmp_dir, HEADER_FILE), 'w') as f:
+        json.dump(header, f, indent=2)
+
+    # Swap the new directory in; unlinked files stay valid for existing mappings
+    if os.path.isdir(path):
+        old_dir = f"{path}.old-{os.getpid()}"
+        os.rename(path, old_dir)
+        os.rename(tmp_dir, path)
+        shutil.rmtree(old_dir)
+    else:
+        os.rename(tmp_dir, path)
+
+def read_header(path):
+    """Read and validate the JSON header of a model directory."""
+    with open(os.path.join(path, HEADER_FILE)) as f:
+        header = json.load(f)
+    if header.get('format') != MODEL_FORMAT:
+        raise ValueError(f"{path} is not a {MODEL_FORMAT} model directory")
+    if header.get('version', 0) > MODEL_FORMAT_VERSION:
+        raise ValueError(f"Model format version {header['version']} is newer than "
+                         f"the supported version {MODEL_FORMAT_VERSION}")
+    return header
+
+def load_model_arrays(path, mmap_mode='r'):
+    """
+    Load the header and arrays of a model directory.
+    With mmap_mode='r' the arrays are memory-mapped read-only, so loading
+    is nearly free and pages are shared between processes.
+    If save_model_dir() replaces the directory while it is being read,
+    the load is retried so header and arrays come from the same save.
+    """
+    header_path = os.path.join(path, HEADER_FILE)
+    attempts = 5
+    for attempt in range(attempts):
+        try:
+            header_inode = os.stat(header_path).st_ino
+            header = read_header(path)
+            arrays = {}
+            for name, info in header['arrays'].items():
+                arrays[name] = np.load(os.path.join(path, info['file']), mmap_mode=mmap_mode)
+            if os.stat(header_path).st_ino == header_inode:
+                return header, arrays
+        except FileNotFoundError:
+            # Missing for good, or caught between the two renames of a save
+            if attempt == attempts - 1:
+                raise
+        time.sleep(0.01)
+    raise OSError(f"{path} kept changing while it was loaded")
+
+def convert_pickle(pkl_path, out_path, quantization=None):
+    """
+    Convert a joblib .pkl model file into a model directory, optionally
+    with a compact 'int8' or 'float16' speaker bank.
+    """
+    # Imported here so this module stays light for readers of the format
+    from speaker_identification import SpeakerIdentification
+    identifier = SpeakerIdentification.load_models(pkl_path)
+    if quantization is not None:
+        identifier.compact_speaker_bank(quantization)
+    save_model_dir(identifier, out_path)
+    return identifier
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (3, 4):
+        print("Usage: python model_io.py <models.pkl> <output_dir> [int8|float16]")
+        sys.exit(1)
+    identifier = convert_pickle(sys.argv[1], sys.argv[2], sys.argv[3] if len(sys.argv) == 4 else None)
+    print(f"Converted {len(identifier.speaker_bank)} speakers to {sys.argv[2]}")
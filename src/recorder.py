@@ -62,4 +62,59 @@ def record_voice(output_filename="output.wav", sample_rate=16000, channels=1, ch
         wf.setframerate(sample_rate)
         wf.writeframes(b"".join(frames))
 
-    return output_filename
\ No newline at end of file
+    return output_filename
+
+
+def stream_identify(speaker_id, margin_threshold=2.0, chunk_size=4000, top_c=None):
+    """
+    Identifies the speaker live from the microphone, without writing a file.
+    Stops as soon as the decision is clear, or when 'q' is pressed.
+
+    Args:
+        speaker_id (SpeakerIdentification): Trained models.
+        margin_threshold (float): Score margin over the runner-up needed to stop early.
+        chunk_size (int): Size of each audio chunk.
+        top_c (int): Optional top-C fast scoring.
+
+    Returns:
+        dict: The final result of the StreamingIdentifier.
+    """
+    from streaming_identification import StreamingIdentifier
+    streamer = StreamingIdentifier(speaker_id, margin_threshold=margin_threshold, top_c=top_c)
+    sample_rate = streamer.extractor.sample_rate
+
+    audio = pyaudio.PyAudio()
+    stream = audio.open(format=pyaudio.paInt16,
+                        channels=1,
+                        rate=sample_rate,
+                        input=True,
+                        frames_per_buffer=chunk_size)
+
+    print("Listening... Press 'q' to stop.")
+
+    stop_recording = False
+
+    def on_press(key):
+        nonlocal stop_recording
+        try:
+            if key.char == 'q':
+                stop_recording = True
+                return False  # Stop listener
+        except AttributeError:
+            pass
+
+    listener = keyboard.Listener(on_press=on_press)
+    listener.start()
+    while not stop_recording:
+        result = streamer.feed(stream.read(chunk_size))
+        if result['speaker'] is not None:
+            print(f"{result['speaker']} ({result['confidence'] * 100:.0f}%, margin {result['margin']:.2f})")
+        if result['done']:
+            break
+    listener.stop()
+
+    stream.stop_stream()
+    stream.close()
+    audio.terminate()
+
+    return streamer.finish()
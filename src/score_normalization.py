@@ -0,0 +1,245 @@
+from statistics import NormalDist
+import numpy as np
+
+UNKNOWN = "Unknown"
+
+class ScoreNormalizer:
+    def __init__(self, method='zt', cohort_size=50, min_cohort=5, false_accept_rate=0.01,
+                 max_utterances=100, max_frames=200):
+        """
+        Z-norm and T-norm of speaker log-likelihood ratios, with open-set
+        rejection by a calibrated threshold.
+
+        Raw scores are log-likelihood ratios against the UBM.
+        - Z-norm: every speaker's scores are standardised by the mean and
+          std of its scores on a fixed impostor set of utterances. These
+          statistics are computed offline, at training and enrollment.
+        - T-norm: every query score is standardised by the mean and std of
+          the same query's scores on a cohort of enrolled speakers. The
+          cohort is scored in the same batched pass as the candidates, and
+          a speaker is left out of its own cohort statistics.
+        'zt' applies Z-norm first, then T-norm on the Z-normed scores. T-norm
+        is skipped while fewer than min_cohort cohort scores are available.
+
+        Args:
+            method (str): 'z', 't' or 'zt'
+            cohort_size (int): Enrolled speakers used as the T-norm cohort
+            min_cohort (int): Smallest cohort for which T-norm is applied
+            false_accept_rate (float): Impostor acceptance rate the rejection
+                                       threshold is calibrated for
+            max_utterances (int): Utterances kept in the impostor set
+            max_frames (int): Frames kept per impostor utterance
+        """
+        if method not in ('z', 't', 'zt'):
+            raise ValueError(f"Unknown normalization {method}, use 'z', 't' or 'zt'")
+        self.method = method
+        self.cohort_size = cohort_size
+        self.min_cohort = min_cohort
+        self.false_accept_rate = false_accept_rate
+        self.max_utterances = max_utterances
+        self.max_frames = max_frames
+        self.impostor_features = None
+        self.impostor_offsets = np.zeros(1, dtype=np.int64)
+        self.impostor_labels = []
+        # Speaker name -> (mean, std) of its impostor scores
+        self.znorm = {}
+        self.threshold = NormalDist().inv_cdf(1 - false_accept_rate)
+        self._aligned = None
+
+    def __getstate__(self):
+        # Arrays aligned with a bank are rebuilt on demand after unpickling
+        state = self.__dict__.copy()
+        state['_aligned'] = None
+        return state
+
+    def set_impostors(self, corpus_features):
+        """
+        Build the impostor set from a dict of speaker -> list of feature
+        arrays. Utterances are taken round-robin over the speakers, and
+        each is subsampled to at most max_frames evenly spaced frames.
+        """
+        queues = [(speaker, list(speaker_features)) for speaker, speaker_features in corpus_features.items()]
+        utterances = []
+        labels = []
+        index = 0
+        while len(utterances) < self.max_utterances and any(index < len(queue) for _, queue in queues):
+            for speaker, queue in queues:
+                if index < len(queue) and len(queue[index]) and len(utterances) < self.max_utterances:
+                    features = queue[index]
+                    if len(features) > self.max_frames:
+                        features = features[np.linspace(0, len(features) - 1, self.max_frames).astype(int)]
+                    utterances.append(features)
+                    labels.append(speaker)
+            index += 1
+        if not utterances:
+            raise ValueError("No impostor utterances for score normalization")
+        if len(set(labels)) < 2:
+            # Every trial would be a speaker's own utterance: Z-norm has no
+            # impostor scores and the statistics would be NaN
+            raise ValueError(f"Score normalization needs impostor utterances of at least two speakers, "
+                             f"got only {labels[0]}")
+
+        self.impostor_features = np.ascontiguousarray(np.vstack(utterances), dtype=np.float32)
+        self.impostor_offsets = np.concatenate([[0], np.cumsum([len(features) for features in utterances])])
+        self.impostor_labels = labels
+        self.znorm = {}
+        self._aligned = None
+
+    def impostor_scores(self, bank, speakers=None):
+        """
+        Log-likelihood ratios of every impostor utterance against the
+        given speakers (indices, default all), shape (n_utterances, n_speakers).
+        """
+        features = self.impostor_features
+        frame_scores = bank.score_frames(features, speakers).astype(np.float64)
+        frame_scores -= bank.score_ubm_frames(features)[:, np.newaxis]
+        lengths = np.diff(self.impostor_offsets)
+        return np.add.reduceat(frame_scores, self.impostor_offsets[:-1], axis=0) / lengths[:, np.newaxis]
+
+    def _speaker_blocks(self, bank, names):
+        """Yield (names, bank indices, scores) in blocks bounding the frame score memory."""
+        block = max(1, (1 << 24) // max(len(self.impostor_features), 1))
+        position = {name: index for index, name in enumerate(bank.speaker_names)}
+        for start in range(0, len(names), block):
+            block_names = names[start:start + block]
+            indices = np.array([position[name] for name in block_names])
+            yield block_names, indices, self.impostor_scores(bank, indices)
+
+    def update_speakers(self, bank, names=None):
+        """Compute the Z-norm statistics of the given speakers (default all)."""
+        names = list(bank.speaker_names if names is None else names)
+        labels = np.array(self.impostor_labels)
+        for block_names, _, scores in self._speaker_blocks(bank, names):
+            # A speaker's own utterances are not impostor trials
+            scores[labels[:, np.newaxis] == np.array(block_names)[np.newaxis, :]] = np.nan
+            with np.errstate(invalid='ignore'):
+                means = np.nanmean(scores, axis=0)
+                stds = np.nanstd(scores, axis=0)
+            for name, mean, std in zip(block_names, means, stds):
+                self.znorm[name] = (float(mean), float(max(std, 1e-6)))
+        self._aligned = None
+
+    def remove_speaker(self, name):
+        self.znorm.pop(name, None)
+        self._aligned = None
+
+    def calibrate(self, bank):
+        """
+        Set the rejection threshold so that a false_accept_rate fraction of
+        the normalized impostor trials would be accepted.
+        """
+        labels = np.array(self.impostor_labels)
+        names = list(bank.speaker_names)
+        raw = np.empty((len(labels), len(names)))
+        for block_names, indices, scores in self._speaker_blocks(bank, names):
+            raw[:, indices] = scores
+        # Leave the utterances' own speakers out, also from the T-norm cohort
+        raw[labels[:, np.newaxis] == np.array(names)[np.newaxis, :]] = np.nan
+        normalized = np.vstack([self.normalize(row, None, bank) for row in raw])
+        impostor_trials = normalized[np.isfinite(normalized)]
+        if len(impostor_trials):
+            self.threshold = float(np.quantile(impostor_trials, 1 - self.false_accept_rate))
+        return self.threshold
+
+    def fit(self, bank, corpus_features):
+        """Build the impostor set, compute every speaker's statistics and calibrate."""
+        self.set_impostors(corpus_features)
+        self.update_speakers(bank)
+        return self.calibrate(bank)
+
+    def aligned(self, bank):
+        """
+        Z-norm means and stds aligned with the bank's speakers (NaN where
+        missing) and the cohort indices, cached until the speakers change.
+        """
+        if self._aligned is not None and self._aligned[0] is bank.means and \
+                self._aligned[1] == bank.speaker_names:
+            return self._aligned[2:]
+        stats = np.array([self.znorm.get(name, (np.nan, np.nan)) for name in bank.speaker_names],
+                         dtype=np.float64).reshape(-1, 2)
+        # Evenly spread cohort over the enrolled speakers
+        n_cohort = min(self.cohort_size, len(bank))
+        cohort = np.unique(np.linspace(0, len(bank) - 1, n_cohort).astype(int)) if n_cohort else np.zeros(0, int)
+        self._aligned = (bank.means, list(bank.speaker_names), stats[:, 0], stats[:, 1], cohort)
+        return self._aligned[2:]
+
+    def with_cohort(self, speakers, bank):
+        """Append the cohort speakers missing from the speaker indices."""
+        cohort = self.aligned(bank)[2]
+        return np.concatenate([speakers, np.setdiff1d(cohort, speakers)]).astype(int)
+
+    def normalize(self, scores, speakers, bank):
+        """
+        Normalize the log-likelihood ratios of one query.
+
+        Args:
+            scores (ndarray): Ratios of the speakers at indices speakers
+            speakers (ndarray): Bank indices, None for every speaker; must
+                                include the cohort for T-norm (see with_cohort())
+            bank (SpeakerBank): Bank the indices refer to
+
+        Returns:
+            ndarray: Normalized scores in the same order
+        """
+        means, stds, cohort = self.aligned(bank)
+        speakers = np.arange(len(bank)) if speakers is None else np.asarray(speakers)
+        scores = np.asarray(scores, dtype=np.float64)
+        if 'z' in self.method:
+            scores = (scores - means[speakers]) / stds[speakers]
+        if 't' in self.method:
+            member = np.isin(speakers, cohort) & np.isfinite(scores)
+            cohort_scores = scores[member]
+            total = np.full(len(scores), cohort_scores.sum())
+            total_sq = np.full(len(scores), (cohort_scores ** 2).sum())
+            count = np.full(len(scores), len(cohort_scores), dtype=np.float64)
+            # Leave every cohort speaker out of its own statistics
+            total[member] -= scores[member]
+            total_sq[member] -= scores[member] ** 2
+            count[member] -= 1
+            if count.min() >= self.min_cohort:
+                mean = total / count
+                std = np.sqrt(np.maximum(total_sq / count - mean ** 2, 1e-12))
+                scores = (scores - mean) / std
+        return scores
+
+    def decide(self, speaker_names, normalized_scores, threshold=None):
+        """Return the best speaker, or UNKNOWN when its normalized score is below the threshold."""
+        threshold = self.threshold if threshold is None else threshold
+        scores = np.where(np.isfinite(normalized_scores), normalized_scores, -np.inf)
+        best = int(np.argmax(scores))
+        return speaker_names[best] if scores[best] >= threshold else UNKNOWN
+
+    def to_arrays(self, bank):
+        """Arrays and JSON header entry for a model directory."""
+        means, stds, _ = self.aligned(bank)
+        arrays = {
+            'impostor_features': self.impostor_features,
+            'impostor_offsets': self.impostor_offsets,
+            'znorm_means': means,
+            'znorm_stds': stds
+        }
+        header = {
+            'method': self.method,
+            'cohort_size': self.cohort_size,
+            'min_cohort': self.min_cohort,
+            'false_accept_rate': self.false_accept_rate,
+            'max_utterances': self.max_utterances,
+            'max_frames': self.max_frames,
+            'threshold': self.threshold,
+            'impostor_labels': list(self.impostor_labels)
+        }
+        return arrays, header
+
+    @classmethod
+    def from_arrays(cls, header, arrays, speaker_names):
+        """Inverse of to_arrays()."""
+        normalizer = cls(header['method'], header['cohort_size'], header['min_cohort'],
+                         header['false_accept_rate'], header['max_utterances'], header['max_frames'])
+        normalizer.threshold = header['threshold']
+        normalizer.impostor_labels = header['impostor_labels']
+        normalizer.impostor_features = np.asarray(arrays['impostor_features'])
+        normalizer.impostor_offsets = np.asarray(arrays['impostor_offsets'])
+        normalizer.znorm = {name: (float(mean), float(std))
+                            for name, mean, std in zip(speaker_names, arrays['znorm_means'], arrays['znorm_stds'])
+                            if np.isfinite(mean)}
+        return normalizer
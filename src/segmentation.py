@@ -0,0 +1,239 @@
+import sys
+import csv
+import time
+import argparse
+import numpy as np
+#Custom
+from speaker_identification import SpeakerIdentification
+from streaming_identification import StreamingFramer
+from audio_io import iter_audio_blocks
+
+class SpeakerSegmenter:
+    def __init__(self, identifier, window=1.5, hop=0.25, min_duration=None, min_speech=0.3,
+                 top_c=None, normalize=True, block_seconds=30.0):
+        """
+        Who spoke when in a long recording.
+
+        The recording is read in blocks and every frame is scored against
+        every speaker and the UBM exactly once. Running sums of the frame
+        scores over speech frames give the average log-likelihood ratio of
+        any frame range as the difference of two rows, so sliding windows
+        cost O(1) each instead of re-scoring their overlap. Only the sums
+        since the start of the oldest open window are kept, so memory stays
+        bounded by block_seconds plus window whatever the recording length.
+
+        Every window gets its best speaker ("Unknown" below the threshold of
+        models with score normalization), or None when it has too little
+        speech. A label change is only accepted after it persists for
+        min_duration, and runs of equal labels become segments whose scores
+        again come from the running sums.
+
+        Args:
+            identifier (SpeakerIdentification): Trained models
+            window (float): Window length in seconds
+            hop (float): Window step in seconds, the time resolution of the timeline
+            min_duration (float): Shortest segment in seconds (default window)
+            min_speech (float): Fraction of speech frames a window needs
+            top_c (int): Optional top-C fast scoring, see SpeakerBank
+            normalize (bool): Use the models' score normalization if they have it
+            block_seconds (float): Audio read and scored at once
+        """
+        if hop > window:
+            raise ValueError("hop must not be longer than window")
+        self.identifier = identifier
+        self.extractor = identifier.feature_extractor
+        self.bank = identifier.speaker_bank
+        self.speaker_names = list(self.bank.speaker_names)
+        self.normalizer = identifier.score_normalizer if normalize else None
+        self.min_speech = min_speech
+        self.top_c = top_c
+        self.block_seconds = block_seconds
+        self.vad = identifier.vad_scoring
+        self.vad_threshold = identifier.vad_threshold
+        # Lengths in frames
+        self.frame_seconds = self.extractor.frame_stride / self.extractor.sample_rate
+        self.window_frames = max(int(round(window / self.frame_seconds)), 1)
+        self.hop_frames = max(int(round(hop / self.frame_seconds)), 1)
+        self.min_windows = max(int(round((min_duration or window) / hop)), 1)
+        self.reset()
+
+    def reset(self):
+        """Forget all audio fed so far."""
+        self.framer = StreamingFramer(self.extractor)
+        self.max_energy = -np.inf
+        self.n_frames = 0
+        # Running sums of (speaker scores, UBM score, speech frames) before
+        # frame base + row, starting at the next window
+        self.sums = np.zeros((1, len(self.bank) + 2))
+        self.base = 0
+        self.next_window = 0
+        self.current = None
+        self.candidate = None
+        self.timeline = []
+
+    def _score_frames(self, frames):
+        """Score new frames once and extend the running sums."""
+        if len(frames) == 0:
+            return
+        features = self.extractor.features_from_frames(frames)
+        values = np.zeros((len(features), len(self.bank) + 2))
+        speech = np.ones(len(features), dtype=bool)
+        if self.vad:
+            # Against the loudest frame so far, like StreamingIdentifier
+            energy = features[:, 3 * self.extractor.num_ceps]
+            self.max_energy = max(self.max_energy, energy.max())
+            speech = energy >= self.max_energy - self.vad_threshold
+        features = features[speech]
+        if len(features):
+            if self.top_c:
+                values[speech, :-2] = self.bank.score_frames_top_c(features, self.top_c)
+            else:
+                values[speech, :-2] = self.bank.score_frames(features)
+            values[speech, -2] = self.bank.score_ubm_frames(features)
+            values[speech, -1] = 1.0
+        self.sums = np.vstack([self.sums, self.sums[-1] + np.cumsum(values, axis=0)])
+        self.n_frames += len(values)
+
+    def _row(self, frame):
+        return self.sums[frame - self.base]
+
+    def _scores(self, totals, n_frames):
+        """Speaker scores of a frame range from the difference of its sums, or None without enough speech."""
+        count = totals[-1]
+        if count < max(1.0, self.min_speech * n_frames):
+            return None
+        ratios = (totals[:-2] - totals[-2]) / count
+        if self.normalizer is not None:
+            return self.normalizer.normalize(ratios, None, self.bank)
+        return ratios
+
+    def _label(self, scores):
+        if scores is None:
+            return None
+        if self.normalizer is not None:
+            return self.normalizer.decide(self.speaker_names, scores)
+        return self.speaker_names[int(np.argmax(scores))]
+
+    def _close(self, end_frame, end_row):
+        """Add the current segment to the timeline if it is not silence."""
+        label, start_frame, start_row = self.current
+        if label is None or end_frame <= start_frame:
+            return
+        scores = self._scores(end_row - start_row, end_frame - start_frame)
+        if scores is None:
+            score = float('nan')
+        elif label in self.bank:
+            score = float(scores[self.speaker_names.index(label)])
+        else:
+            score = float(np.max(scores))
+        self.timeline.append((start_frame * self.frame_seconds, end_frame * self.frame_seconds, label, score))
+
+    def _add_window(self, start, stop, interval_start):
+        """Label the window of frames [start, stop), which decides the frames from interval_start on."""
+        label = self._label(self._scores(self._row(stop) - self._row(start), stop - start))
+        if self.current is None:
+            self.current = (label, interval_start, self._row(interval_start).copy())
+        elif label == self.current[0]:
+            self.candidate = None
+        else:
+            if self.candidate is None or self.candidate[0] != label:
+                self.candidate = [label, interval_start, self._row(interval_start).copy(), 0]
+            self.candidate[3] += 1
+            if self.candidate[3] >= self.min_windows:
+                # The change persisted, the new segment starts where it began
+                self._close(self.candidate[1], self.candidate[2])
+                self.current = tuple(self.candidate[:3])
+                self.candidate = None
+
+    def _interval_start(self, window):
+        """First frame decided by a window: halfway between its centre and the previous one's."""
+        if window == 0:
+            return 0
+        return window * self.hop_frames + (self.window_frames - self.hop_frames) // 2
+
+    def _emit_windows(self):
+        """Label every complete window and drop the sums no window needs any more."""
+        while self.next_window * self.hop_frames + self.window_frames <= self.n_frames:
+            start = self.next_window * self.hop_frames
+            self._add_window(start, start + self.window_frames, self._interval_start(self.next_window))
+            self.next_window += 1
+        keep_from = self.next_window * self.hop_frames
+        if keep_from > self.base:
+            self.sums = self.sums[keep_from - self.base:].copy()
+            self.base = keep_from
+
+    def feed(self, signal):
+        """Score a block of float samples at the extractor sample rate."""
+        self._score_frames(self.framer.feed(signal))
+        self._emit_windows()
+
+    def finish(self):
+        """
+        Score the tail and close the last segment.
+
+        Returns:
+            list: (start seconds, end seconds, speaker, score) tuples in time
+                  order; speaker is "Unknown" for rejected speech and silence
+                  is left out. score is the segment's normalized score, or its
+                  average log-likelihood ratio against the UBM
+        """
+        self._score_frames(self.framer.finish())
+        self._emit_windows()
+        if self.next_window == 0 and self.n_frames:
+            # Recording shorter than one window
+            self._add_window(0, self.n_frames, 0)
+        if self.current is not None:
+            self._close(self.n_frames, self._row(self.n_frames))
+            self.current = None
+        return self.timeline
+
+    def segment_file(self, audio_path):
+        """
+        Segment a recording, reading it block_seconds at a time.
+
+        Returns:
+            list: Timeline, see finish()
+        """
+        self.reset()
+        start = time.perf_counter()
+        for block in iter_audio_blocks(audio_path, self.extractor.sample_rate, self.block_seconds,
+                                       self.extractor.resampler):
+            self.feed(block)
+        timeline = self.finish()
+        self.seconds = time.perf_counter() - start
+        self.audio_seconds = self.framer.n_samples / self.extractor.sample_rate
+        return timeline
+
+def write_timeline(timeline, path):
+    """Write a timeline as CSV with start, end, speaker and score columns."""
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['start', 'end', 'speaker', 'score'])
+        for start, end, speaker, score in timeline:
+            writer.writerow([f"{start:.2f}", f"{end:.2f}", speaker, f"{score:.4f}"])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Speaker segmentation of a long recording")
+    parser.add_argument('audio', help="Recording to segment")
+    parser.add_argument('--model', default="speaker_models.pkl", help=".pkl file or model directory")
+    parser.add_argument('--window', type=float, default=1.5, help="Window length in seconds")
+    parser.add_argument('--hop', type=float, default=0.25, help="Window step in seconds")
+    parser.add_argument('--min-duration', type=float, default=None, help="Shortest segment in seconds (default: --window)")
+    parser.add_argument('--top-c', type=int, default=None, help="Enable top-C fast scoring")
+    parser.add_argument('--no-normalize', action='store_true', help="Raw scores, no Unknown decisions")
+    parser.add_argument('--output', default=None, help="Timeline CSV")
+    args = parser.parse_args(argv)
+
+    identifier = SpeakerIdentification.load_models(args.model)
+    segmenter = SpeakerSegmenter(identifier, window=args.window, hop=args.hop, min_duration=args.min_duration,
+                                 top_c=args.top_c, normalize=not args.no_normalize)
+    timeline = segmenter.segment_file(args.audio)
+    for start, end, speaker, score in timeline:
+        print(f"{start:9.2f} {end:9.2f}  {speaker:<20} {score:8.3f}")
+    print(f"{segmenter.audio_seconds:.1f}s of audio in {segmenter.seconds:.2f}s "
+          f"({segmenter.audio_seconds / segmenter.seconds:.0f}x real time)")
+    if args.output:
+        write_timeline(timeline, args.output)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,579 @@
+import numpy as np
+#Custom
+from instrumentation import instrumented
+
+def _logsumexp_inplace(log_prob):
+    """Log-sum-exp over the last axis, overwriting log_prob as scratch space."""
+    max_log_prob = log_prob.max(axis=-1)
+    log_prob -= max_log_prob[..., np.newaxis]
+    np.exp(log_prob, out=log_prob)
+    return np.log(log_prob.sum(axis=-1)) + max_log_prob
+
+def gmm_from_params(means, covariances, weights):
+    """Build a fitted diagonal GaussianMixture from raw parameter arrays."""
+    # scikit-learn takes about a second to import and scoring never needs it
+    from sklearn.mixture import GaussianMixture
+    gmm = GaussianMixture(
+        n_components=means.shape[0],
+        covariance_type='diag',
+        random_state=42
+    )
+    gmm.means_ = means
+    gmm.covariances_ = covariances
+    gmm.weights_ = weights
+    gmm.precisions_cholesky_ = 1.0 / np.sqrt(covariances)
+    gmm.precisions_ = 1.0 / covariances
+    gmm.n_features_in_ = means.shape[1]
+    gmm.converged_ = True
+    gmm.n_iter_ = 0
+    gmm.lower_bound_ = -np.inf
+    return gmm
+
+class SpeakerBank:
+    def __init__(self, ubm_means, covariances, weights, speaker_names=None, means=None,
+                 scoring_terms=None, counts=None, first_order=None,
+                 max_block_size=4096, frame_chunk_size=1024, dtype=None):
+        """
+        Stack of MAP-adapted speaker models sharing one diagonal UBM.
+
+        MAP adaptation only moves the means, so the UBM covariances and
+        weights are stored once and the adapted means of every speaker are
+        kept in one contiguous (n_speakers, n_components, n_features) array.
+        All speakers are scored against a feature matrix with a few large
+        matrix products instead of one score_samples call per speaker.
+
+        Args:
+            ubm_means (ndarray): UBM means, shape (n_components, n_features)
+            covariances (ndarray): Diagonal UBM covariances, same shape
+            weights (ndarray): UBM mixture weights, shape (n_components,)
+            speaker_names (list): Names of the enrolled speakers
+            means (ndarray): Adapted means, shape (n_speakers, n_components, n_features)
+            scoring_terms (tuple): Optional precomputed (mean_precisions, constants),
+                                   e.g. memory-mapped from a model directory
+            counts (ndarray): Zeroth-order statistics n_k, shape (n_speakers, n_components)
+            first_order (ndarray): First-order statistics f_k, same shape as means
+            max_block_size (int): Max speaker components scored per matrix product
+            frame_chunk_size (int): Max frames scored per matrix product
+            dtype: Storage and scoring dtype (default: that of ubm_means).
+                   float32 halves memory; log-sum-exp subtracts the per-frame
+                   maximum and score averages accumulate in float64
+        """
+        self.ubm_means = np.ascontiguousarray(ubm_means, dtype=dtype)
+        self.covariances = np.ascontiguousarray(covariances, dtype=dtype)
+        self.weights = np.ascontiguousarray(weights, dtype=dtype)
+        self.max_block_size = max_block_size
+        self.frame_chunk_size = frame_chunk_size
+
+        n_components, n_features = self.ubm_means.shape
+        dtype = self.ubm_means.dtype
+        # Derived terms are computed in float64; the large ones are stored in dtype
+        ubm_means = self.ubm_means.astype(np.float64)
+        precisions = 1.0 / self.covariances.astype(np.float64)
+        self.precisions = precisions.astype(dtype)
+        self.log_weights = np.log(self.weights.astype(np.float64))
+        # Per-component Gaussian normalisation term shared by every speaker
+        self.log_norm = -0.5 * (n_features * np.log(2 * np.pi) - np.sum(np.log(precisions), axis=1))
+        # UBM terms used to select the top-C components of each frame
+        self.ubm_mean_precisions = (ubm_means * precisions).astype(dtype)
+        self.ubm_constants = (self.log_weights + self.log_norm -
+                              0.5 * np.sum(ubm_means ** 2 * precisions, axis=1)).astype(dtype)
+
+        self.speaker_names = []
+        self.means = np.empty((0, n_components, n_features), dtype=self.dtype)
+        # Bumped whenever the speakers change, including in-place updates
+        self.revision = 0
+        # Arrays with spare rows that enrolled speakers are appended into
+        self._buffers = {}
+        self.set_speakers(speaker_names or [], means, scoring_terms, counts, first_order)
+
+    @classmethod
+    def from_ubm(cls, ubm, **kwargs):
+        """Create an empty bank sharing the parameters of a fitted UBM."""
+        return cls(ubm.means_, ubm.covariances_, ubm.weights_, **kwargs)
+
+    @classmethod
+    def from_models(cls, ubm, speaker_models, **kwargs):
+        """Create a bank from a dict of adapted GaussianMixture models."""
+        names = list(speaker_models)
+        means = [speaker_models[name].means_ for name in names]
+        return cls(ubm.means_, ubm.covariances_, ubm.weights_, names, means, **kwargs)
+
+    def __len__(self):
+        return len(self.speaker_names)
+
+    def __contains__(self, name):
+        return name in self.speaker_names
+
+    @property
+    def n_components(self):
+        return self.ubm_means.shape[0]
+
+    @property
+    def n_features(self):
+        return self.ubm_means.shape[1]
+
+    def set_speakers(self, speaker_names, means, scoring_terms=None, counts=None, first_order=None):
+        """
+        Replace all enrolled speakers at once.
+        counts and first_order are the MAP sufficient statistics of each
+        speaker, kept so that enrollments can later be extended.
+        """
+        speaker_names = list(speaker_names)
+        means = self._stack(means, (len(speaker_names),) + self.ubm_means.shape)
+        if counts is not None:
+            # Sufficient statistics always accumulate in float64
+            counts = self._stack(counts, (len(speaker_names), self.n_components), np.float64)
+            first_order = self._stack(first_order, means.shape, np.float64)
+        self.speaker_names = speaker_names
+        self.means = means
+        self.counts = counts
+        self.first_order = first_order
+        self._buffers = {}
+        if scoring_terms is None:
+            self._update_scoring_terms()
+        else:
+            self.mean_precisions, self.constants = scoring_terms
+        self.revision += 1
+
+    def _stack(self, arrays, shape, dtype=None):
+        """Stack per-speaker arrays into one contiguous array of the given shape."""
+        dtype = dtype or self.dtype
+        if isinstance(arrays, np.ndarray):
+            # Keeps memory-mapped arrays mapped instead of copying them
+            stacked = np.ascontiguousarray(arrays, dtype=dtype)
+        elif arrays is not None and len(arrays):
+            stacked = np.ascontiguousarray(np.stack(arrays), dtype=dtype)
+        else:
+            stacked = np.empty(shape, dtype=dtype)
+        if stacked.shape != shape:
+            raise ValueError(f"Expected an array of shape {shape}, got {stacked.shape}")
+        return stacked
+
+    def get_stats(self, name):
+        """Return the (counts, first_order) statistics of a speaker, or None."""
+        if self.counts is None:
+            return None
+        index = self.speaker_names.index(name)
+        counts = self.counts[index]
+        # Speakers loaded from models without statistics are marked with NaN
+        if np.isnan(counts).any():
+            return None
+        return counts, self.first_order[index]
+
+    def add_speaker(self, name, means, counts=None, first_order=None):
+        """
+        Enroll a speaker, replacing the existing entry with the same name.
+        Only the scoring terms of this speaker are computed: a new speaker
+        is appended to the arrays, which keep spare rows so that most
+        appends copy nothing, and a re-enrolled one is overwritten in place.
+        """
+        means = self._stack([means], (1,) + self.ubm_means.shape)
+        mean_precisions, constants = self._scoring_terms(means)
+        rows = {'means': means, 'mean_precisions': mean_precisions, 'constants': constants}
+        if counts is not None or self.counts is not None:
+            # Keep statistics aligned with the speakers; missing ones are NaN
+            if self.counts is None:
+                self.counts = np.full((len(self), self.n_components), np.nan)
+                self.first_order = np.full((len(self),) + self.ubm_means.shape, np.nan)
+            if counts is None:
+                rows['counts'] = np.full((1, self.n_components), np.nan)
+                rows['first_order'] = np.full(means.shape, np.nan)
+            else:
+                rows['counts'] = self._stack([counts], (1, self.n_components), np.float64)
+                rows['first_order'] = self._stack([first_order], means.shape, np.float64)
+        
+        if name in self.speaker_names:
+            index = self.speaker_names.index(name)
+            for attribute, row in rows.items():
+                self._writable(attribute)[index] = row[0]
+        else:
+            for attribute, row in rows.items():
+                self._append(attribute, row[0])
+            self.speaker_names = self.speaker_names + [name]
+        self.revision += 1
+
+    def _append(self, attribute, row):
+        """Append a row to a speaker array, growing its buffer by an eighth when full."""
+        array = getattr(self, attribute)
+        n_speakers = len(array)
+        buffer = self._buffers.get(attribute)
+        if buffer is None or array.base is not buffer or len(buffer) == n_speakers:
+            buffer = np.empty((n_speakers + n_speakers // 8 + 16,) + array.shape[1:], dtype=array.dtype)
+            buffer[:n_speakers] = array
+            self._buffers[attribute] = buffer
+        buffer[n_speakers] = row
+        setattr(self, attribute, buffer[:n_speakers + 1])
+
+    def _writable(self, attribute):
+        """Return a speaker array safe to modify in place, copying it first if it is mapped or shared."""
+        array = getattr(self, attribute)
+        # Memory-mapped model files are never written, saves replace them
+        owned = array.flags.owndata or array.base is self._buffers.get(attribute)
+        if not (array.flags.writeable and owned):
+            array = np.array(array)
+            setattr(self, attribute, array)
+        return array
+
+    def remove_speaker(self, name):
+        """Remove an enrolled speaker, deleting its rows without recomputing the others."""
+        index = self.speaker_names.index(name)
+        for attribute in ('means', 'mean_precisions', 'constants', 'counts', 'first_order'):
+            if getattr(self, attribute) is not None:
+                setattr(self, attribute, np.delete(getattr(self, attribute), index, axis=0))
+        self._buffers = {}
+        self.speaker_names = self.speaker_names[:index] + self.speaker_names[index + 1:]
+        self.revision += 1
+
+    def _scoring_terms(self, means):
+        """Speaker-dependent terms (mean_precisions, constants) of stacked means."""
+        # log N(x | mu, sigma) = const_k + x.(mu * prec) - 0.5 * x^2.prec
+        means = np.asarray(means, dtype=np.float64)
+        mean_precisions = means * self.precisions.astype(np.float64)
+        constants = self.log_weights + self.log_norm - 0.5 * np.sum(means * mean_precisions, axis=-1)
+        return mean_precisions.astype(self.dtype), constants.astype(self.dtype)
+
+    def _update_scoring_terms(self):
+        """Precompute the speaker-dependent terms of the expanded log density."""
+        self.mean_precisions, self.constants = self._scoring_terms(self.means)
+
+    @property
+    def dtype(self):
+        return self.ubm_means.dtype
+
+    @property
+    def nbytes(self):
+        """Memory held by the speaker-dependent arrays."""
+        arrays = [self.means, self.mean_precisions, self.constants, self.counts, self.first_order]
+        return sum(array.nbytes for array in arrays if array is not None)
+
+    @staticmethod
+    def _block_index(speakers, first, last):
+        """Positions first to last of the scored speakers: a slice of all, or of the given indices."""
+        if speakers is None:
+            return slice(first, last)
+        return np.asarray(speakers)[first:last]
+
+    def speaker_block(self, index):
+        """
+        Scoring terms (mean_precisions, constants) of the speakers at index
+        (a slice or index array), the only per-speaker data the scoring
+        kernels read.
+        """
+        return self.mean_precisions[index], self.constants[index]
+
+    @instrumented('bank.score_frames', array_arg=1)
+    def score_frames(self, features, speakers=None):
+        """
+        Return per-frame log-likelihoods of every speaker model.
+
+        Args:
+            features (ndarray): Feature matrix, shape (n_frames, n_features)
+            speakers (array-like): Optional indices of the speakers to score
+
+        Returns:
+            ndarray: Log-likelihoods, shape (n_frames, n_speakers)
+        """
+        features = np.asarray(features, dtype=self.dtype)
+        n_speakers = len(self) if speakers is None else len(speakers)
+        n_components, n_features = self.n_components, self.n_features
+        n_frames = features.shape[0]
+
+        block = max(1, self.max_block_size // n_components)
+        frame_scores = np.empty((n_frames, n_speakers), dtype=self.dtype)
+        for start in range(0, n_frames, self.frame_chunk_size):
+            chunk = features[start:start + self.frame_chunk_size]
+            # Quadratic term is identical for every speaker
+            quadratic = -0.5 * np.dot(chunk ** 2, self.precisions.T)
+            for first in range(0, n_speakers, block):
+                last = min(first + block, n_speakers)
+                mean_precisions, constants = self.speaker_block(self._block_index(speakers, first, last))
+                flat = mean_precisions.reshape(-1, n_features)
+                log_prob = np.dot(chunk, flat.T).reshape(len(chunk), last - first, n_components)
+                log_prob += constants
+                log_prob += quadratic[:, np.newaxis, :]
+                frame_scores[start:start + len(chunk), first:last] = _logsumexp_inplace(log_prob)
+        return frame_scores
+
+    @instrumented('bank.score_frames_top_c', array_arg=1)
+    def score_frames_top_c(self, features, top_c, speakers=None):
+        """
+        Return approximate per-frame log-likelihoods using top-C scoring.
+
+        The UBM is evaluated once per frame and only its top_c best
+        components are evaluated for each speaker model. Since MAP-adapted
+        models stay close to the UBM, the remaining components contribute
+        almost nothing to the likelihood.
+
+        Args:
+            features (ndarray): Feature matrix, shape (n_frames, n_features)
+            top_c (int): Number of UBM components kept per frame
+            speakers (array-like): Optional indices of the speakers to score
+
+        Returns:
+            ndarray: Log-likelihoods, shape (n_frames, n_speakers)
+        """
+        features = np.asarray(features, dtype=self.dtype)
+        n_speakers = len(self) if speakers is None else len(speakers)
+        n_components, n_features = self.n_components, self.n_features
+        n_frames = features.shape[0]
+        top_c = min(top_c, n_components)
+
+        frame_scores = np.empty((n_frames, n_speakers), dtype=self.dtype)
+        for start in range(0, n_frames, self.frame_chunk_size):
+            chunk = features[start:start + self.frame_chunk_size]
+            quadratic = -0.5 * np.dot(chunk ** 2, self.precisions.T)
+            
+            # Select the best UBM components of every frame
+            ubm_log_prob = np.dot(chunk, self.ubm_mean_precisions.T) + self.ubm_constants + quadratic
+            top = np.argpartition(ubm_log_prob, n_components - top_c, axis=1)[:, n_components - top_c:]
+            top_quadratic = np.take_along_axis(quadratic, top, axis=1)
+            
+            # Gathered means take (speakers, frames, top_c, features) memory,
+            # keep it within the budget of an exact-scoring block
+            budget = self.max_block_size * self.frame_chunk_size
+            block = max(1, budget // (len(chunk) * top_c * n_features))
+            for first in range(0, n_speakers, block):
+                last = min(first + block, n_speakers)
+                mean_precisions, constants = self.speaker_block(self._block_index(speakers, first, last))
+                log_prob = np.einsum('snkd,nd->nsk', mean_precisions[:, top], chunk)
+                log_prob += np.transpose(constants[:, top], (1, 0, 2))
+                log_prob += top_quadratic[:, np.newaxis, :]
+                frame_scores[start:start + len(chunk), first:last] = _logsumexp_inplace(log_prob)
+        return frame_scores
+
+    def score_ubm_frames(self, features):
+        """Return per-frame log-likelihoods under the UBM, shape (n_frames,)."""
+        features = np.asarray(features, dtype=self.dtype)
+        frame_scores = np.empty(features.shape[0], dtype=self.dtype)
+        for start in range(0, features.shape[0], self.frame_chunk_size):
+            chunk = features[start:start + self.frame_chunk_size]
+            log_prob = np.dot(chunk, self.ubm_mean_precisions.T) + self.ubm_constants
+            log_prob -= 0.5 * np.dot(chunk ** 2, self.precisions.T)
+            frame_scores[start:start + len(chunk)] = _logsumexp_inplace(log_prob)
+        return frame_scores
+
+    def score_ubm(self, features):
+        """Return the average log-likelihood of features under the UBM."""
+        return float(self.score_ubm_frames(features).mean(dtype=np.float64))
+
+    def score(self, features, speakers=None, top_c=None):
+        """
+        Return the average log-likelihood of features under every speaker model.
+        Exact unless top_c is given, see score_frames_top_c().
+        """
+        if top_c:
+            return self.score_frames_top_c(features, top_c, speakers).mean(axis=0, dtype=np.float64)
+        return self.score_frames(features, speakers).mean(axis=0, dtype=np.float64)
+
+    def to_gaussian_mixture(self, name):
+        """Return one speaker model as a standalone GaussianMixture."""
+        means = self.means[self.speaker_names.index(name)]
+        return gmm_from_params(means, self.covariances, self.weights)
+
+QUANTIZATIONS = ('float16', 'int8')
+
+class DequantizedMeans:
+    def __init__(self, bank):
+        """
+        Read-only stand-in for the means array of a QuantizedSpeakerBank.
+        Indexing by speaker dequantizes only the selected speakers, so code
+        reading bank.means in batches (e.g. SupervectorIndex) never holds
+        the full-precision means of every speaker. A new object replaces it
+        whenever the speakers change.
+        """
+        self.bank = bank
+
+    def __len__(self):
+        return len(self.bank)
+
+    def __getitem__(self, index):
+        return self.bank.dequantize(index)
+
+    def __array__(self, dtype=None, copy=None):
+        means = self.bank.dequantize(slice(None))
+        return means if dtype is None else means.astype(dtype)
+
+    @property
+    def shape(self):
+        return (len(self.bank),) + self.bank.ubm_means.shape
+
+    @property
+    def dtype(self):
+        return self.bank.dtype
+
+class QuantizedSpeakerBank(SpeakerBank):
+    def __init__(self, ubm_means, covariances, weights, speaker_names=None, means=None,
+                 scoring_terms=None, quantization='int8', **kwargs):
+        """
+        Compact SpeakerBank storing quantized mean offsets from the UBM.
+
+        Each speaker keeps only the offsets of its adapted means from the
+        UBM means, in units of the UBM standard deviations, as float16 or
+        as int8 with one scale per component, plus its n_components
+        scoring constants. Scoring dequantizes one block of speakers at a
+        time inside the scoring kernels, so a full-precision copy of the
+        means never exists. With 256 components, 41 features and float64
+        constants a speaker takes 13,568 bytes (13.3 KB) with int8: 10,496
+        bytes of offsets, 1,024 of float32 scales and 2,048 of constants.
+        That is 23,040 bytes (22.5 KB) with float16, against 169,984 bytes
+        (166 KB) for the float64 means and scoring terms of a SpeakerBank,
+        or 256,000 bytes (250 KB) including its enrollment statistics.
+
+        The sufficient statistics are not kept, so update_speaker() needs a
+        re-enrollment, and dequantized means differ from the originals by at
+        most half a quantization step; verify_quantized_scoring() of
+        SpeakerIdentification reports the resulting score drift.
+
+        Args:
+            ubm_means, covariances, weights: UBM parameters, see SpeakerBank
+            speaker_names (list): Names of the enrolled speakers
+            means (ndarray): Adapted means, quantized on the way in
+            scoring_terms (tuple): Optional already quantized (offsets,
+                                   scales, constants), e.g. memory-mapped
+                                   from a model directory; scales is None
+                                   for float16
+            quantization (str): 'int8' or 'float16'
+            **kwargs: max_block_size, frame_chunk_size and dtype, see SpeakerBank
+        """
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"quantization must be one of {QUANTIZATIONS}, got {quantization}")
+        self.quantization = quantization
+        # Offsets are stored in units of the UBM standard deviations
+        self.precision_roots = 1.0 / np.sqrt(np.asarray(covariances, dtype=np.float64))
+        self.ubm_roots = np.asarray(ubm_means, dtype=np.float64) * self.precision_roots
+        kwargs.pop('counts', None)
+        kwargs.pop('first_order', None)
+        super().__init__(ubm_means, covariances, weights, speaker_names, means, scoring_terms, **kwargs)
+
+    @classmethod
+    def from_bank(cls, bank, quantization='int8', **kwargs):
+        """Quantize the speakers of a full-precision SpeakerBank."""
+        compact = cls(bank.ubm_means, bank.covariances, bank.weights, quantization=quantization,
+                      max_block_size=bank.max_block_size, frame_chunk_size=bank.frame_chunk_size, **kwargs)
+        compact.set_speakers(bank.speaker_names, bank.means)
+        return compact
+
+    def set_speakers(self, speaker_names, means, scoring_terms=None, counts=None, first_order=None):
+        """
+        Replace all enrolled speakers at once. counts and first_order are
+        accepted for compatibility with SpeakerBank and dropped.
+        """
+        speaker_names = list(speaker_names)
+        if scoring_terms is not None:
+            offsets, scales, constants = scoring_terms
+        else:
+            n_speakers = len(speaker_names)
+            offsets = np.empty((n_speakers,) + self.ubm_means.shape, dtype=self.quantization)
+            scales = np.empty((n_speakers, self.n_components), dtype=np.float32) \
+                if self.quantization == 'int8' else None
+            constants = np.empty((n_speakers, self.n_components), dtype=self.dtype)
+            # Batches keep the float64 temporaries small for large banks
+            for start in range(0, n_speakers, 256):
+                batch = slice(start, start + 256)
+                batch_offsets, batch_scales = self.quantize(np.asarray(means[batch]))
+                offsets[batch] = batch_offsets
+                if scales is not None:
+                    scales[batch] = batch_scales
+                constants[batch] = self._constants(self._normalized_offsets(batch_offsets, batch_scales))
+        self._set_quantized(speaker_names, offsets, scales, constants)
+
+    def _set_quantized(self, speaker_names, offsets, scales, constants):
+        self.speaker_names = speaker_names
+        self.offsets = offsets
+        self.scales = scales
+        self.constants = constants
+        self.means = DequantizedMeans(self)
+        self.mean_precisions = None
+        self.counts = None
+        self.first_order = None
+        self.revision += 1
+
+    def quantize(self, means):
+        """
+        Quantize adapted means of shape (n, n_components, n_features).
+
+        Returns:
+            tuple: (offsets in the storage type, per-component scales or None)
+        """
+        offsets = (np.asarray(means, dtype=np.float64) - self.ubm_means) * self.precision_roots
+        if self.quantization == 'float16':
+            return offsets.astype(np.float16), None
+        # Symmetric int8 with the largest offset of each component at +-127
+        scales = np.abs(offsets).max(axis=2) / 127.0
+        scales[scales == 0] = 1.0
+        offsets = np.rint(offsets / scales[..., np.newaxis]).astype(np.int8)
+        return offsets, scales.astype(np.float32)
+
+    def _normalized_offsets(self, offsets, scales, dtype=np.float64):
+        """Dequantized offsets in units of the UBM standard deviations."""
+        normalized = offsets.astype(dtype)
+        if scales is not None:
+            normalized *= scales[..., np.newaxis]
+        return normalized
+
+    def _constants(self, normalized):
+        """Scoring constants of dequantized speakers, computed in float64."""
+        # mu^2 * prec = (ubm_mu * sqrt(prec) + offset)^2
+        return self.log_weights + self.log_norm - 0.5 * np.sum((self.ubm_roots + normalized) ** 2, axis=-1)
+
+    def dequantize(self, index):
+        """Adapted means of the speakers at index (an int, slice or index array)."""
+        scales = None if self.scales is None else self.scales[index]
+        normalized = self._normalized_offsets(self.offsets[index], scales)
+        return (self.ubm_means + normalized / self.precision_roots).astype(self.dtype)
+
+    def speaker_block(self, index):
+        """Scoring terms of the speakers at index, dequantized on the fly."""
+        scales = None if self.scales is None else self.scales[index]
+        # mu * prec = ubm_mu * prec + offset * sqrt(prec)
+        mean_precisions = self._normalized_offsets(self.offsets[index], scales, self.dtype)
+        mean_precisions *= self.precision_roots
+        mean_precisions += self.ubm_mean_precisions
+        return mean_precisions, self.constants[index]
+
+    @property
+    def nbytes(self):
+        """Memory held by the speaker-dependent arrays."""
+        arrays = [self.offsets, self.scales, self.constants]
+        return sum(array.nbytes for array in arrays if array is not None)
+
+    def to_arrays(self):
+        """Quantized arrays for a model directory, see scoring_terms."""
+        arrays = {'speaker_offsets': self.offsets, 'speaker_constants': self.constants}
+        if self.scales is not None:
+            arrays['speaker_scales'] = self.scales
+        return arrays
+
+    def get_stats(self, name):
+        """Statistics are not kept in a compact bank."""
+        return None
+
+    def add_speaker(self, name, means, counts=None, first_order=None):
+        """Enroll a speaker, replacing the existing entry with the same name; statistics are dropped."""
+        offsets, scales = self.quantize(np.asarray(means)[np.newaxis])
+        constants = self._constants(self._normalized_offsets(offsets, scales)).astype(self.dtype)
+        speaker_names = list(self.speaker_names)
+        if name in speaker_names:
+            index = speaker_names.index(name)
+            all_offsets = self.offsets.copy()
+            all_offsets[index] = offsets[0]
+            all_constants = self.constants.copy()
+            all_constants[index] = constants[0]
+            all_scales = None
+            if scales is not None:
+                all_scales = self.scales.copy()
+                all_scales[index] = scales[0]
+        else:
+            speaker_names.append(name)
+            all_offsets = np.concatenate([self.offsets, offsets])
+            all_constants = np.concatenate([self.constants, constants])
+            all_scales = None if scales is None else np.concatenate([self.scales, scales])
+        self._set_quantized(speaker_names, all_offsets, all_scales, all_constants)
+
+    def remove_speaker(self, name):
+        """Remove an enrolled speaker."""
+        index = self.speaker_names.index(name)
+        speaker_names = self.speaker_names[:index] + self.speaker_names[index + 1:]
+        scales = None if self.scales is None else np.delete(self.scales, index, axis=0)
+        self._set_quantized(speaker_names, np.delete(self.offsets, index, axis=0), scales,
+                            np.delete(self.constants, index, axis=0))
@@ -1,150 +1,980 @@
 import os
+import time
+import threading
+from collections import deque
 import numpy as np
-from scipy.io import wavfile
-import librosa
-import python_speech_features
-from sklearn.mixture import GaussianMixture
-import joblib
 #Custom
-from feature_extraction import *
+from feature_extraction import AudioFeatureExtractor
+from feature_cache import FeatureCache
+from speaker_bank import SpeakerBank, QuantizedSpeakerBank, gmm_from_params
+from model_io import save_model_dir, load_model_arrays
+from ubm_training import StreamingUBMTrainer, fit_ubm_parallel
+from instrumentation import instrumented
+from speaker_index import SupervectorIndex
+from score_normalization import ScoreNormalizer
+from adaptation import AdaptationEngine
+from feature_store import FeatureStore, feature_config
+
+def apply_unknown_threshold(identified_speaker, scores, threshold=200):
+    """
+    Return "Unknown" when the summed absolute scores exceed the threshold.
+    Legacy rule for models without score normalization statistics, see
+    SpeakerIdentification.fit_score_normalization().
+    """
+    if sum(abs(score) for score in scores.values()) > threshold:
+        return "Unknown"
+    return identified_speaker
+
+def _extract_file(extractor, audio_path):
+    """Process pool entry point: extract features for a single file."""
+    return extractor.extract_features(audio_path)
 
 class SpeakerIdentification:
-    def __init__(self, n_components=128):
+    # Relevance factor for MAP adaptation
+    relevance_factor = 16.0
+    
+    def __init__(self, n_components=128, cache_dir=None, cache_max_bytes=1024 ** 3,
+                 n_jobs=1, executor=None, dtype=np.float64,
+                 vad_scoring=None, vad_training=False, vad_threshold=6.0, adaptation_top_c=None,
+                 bank_quantization=None, ubm_jobs=1):
         self.n_components = n_components
-        self.feature_extractor = AudioFeatureExtractor()
+        # float32 keeps features, UBM fitting, adapted means and scoring in
+        # single precision, halving the working set
+        self.dtype = np.dtype(dtype)
+        self.feature_extractor = AudioFeatureExtractor(dtype=dtype)
         self.ubm = None
-        self.speaker_models = {}
+        self.speaker_bank = None
+        # Coarse search index over the bank, built on first use of top_n
+        self.speaker_index = None
+        # Z-norm/T-norm statistics and rejection threshold (see score_normalization)
+        self.score_normalizer = None
+        # Optional on-disk feature cache shared by training and identification
+        self.feature_cache = FeatureCache(cache_dir, cache_max_bytes) if cache_dir else None
+        # Corpus extraction runs on n_jobs processes (-1 for all cores), or
+        # on a caller-supplied concurrent.futures executor
+        self.n_jobs = n_jobs
+        self.executor = executor
+        # The UBM initializations run on ubm_jobs processes (-1 for all
+        # cores); the trained UBM is the same for any value
+        self.ubm_jobs = ubm_jobs
+        # Energy-based voice activity detection drops silent frames before
+        # UBM training and adaptation (vad_training, saved with the models)
+        # and before scoring; vad_scoring=None follows the training setting,
+        # since scoring with a different setting than training shifts scores
+        self.vad_scoring = vad_scoring
+        self.vad_training = vad_training
+        self.vad_threshold = vad_threshold
+        self.vad_frames_total = 0
+        self.vad_frames_kept = 0
+        # select_speech() runs on server, batcher and evaluation threads
+        self._vad_lock = threading.Lock()
+        # MAP adaptation keeps only the top adaptation_top_c UBM posteriors
+        # of every frame if set, and then reuses those of streaming UBM training
+        self.adaptation_top_c = adaptation_top_c
+        self.adaptation_engine = None
+        self.ubm_posteriors = None
+        # 'int8' or 'float16' builds compact speaker banks storing quantized
+        # mean offsets (see QuantizedSpeakerBank), None for full precision
+        self.bank_quantization = bank_quantization
+    
+    @property
+    def ubm(self):
+        """
+        The UBM as a GaussianMixture. Models loaded from a directory only
+        build it (and import scikit-learn) when it is first used, e.g. by
+        enrollment or top_n search; scoring reads the bank's UBM arrays.
+        """
+        if self._ubm is None and self._ubm_params is not None:
+            self._ubm = gmm_from_params(*self._ubm_params)
+        return self._ubm
+    
+    @ubm.setter
+    def ubm(self, ubm):
+        self._ubm = ubm
+        self._ubm_params = None
+    
+    @property
+    def vad_scoring(self):
+        """Whether scoring drops non-speech frames, by default as in training."""
+        return self.vad_training if self._vad_scoring is None else self._vad_scoring
+    
+    @vad_scoring.setter
+    def vad_scoring(self, vad_scoring):
+        self._vad_scoring = vad_scoring
         
+    @instrumented('identifier.extract_features')
     def extract_features(self, audio_path):
         """Extract features using the AudioFeatureExtractor."""
+        if self.feature_cache is not None:
+            return self.feature_cache.get_or_extract(audio_path, self.feature_extractor)
         return self.feature_extractor.extract_features(audio_path)
 
-    def train_ubm(self, data_dir):
-        """Train Universal Background Model using all available data."""
-        all_features = []
-        
-        # Collect features from all speakers
-        for speaker in os.listdir(data_dir):
+    @instrumented('identifier.select_speech', array_arg=1)
+    def select_speech(self, features):
+        """Drop non-speech frames and count how many were kept."""
+        mask = self.feature_extractor.speech_mask(features, self.vad_threshold)
+        kept = int(mask.sum())
+        # Nothing passes (e.g. near-silent input): keep everything
+        selected = features[mask] if kept else features
+        with self._vad_lock:
+            self.vad_frames_total += len(mask)
+            self.vad_frames_kept += kept or len(mask)
+        return selected
+    
+    @property
+    def vad_kept_fraction(self):
+        """Fraction of frames kept by select_speech() so far."""
+        with self._vad_lock:
+            total, kept = self.vad_frames_total, self.vad_frames_kept
+        if total == 0:
+            return 1.0
+        return kept / total
+    
+    def _training_features(self, features):
+        """Apply voice activity detection to training features if enabled."""
+        return self.select_speech(features) if self.vad_training else features
+    
+    def list_corpus(self, data_dir):
+        """
+        Return (speaker, [audio paths]) pairs in a deterministic order.
+        data_dir may also be a FeatureStore, here and wherever the training
+        methods take a data_dir, to read its features instead of extracting.
+        """
+        if isinstance(data_dir, FeatureStore):
+            return data_dir.list_corpus()
+        corpus = []
+        for speaker in sorted(os.listdir(data_dir)):
             speaker_dir = os.path.join(data_dir, speaker)
             if not os.path.isdir(speaker_dir):
                 continue
-                
-            for audio_file in os.listdir(speaker_dir):
-                if audio_file.endswith('.wav'):
-                    audio_path = os.path.join(speaker_dir, audio_file)
-                    features = self.extract_features(audio_path)
-                    all_features.append(features)
+            audio_paths = [os.path.join(speaker_dir, audio_file)
+                           for audio_file in sorted(os.listdir(speaker_dir))
+                           if audio_file.endswith('.wav')]
+            if audio_paths:
+                corpus.append((speaker, audio_paths))
+        return corpus
+
+    def extract_files(self, audio_paths, executor=None, max_pending=None):
+        """
+        Yield the features of every file in audio_paths, in order.
+
+        Cache hits are read directly and cache misses are extracted on the
+        executor (or in this process if it is None) and stored. At most
+        max_pending files are in flight, so long file lists are processed
+        with bounded memory.
+        """
+        pending = deque()
+        for audio_path in audio_paths:
+            key = None
+            result = None
+            if self.feature_cache is not None:
+                key = self.feature_cache.key(audio_path, self.feature_extractor)
+                result = self.feature_cache.get(key)
+                if result is not None:
+                    key = None
+            if result is None and executor is not None:
+                result = executor.submit(_extract_file, self.feature_extractor, audio_path)
+            pending.append((audio_path, key, result))
+            if max_pending is not None and len(pending) >= max_pending:
+                yield self._collect_features(*pending.popleft())
+        while pending:
+            yield self._collect_features(*pending.popleft())
+
+    def _collect_features(self, audio_path, key, result):
+        """Finish one extract_files() entry: wait, extract or cache as needed."""
+        if result is None:
+            features = self.feature_extractor.extract_features(audio_path)
+        elif isinstance(result, np.ndarray):
+            features = result
+        else:
+            features = result.result()
+        # Store cache misses
+        if key is not None:
+            features = self.feature_cache.put(key, features)
+        return features.astype(self.feature_extractor.dtype, copy=False)
+
+    def _corpus_executor(self):
+        """Return the executor for corpus extraction and whether we own it."""
+        n_jobs = os.cpu_count() if self.n_jobs == -1 else self.n_jobs
+        if self.executor is None and n_jobs > 1:
+            from concurrent.futures import ProcessPoolExecutor
+            return ProcessPoolExecutor(max_workers=n_jobs), True
+        return self.executor, False
+
+    def extract_corpus(self, data_dir):
+        """
+        Extract features for every .wav file under data_dir.
+        
+        Files are spread over a process pool when n_jobs != 1 or an executor
+        is set. Results are returned in list_corpus() order regardless of
+        completion order, as a dict mapping speaker to a list of feature arrays.
+        """
+        if isinstance(data_dir, FeatureStore):
+            # Zero-copy slices unless voice activity detection selects frames
+            return {speaker: [self._training_features(features) for features in speaker_features]
+                    for speaker, speaker_features in data_dir.corpus_features().items()}
+        
+        corpus = self.list_corpus(data_dir)
+        n_files = sum(len(audio_paths) for _, audio_paths in corpus)
+        executor, own_executor = self._corpus_executor()
         
-        # Concatenate all features
-        all_features = np.vstack(all_features)
+        try:
+            # Submit every cache miss up front so the pool stays busy
+            extracted = self.extract_files([audio_path
+                                            for _, audio_paths in corpus
+                                            for audio_path in audio_paths], executor)
+            # Collect results in submission order, one speaker at a time
+            corpus_features = {}
+            index = 0
+            for speaker, audio_paths in corpus:
+                corpus_features[speaker] = [self._training_features(next(extracted))
+                                            for _ in audio_paths]
+                index += len(audio_paths)
+                print(f"Extracted features for speaker {speaker} "
+                      f"({len(audio_paths)} files, {index}/{n_files} total)")
+        finally:
+            if own_executor:
+                executor.shutdown()
+        
+        return corpus_features
+
+    def iter_corpus_features(self, data_dir):
+        """Yield the features of every file under data_dir, one file at a time."""
+        for speaker, audio_paths in self.list_corpus(data_dir):
+            for audio_path in audio_paths:
+                yield self._training_features(self._corpus_file_features(data_dir, audio_path))
+    
+    def _corpus_file_features(self, data_dir, audio_path):
+        """Features of a corpus file, read from data_dir if it is a FeatureStore."""
+        if isinstance(data_dir, FeatureStore):
+            return data_dir.file_features(audio_path)
+        return self.extract_features(audio_path)
+    
+    def update_feature_store(self, data_dir, store_path, compact_ratio=0.25):
+        """
+        Extract the new and changed files under data_dir into the
+        FeatureStore at store_path and drop the deleted ones. Unchanged files
+        are not read again; a different extractor config rebuilds the store.
+        
+        Args:
+            data_dir (str): Directory with one sub-directory of .wav files per speaker
+            store_path (str): Feature store directory
+            compact_ratio (float): Compact once this fraction of the stored
+                                   frames belongs to deleted or changed files
+        
+        Returns:
+            FeatureStore: The updated store
+        """
+        store = FeatureStore(store_path, dtype=self.feature_extractor.dtype)
+        config = feature_config(self.feature_extractor)
+        if not store.matches(config) or store.dtype != self.feature_extractor.dtype:
+            if len(store):
+                print("Extractor configuration changed, rebuilding the feature store")
+            store.reset(config, self.feature_extractor.dtype)
+        n_stored = len(store)
+        pending = store.plan(self.list_corpus(data_dir))
+        n_removed = n_stored - len(store)
+        
+        executor, own_executor = self._corpus_executor()
+        try:
+            extracted = self.extract_files([audio_path for _, audio_path, _ in pending], executor,
+                                           max_pending=256)
+            for index, ((speaker, audio_path, checksum), features) in enumerate(zip(pending, extracted)):
+                store.append(speaker, audio_path, checksum, features)
+                if (index + 1) % 1000 == 0:
+                    # Publish progress so an interrupted build resumes from here
+                    store.commit()
+                    print(f"Stored {index + 1}/{len(pending)} files")
+        finally:
+            if own_executor:
+                executor.shutdown()
+        store.commit()
+        if store.n_frames and store.garbage_frames > compact_ratio * store.n_frames:
+            store.compact()
+        print(f"Feature store {store_path}: {len(store)} files, {store.n_frames} frames "
+              f"({len(pending)} extracted, {n_removed} removed)")
+        return store
+
+    def _resolve_warm_start(self, warm_start):
+        """Return the UBM to warm-start from, given a GaussianMixture or a model path."""
+        if not isinstance(warm_start, (str, os.PathLike)):
+            return warm_start
+        return type(self).load_models(warm_start).ubm
+
+    def train_ubm_streaming(self, data_dir, trainer=None, warm_start=None):
+        """
+        Train the UBM by streaming EM without loading the whole corpus.
+        Every EM iteration re-reads the corpus, so enable the feature cache.
+        """
+        if trainer is None:
+            trainer = self._ubm_trainer()
+        print("Training UBM (streaming)...")
+        self.ubm = trainer.fit(lambda: self.iter_corpus_features(data_dir),
+                               init=self._resolve_warm_start(warm_start))
+        self._keep_ubm_posteriors(trainer)
+        print("UBM training completed")
+
+    def _ubm_trainer(self):
+        """Default EM trainer, keeping posteriors for adaptation when adaptation_top_c is set."""
+        return StreamingUBMTrainer(n_components=self.n_components, dtype=self.dtype,
+                                   keep_top_c=self.adaptation_top_c)
+
+    def _keep_ubm_posteriors(self, trainer):
+        """Remember the trainer's posteriors under the fitted UBM, one per corpus file, for train()."""
+        self.ubm_posteriors = None
+        if trainer.posteriors is not None:
+            self.ubm_posteriors = (self.ubm, trainer.posteriors)
+
+    def _take_ubm_posteriors(self, n_files):
+        """Return the posteriors kept for the current UBM and corpus once, or None."""
+        kept, self.ubm_posteriors = self.ubm_posteriors, None
+        if kept is None or kept[0] is not self.ubm or len(kept[1]) != n_files:
+            return None
+        return kept[1]
+
+    def train_ubm(self, data_dir, corpus_features=None, warm_start=None, trainer=None):
+        """
+        Train Universal Background Model using all available data.
+        
+        Args:
+            data_dir (str): Directory with one sub-directory of .wav files per speaker
+            corpus_features (dict): Features already extracted by extract_corpus()
+            warm_start: Previous UBM (GaussianMixture or saved model path) to
+                        continue EM from when the corpus has only grown; EM
+                        stops early once the log-likelihood gain drops below
+                        the trainer's tol
+            trainer (StreamingUBMTrainer): EM settings for warm starts
+        """
+        if corpus_features is None:
+            corpus_features = self.extract_corpus(data_dir)
+        
+        if warm_start is not None:
+            if trainer is None:
+                trainer = self._ubm_trainer()
+            blocks = [features
+                      for speaker_features in corpus_features.values()
+                      for features in speaker_features]
+            print("Training UBM (warm start)...")
+            self.ubm = trainer.fit(lambda: iter(blocks), init=self._resolve_warm_start(warm_start))
+            self._keep_ubm_posteriors(trainer)
+            print(f"UBM training completed in {len(trainer.history)} iterations, "
+                  f"{sum(step['seconds'] for step in trainer.history):.2f}s")
+            return
+        
+        # Concatenate all features (a compacted store already holds them as one array)
+        if isinstance(data_dir, FeatureStore) and not self.vad_training:
+            all_features = data_dir.live_frames()
+        else:
+            all_features = np.vstack([features
+                                      for speaker_features in corpus_features.values()
+                                      for features in speaker_features])
         
         # Train UBM
         print("Training UBM...")
-        self.ubm = GaussianMixture(
-            n_components=self.n_components,
-            covariance_type='diag',
-            n_init=5,
-            random_state=42
-        )
-        self.ubm.fit(all_features)
+        self.ubm_posteriors = None
+        # Independent seeded initializations, in parallel when ubm_jobs > 1
+        self.ubm = fit_ubm_parallel(all_features, self.n_components, n_init=5,
+                                    n_jobs=self.ubm_jobs, random_state=42, dtype=self.dtype)
         print("UBM training completed")
         
-    def adapt_model(self, features, ubm):
-        """Perform MAP adaptation for speaker-specific model."""
-        # Relevance factor for MAP adaptation
-        relevance_factor = 16.0
+    def get_adaptation_engine(self, ubm):
+        """Return the AdaptationEngine of ubm, built once per UBM."""
+        engine = self.adaptation_engine
+        if engine is None or engine.ubm is not ubm or engine.top_c != self.adaptation_top_c:
+            engine = self.adaptation_engine = AdaptationEngine(ubm, top_c=self.adaptation_top_c,
+                                                               dtype=self.dtype)
+        return engine
+    
+    @instrumented('identifier.accumulate_stats', array_arg=1)
+    def accumulate_stats(self, features, ubm):
+        """Return the zeroth- and first-order statistics (n_k, f_k) of features."""
+        # Streamed in chunks, statistics accumulated in float64
+        return self.get_adaptation_engine(ubm).accumulate(features)
+    
+    def adapt_speakers(self, blocks, n_speakers):
+        """
+        Accumulate the statistics of many speakers in one batched pass.
         
-        # Get statistics from UBM
-        responsibilities = ubm.predict_proba(features)
+        Args:
+            blocks: Iterable of (speaker index, features, posteriors or None),
+                    see AdaptationEngine.accumulate_speakers()
+            n_speakers (int): Number of speakers
         
-        # Calculate sufficient statistics
-        n_k = responsibilities.sum(axis=0)
-        f_k = np.dot(responsibilities.T, features)
+        Returns:
+            tuple: Adapted means, n_k and f_k, stacked over the speakers
+        """
+        n_k, f_k = self.get_adaptation_engine(self.ubm).accumulate_speakers(blocks, n_speakers)
+        return self.means_from_stats(n_k, f_k, self.ubm), n_k, f_k
         
+    def means_from_stats(self, n_k, f_k, ubm):
+        """MAP-adapt the UBM means given sufficient statistics, of one speaker or stacked."""
         # Calculate adaptation coefficients
-        alpha_k = n_k / (n_k + relevance_factor)
+        alpha_k = n_k / (n_k + self.relevance_factor)
         
-        # Adapt means
-        adapted_means = (alpha_k[:, np.newaxis] * (f_k / n_k[:, np.newaxis])) + \
-                       ((1 - alpha_k[:, np.newaxis]) * ubm.means_)
+        # Adapt means (components with no data keep the UBM mean)
+        adapted_means = (alpha_k[..., np.newaxis] * (f_k / np.maximum(n_k, 1e-10)[..., np.newaxis])) + \
+                       ((1 - alpha_k[..., np.newaxis]) * ubm.means_)
         
-        # Create adapted model
-        adapted_model = GaussianMixture(
-            n_components=self.n_components,
-            covariance_type='diag',
-            random_state=42
-        )
+        return adapted_means
         
-        # Set parameters
-        adapted_model.means_ = adapted_means
-        adapted_model.covariances_ = ubm.covariances_
-        adapted_model.weights_ = ubm.weights_
-        adapted_model.precisions_cholesky_ = ubm.precisions_cholesky_
+    def adapt_means(self, features, ubm):
+        """Perform MAP adaptation of the UBM means to the given features."""
+        n_k, f_k = self.accumulate_stats(features, ubm)
+        return self.means_from_stats(n_k, f_k, ubm)
         
-        return adapted_model
-    
-    def train(self, data_dir):
-        """Train speaker-specific models using MAP adaptation."""
-        # First train UBM if not already trained
-        if self.ubm is None:
-            self.train_ubm(data_dir)
+    def adapt_model(self, features, ubm):
+        """Perform MAP adaptation for speaker-specific model."""
+        adapted_means = self.adapt_means(features, ubm)
         
-        # Train speaker-specific models
-        for speaker in os.listdir(data_dir):
-            speaker_dir = os.path.join(data_dir, speaker)
-            if not os.path.isdir(speaker_dir):
-                continue
-            
-            speaker_features = []
-            for audio_file in os.listdir(speaker_dir):
-                if audio_file.endswith('.wav'):
-                    audio_path = os.path.join(speaker_dir, audio_file)
-                    features = self.extract_features(audio_path)
-                    speaker_features.append(features)
+        # Create adapted model sharing the UBM covariances and weights
+        return gmm_from_params(adapted_means, ubm.covariances_, ubm.weights_)
+    
+    def _new_speaker_bank(self):
+        """Empty bank for the trained UBM, compact if bank_quantization is set."""
+        if self.bank_quantization is not None:
+            return QuantizedSpeakerBank.from_ubm(self.ubm, quantization=self.bank_quantization, dtype=self.dtype)
+        return SpeakerBank.from_ubm(self.ubm, dtype=self.dtype)
+    
+    @property
+    def speaker_models(self):
+        """Enrolled speakers as standalone GaussianMixture models."""
+        if self.speaker_bank is None:
+            return {}
+        return {speaker: self.speaker_bank.to_gaussian_mixture(speaker)
+                for speaker in self.speaker_bank.speaker_names}
+    
+    def train(self, data_dir, streaming=False, warm_start=None):
+        """
+        Train speaker-specific models using MAP adaptation.
+        With streaming=True only one file's features are held in memory at a
+        time: the UBM is trained by train_ubm_streaming() and every speaker
+        is adapted from statistics accumulated file by file.
+        With warm_start (a GaussianMixture or saved model path) the UBM is
+        refitted starting from that model instead of from scratch.
+        """
+        if streaming:
+            if self.ubm is None or warm_start is not None:
+                self.train_ubm_streaming(data_dir, warm_start=warm_start)
+            corpus = self.list_corpus(data_dir)
+            posteriors = self._take_ubm_posteriors(sum(len(audio_paths) for _, audio_paths in corpus))
             
-            # Concatenate all features for this speaker
-            speaker_features = np.vstack(speaker_features)
+            def blocks():
+                # Files in the order the UBM trainer saw them
+                kept = iter(posteriors) if posteriors is not None else None
+                for index, (speaker, audio_paths) in enumerate(corpus):
+                    print(f"Adapting model for speaker {speaker}")
+                    for audio_path in audio_paths:
+                        features = self._training_features(self._corpus_file_features(data_dir, audio_path))
+                        yield index, features, next(kept) if kept is not None else None
             
-            # Adapt UBM to create speaker-specific model
-            print(f"Adapting model for speaker {speaker}")
-            self.speaker_models[speaker] = self.adapt_model(speaker_features, self.ubm)
+            adapted_means, counts, first_order = self.adapt_speakers(blocks(), len(corpus))
+            self.speaker_bank = self._new_speaker_bank()
+            self.speaker_bank.set_speakers([speaker for speaker, _ in corpus], adapted_means,
+                                           counts=counts, first_order=first_order)
+            if self.vad_training:
+                print(f"Voice activity detection kept {self.vad_kept_fraction * 100:.1f}% of the frames")
+            self.fit_score_normalization(data_dir)
+            print("Training completed for all speakers")
+            return
+        
+        # Extract every file once for both the UBM and the speaker models
+        corpus_features = self.extract_corpus(data_dir)
+        if self.vad_training:
+            print(f"Voice activity detection kept {self.vad_kept_fraction * 100:.1f}% of the frames")
         
+        # First train UBM if not already trained
+        if self.ubm is None or warm_start is not None:
+            self.train_ubm(data_dir, corpus_features, warm_start=warm_start)
+        
+        # Adapt every speaker-specific model in one batched pass
+        speakers = list(corpus_features)
+        print(f"Adapting models for {len(speakers)} speakers")
+        posteriors = self._take_ubm_posteriors(sum(len(speaker_features)
+                                                   for speaker_features in corpus_features.values()))
+        kept = iter(posteriors) if posteriors is not None else None
+        adapted_means, counts, first_order = self.adapt_speakers(
+            ((index, features, next(kept) if kept is not None else None)
+             for index, speaker in enumerate(speakers)
+             for features in corpus_features[speaker]),
+            len(speakers))
+        
+        # Stack all speakers into one bank sharing the UBM parameters
+        self.speaker_bank = self._new_speaker_bank()
+        self.speaker_bank.set_speakers(speakers, adapted_means, counts=counts, first_order=first_order)
+        self.fit_score_normalization(corpus_features=corpus_features)
         print("Training completed for all speakers")
     
-    def identify_speaker(self, audio_path):
-        """Identify speaker from audio file."""
+    def fit_score_normalization(self, data_dir=None, corpus_features=None, normalizer=None):
+        """
+        Compute the Z-norm statistics of every enrolled speaker on an
+        impostor set drawn from the corpus, and calibrate the rejection
+        threshold. Runs at the end of train(); call it directly to add
+        normalization to models trained without it. Skipped with fewer than
+        two speakers, whose decisions then use apply_unknown_threshold().
+        
+        Args:
+            data_dir (str): Corpus directory, only the impostor files are extracted
+            corpus_features (dict): Features already extracted by extract_corpus()
+            normalizer (ScoreNormalizer): Settings (default ScoreNormalizer())
+        """
+        normalizer = normalizer or self.score_normalizer or ScoreNormalizer()
+        # Training features already went through select_speech() with vad_training
+        from_training = corpus_features is not None
+        if corpus_features is None:
+            # At most max_utterances files are used, spread over the speakers
+            corpus = self.list_corpus(data_dir)
+            per_speaker = -(-normalizer.max_utterances // max(len(corpus), 1))
+            corpus_features = {speaker: [self._corpus_file_features(data_dir, audio_path)
+                                         for audio_path in audio_paths[:per_speaker]]
+                               for speaker, audio_paths in corpus}
+        if sum(1 for speaker_features in corpus_features.values() if len(speaker_features)) < 2:
+            self.score_normalizer = None
+            print("Score normalization skipped: it needs at least two speakers")
+            return
+        if self.vad_scoring and not (from_training and self.vad_training):
+            # Impostor trials see the same frames as queries
+            corpus_features = {speaker: [self.select_speech(features) for features in speaker_features]
+                               for speaker, speaker_features in corpus_features.items()}
+        threshold = normalizer.fit(self.speaker_bank, corpus_features)
+        self.score_normalizer = normalizer
+        print(f"Score normalization ({normalizer.method}-norm) fitted on "
+              f"{len(normalizer.impostor_labels)} impostor utterances, threshold {threshold:.3f}")
+    
+    def _stats_from_files(self, audio_paths):
+        """Accumulate sufficient statistics over a list of audio files."""
+        n_k = np.zeros(self.ubm.means_.shape[0])
+        f_k = np.zeros(self.ubm.means_.shape)
+        for audio_path in audio_paths:
+            features = self._training_features(self.extract_features(audio_path))
+            file_n_k, file_f_k = self.accumulate_stats(features, self.ubm)
+            n_k += file_n_k
+            f_k += file_f_k
+        return n_k, f_k
+    
+    def enroll_speaker(self, name, audio_paths):
+        """
+        Enroll a new speaker against the already trained UBM.
+        The speaker's sufficient statistics are kept in the bank so that
+        update_speaker() only needs the new files. Call save_models() to persist.
+        """
+        if self.ubm is None:
+            raise ValueError("The UBM must be trained before enrolling speakers")
+        if self.speaker_bank is None:
+            self.speaker_bank = self._new_speaker_bank()
+        if name in self.speaker_bank:
+            raise ValueError(f"Speaker {name} is already enrolled, use update_speaker()")
+        
+        n_k, f_k = self._stats_from_files(audio_paths)
+        self.speaker_bank.add_speaker(name, self.means_from_stats(n_k, f_k, self.ubm), n_k, f_k)
+        if self.score_normalizer is not None:
+            self.score_normalizer.update_speakers(self.speaker_bank, [name])
+        print(f"Enrolled speaker {name} from {len(audio_paths)} files")
+    
+    def update_speaker(self, name, more_paths):
+        """Add more audio to an enrolled speaker without reprocessing old files."""
+        if self.speaker_bank is None or name not in self.speaker_bank:
+            raise KeyError(f"Speaker {name} is not enrolled")
+        stats = self.speaker_bank.get_stats(name)
+        if stats is None:
+            raise ValueError(f"No sufficient statistics stored for speaker {name}, "
+                             f"remove and re-enroll it with all of its audio")
+        
+        n_k, f_k = self._stats_from_files(more_paths)
+        n_k = n_k + stats[0]
+        f_k = f_k + stats[1]
+        self.speaker_bank.add_speaker(name, self.means_from_stats(n_k, f_k, self.ubm), n_k, f_k)
+        if self.score_normalizer is not None:
+            self.score_normalizer.update_speakers(self.speaker_bank, [name])
+        print(f"Updated speaker {name} with {len(more_paths)} files")
+    
+    def remove_speaker(self, name):
+        """Remove an enrolled speaker."""
+        if self.speaker_bank is None or name not in self.speaker_bank:
+            raise KeyError(f"Speaker {name} is not enrolled")
+        self.speaker_bank.remove_speaker(name)
+        if self.score_normalizer is not None:
+            self.score_normalizer.remove_speaker(name)
+    
+    @instrumented('identifier.identify_speaker')
+    def identify_speaker(self, audio_path, top_c=None, top_n=None, normalize=False):
+        """
+        Identify speaker from audio file.
+        If top_c is set, only the top_c best UBM components of each frame are
+        scored for every speaker (fast approximate scoring).
+        If top_n is set, only the top_n candidates found by the supervector
+        index are scored (see search_candidates()).
+        With normalize, see identify_features().
+        """
         # Extract features from test audio
         features = self.extract_features(audio_path)
         
-        # Calculate log-likelihood for each speaker
-        scores = {}
-        for speaker, model in self.speaker_models.items():
-            scores[speaker] = np.mean(model.score_samples(features))
+        return self.identify_features(features, top_c, top_n=top_n, normalize=normalize)
+    
+    def identify_signal(self, signal, sample_rate=None, top_c=None, top_n=None, normalize=False):
+        """Identify speaker from an in-memory mono signal."""
+        features = self.feature_extractor.extract_from_array(signal, sample_rate)
+        return self.identify_features(features, top_c, top_n=top_n, normalize=normalize)
+    
+    def get_index(self):
+        """Return the supervector index of the bank, rebuilt when speakers changed."""
+        if self.speaker_index is None or self.speaker_index.is_stale(self.speaker_bank):
+            self.speaker_index = SupervectorIndex(self.speaker_bank)
+        return self.speaker_index
+    
+    def search_candidates(self, features, top_n):
+        """
+        Coarse search: MAP-adapt the UBM to the query once and return the
+        indices of the top_n enrolled speakers with the most similar
+        supervectors, best first.
+        """
+        query_means = self.adapt_means(features, self.ubm)
+        return self.get_index().search(query_means, top_n)
+    
+    @instrumented('identifier.identify_features', array_arg=1)
+    def identify_features(self, features, top_c=None, vad=None, top_n=None, normalize=False):
+        """
+        Identify speaker from an extracted feature matrix.
+        Non-speech frames are dropped first unless vad (default
+        self.vad_scoring) is False. With top_n only the top_n candidates of
+        the supervector index are scored exactly, and only they appear in
+        the returned scores.
+        
+        With normalize, the scores are normalized log-likelihood ratios
+        (see ScoreNormalizer) and the speaker is "Unknown" when the best one
+        is below the calibrated threshold. Models without normalization
+        statistics fall back to raw scores and apply_unknown_threshold().
+        """
+        if self.vad_scoring if vad is None else vad:
+            features = self.select_speech(features)
+        
+        bank = self.speaker_bank
+        speakers = None
+        speaker_names = bank.speaker_names
+        if top_n and top_n < len(bank):
+            speakers = self.search_candidates(features, top_n)
+            speaker_names = [speaker_names[index] for index in speakers]
+        
+        normalizer = self.score_normalizer if normalize else None
+        if normalizer is not None:
+            # The T-norm cohort is scored in the same pass as the candidates
+            n_candidates = len(speaker_names)
+            if speakers is not None:
+                speakers = normalizer.with_cohort(speakers, bank)
+            ratios = bank.score(features, speakers=speakers, top_c=top_c) - bank.score_ubm(features)
+            normalized = normalizer.normalize(ratios, speakers, bank)[:n_candidates]
+            scores = dict(zip(speaker_names, normalized))
+            return normalizer.decide(speaker_names, normalized), scores
+        
+        # Calculate log-likelihood for every speaker in one batched pass
+        speaker_scores = bank.score(features, speakers=speakers, top_c=top_c)
+        scores = dict(zip(speaker_names, speaker_scores))
         
         # Return speaker with highest score
         identified_speaker = max(scores.items(), key=lambda x: x[1])[0]
+        if normalize:
+            identified_speaker = apply_unknown_threshold(identified_speaker, scores)
         return identified_speaker, scores
     
+    def verify_top_c_scoring(self, audio_paths, top_c=5):
+        """
+        Report how far top-C scores drift from exact scores on held-out files.
+        
+        Both modes score the frames identify_features() would score, i.e.
+        the speech frames when self.vad_scoring is set.
+        
+        Returns:
+            dict: max/mean absolute score drift, fraction of files where both
+                  modes pick the same speaker, and the mean speedup
+        """
+        drifts = []
+        agreements = 0
+        exact_time = 0.0
+        fast_time = 0.0
+        for audio_path in audio_paths:
+            features = self.extract_features(audio_path)
+            if self.vad_scoring:
+                features = self.select_speech(features)
+            
+            start = time.perf_counter()
+            exact = self.speaker_bank.score(features)
+            exact_time += time.perf_counter() - start
+            
+            start = time.perf_counter()
+            fast = self.speaker_bank.score(features, top_c=top_c)
+            fast_time += time.perf_counter() - start
+            
+            drifts.append(np.abs(fast - exact))
+            agreements += int(np.argmax(fast) == np.argmax(exact))
+        
+        drifts = np.concatenate(drifts)
+        report = {
+            'top_c': top_c,
+            'n_files': len(audio_paths),
+            'max_abs_drift': float(drifts.max()),
+            'mean_abs_drift': float(drifts.mean()),
+            'decision_agreement': agreements / len(audio_paths),
+            'speedup': exact_time / fast_time if fast_time > 0 else float('inf')
+        }
+        print(f"Top-{top_c} scoring: max drift {report['max_abs_drift']:.4f}, "
+              f"mean drift {report['mean_abs_drift']:.4f}, "
+              f"agreement {report['decision_agreement'] * 100:.1f}%, "
+              f"speedup {report['speedup']:.1f}x")
+        return report
+    
+    def verify_index_recall(self, audio_paths, top_n=10):
+        """
+        Report how often the coarse search keeps the speaker that exhaustive
+        scoring picks, on held-out files.
+        
+        Returns:
+            dict: recall (fraction of files whose exhaustive best speaker is
+                  among the top_n candidates, so both searches decide the
+                  same), mean candidate rank of that speaker when found,
+                  and the mean speedup
+        """
+        hits = 0
+        ranks = []
+        exact_time = 0.0
+        search_time = 0.0
+        for audio_path in audio_paths:
+            features = self.extract_features(audio_path)
+            if self.vad_scoring:
+                features = self.select_speech(features)
+            
+            start = time.perf_counter()
+            best = int(np.argmax(self.speaker_bank.score(features)))
+            exact_time += time.perf_counter() - start
+            
+            self.get_index()
+            start = time.perf_counter()
+            candidates = self.search_candidates(features, top_n)
+            self.speaker_bank.score(features, speakers=candidates)
+            search_time += time.perf_counter() - start
+            
+            found = np.flatnonzero(candidates == best)
+            if len(found):
+                hits += 1
+                ranks.append(int(found[0]) + 1)
+        
+        report = {
+            'top_n': top_n,
+            'n_speakers': len(self.speaker_bank),
+            'n_files': len(audio_paths),
+            'recall': hits / len(audio_paths),
+            'mean_rank': float(np.mean(ranks)) if ranks else float('nan'),
+            'speedup': exact_time / search_time if search_time > 0 else float('inf')
+        }
+        print(f"Top-{top_n} of {report['n_speakers']} speakers: recall {report['recall'] * 100:.1f}%, "
+              f"mean rank {report['mean_rank']:.2f}, speedup {report['speedup']:.1f}x")
+        return report
+    
+    def verify_dtype_scoring(self, audio_paths, dtype=np.float32):
+        """
+        Report how far scores computed entirely in dtype (features, bank and
+        scoring) drift from this identifier's scores on held-out files.
+        
+        Returns:
+            dict: max/mean absolute score drift, decision agreement and the
+                  memory of both speaker banks in bytes
+        """
+        bank = self.speaker_bank
+        extractor = AudioFeatureExtractor.from_config(dict(self.feature_extractor.get_config(),
+                                                           dtype=np.dtype(dtype).name))
+        other_bank = SpeakerBank(bank.ubm_means, bank.covariances, bank.weights,
+                                 bank.speaker_names, bank.means, dtype=dtype)
+        
+        drifts = []
+        agreements = 0
+        for audio_path in audio_paths:
+            signal = self.feature_extractor.load_audio(audio_path)
+            reference = bank.score(self.feature_extractor.extract_from_array(signal))
+            other = other_bank.score(extractor.extract_from_array(signal))
+            drifts.append(np.abs(other - reference))
+            agreements += int(np.argmax(other) == np.argmax(reference))
+        
+        drifts = np.concatenate(drifts)
+        report = {
+            'dtype': np.dtype(dtype).name,
+            'n_files': len(audio_paths),
+            'max_abs_drift': float(drifts.max()),
+            'mean_abs_drift': float(drifts.mean()),
+            'decision_agreement': agreements / len(audio_paths),
+            'bank_bytes': int(bank.means.nbytes + bank.mean_precisions.nbytes),
+            'other_bank_bytes': int(other_bank.means.nbytes + other_bank.mean_precisions.nbytes)
+        }
+        print(f"{report['dtype']} scoring: max drift {report['max_abs_drift']:.4f}, "
+              f"mean drift {report['mean_abs_drift']:.4f}, "
+              f"agreement {report['decision_agreement'] * 100:.1f}%, "
+              f"bank {report['bank_bytes']} -> {report['other_bank_bytes']} bytes")
+        return report
+    
+    def compact_speaker_bank(self, quantization='int8'):
+        """
+        Replace the speaker bank by a QuantizedSpeakerBank, and build
+        compact banks from now on. Check the effect first with
+        verify_quantized_scoring().
+        """
+        self.speaker_bank = QuantizedSpeakerBank.from_bank(self.speaker_bank, quantization,
+                                                           dtype=self.speaker_bank.dtype)
+        self.bank_quantization = quantization
+        print(f"Speaker bank quantized to {quantization}: "
+              f"{self.speaker_bank.nbytes / max(len(self.speaker_bank), 1) / 1024:.1f} KB per speaker")
+    
+    def verify_quantized_scoring(self, audio_paths, quantization='int8', labels=None):
+        """
+        Report how far the scores of a quantized copy of the speaker bank
+        drift from this identifier's full-precision scores on held-out files.
+        
+        Args:
+            audio_paths (list): Test files
+            quantization (str): 'int8' or 'float16', see QuantizedSpeakerBank
+            labels (list): Optional true speaker of every file, for accuracy
+        
+        Returns:
+            dict: max/mean absolute score drift, decision agreement, the
+                  accuracy of both banks when labels are given, and the
+                  memory per speaker of both banks in bytes
+        """
+        bank = self.speaker_bank
+        compact = QuantizedSpeakerBank.from_bank(bank, quantization, dtype=bank.dtype)
+        normalizer = self.score_normalizer
+        
+        drifts = []
+        agreements = 0
+        decision_agreements = 0
+        correct = 0
+        compact_correct = 0
+        for file_index, audio_path in enumerate(audio_paths):
+            features = self.extract_features(audio_path)
+            if self.vad_scoring:
+                features = self.select_speech(features)
+            reference = bank.score(features)
+            other = compact.score(features)
+            drifts.append(np.abs(other - reference))
+            agreements += int(np.argmax(other) == np.argmax(reference))
+            if normalizer is not None:
+                # Open-set decisions, including "Unknown"
+                ubm_score = bank.score_ubm(features)
+                decision_agreements += int(
+                    normalizer.decide(bank.speaker_names, normalizer.normalize(reference - ubm_score, None, bank)) ==
+                    normalizer.decide(compact.speaker_names, normalizer.normalize(other - ubm_score, None, compact)))
+            if labels is not None:
+                correct += int(bank.speaker_names[int(np.argmax(reference))] == labels[file_index])
+                compact_correct += int(compact.speaker_names[int(np.argmax(other))] == labels[file_index])
+        
+        drifts = np.concatenate(drifts)
+        n_speakers = max(len(bank), 1)
+        report = {
+            'quantization': quantization,
+            'n_files': len(audio_paths),
+            'max_abs_drift': float(drifts.max()),
+            'mean_abs_drift': float(drifts.mean()),
+            'decision_agreement': agreements / len(audio_paths),
+            'bytes_per_speaker': bank.nbytes / n_speakers,
+            'compact_bytes_per_speaker': compact.nbytes / n_speakers
+        }
+        if normalizer is not None:
+            report['normalized_decision_agreement'] = decision_agreements / len(audio_paths)
+        if labels is not None:
+            report['accuracy'] = correct / len(audio_paths)
+            report['compact_accuracy'] = compact_correct / len(audio_paths)
+        print(f"{quantization} bank: max drift {report['max_abs_drift']:.4f}, "
+              f"mean drift {report['mean_abs_drift']:.4f}, "
+              f"agreement {report['decision_agreement'] * 100:.1f}%, "
+              f"{report['bytes_per_speaker'] / 1024:.1f} -> {report['compact_bytes_per_speaker'] / 1024:.1f} KB per speaker")
+        if labels is not None:
+            print(f"Accuracy {report['accuracy'] * 100:.1f}% -> {report['compact_accuracy'] * 100:.1f}%")
+        return report
+    
     def save_models(self, path):
-        """Save trained models to disk."""
+        """
+        Save trained models to disk.
+        Paths ending in .pkl are written with joblib, anything else as a
+        memory-mappable model directory (see model_io). Both replace an
+        existing model atomically, so running servers never load half a file.
+        """
+        if not path.endswith('.pkl'):
+            save_model_dir(self, path)
+            return
+        import joblib
         models_dict = {
             'ubm': self.ubm,
-            'speaker_models': self.speaker_models,
+            'speaker_bank': self.speaker_bank,
             'n_components': self.n_components,
-            'n_mfcc': self.feature_extractor
+            'feature_extractor': self.feature_extractor,
+            'score_normalizer': self.score_normalizer,
+            'vad_training': self.vad_training,
+            'vad_threshold': self.vad_threshold
         }
-        joblib.dump(models_dict, path)
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        joblib.dump(models_dict, tmp_path)
+        os.replace(tmp_path, path)
     
     @classmethod
-    def load_models(cls, path):
+    def load_models(cls, path, mmap_mode='r'):
         """Load trained models from disk."""
+        if os.path.isdir(path):
+            return cls.load_model_dir(path, mmap_mode)
+        
+        # Unpickling the models imports scikit-learn anyway
+        import joblib
         models_dict = joblib.load(path)
         
         # Create a new instance with loaded parameters
         identifier = cls(n_components=models_dict['n_components'])
         
+        # Older files store the extractor under 'n_mfcc'
+        extractor = models_dict.get('feature_extractor', models_dict.get('n_mfcc'))
+        if extractor is not None:
+            identifier.feature_extractor = extractor
+        
         # Set the models
         identifier.ubm = models_dict['ubm']
-        identifier.speaker_models = models_dict['speaker_models']
+        if 'speaker_bank' in models_dict:
+            identifier.speaker_bank = models_dict['speaker_bank']
+        else:
+            # Older files store one GaussianMixture per speaker
+            identifier.speaker_bank = SpeakerBank.from_models(identifier.ubm, models_dict['speaker_models'])
+        identifier.dtype = identifier.speaker_bank.dtype
+        identifier.score_normalizer = models_dict.get('score_normalizer')
+        # Older files were trained without VAD
+        identifier.vad_training = models_dict.get('vad_training', False)
+        identifier.vad_threshold = models_dict.get('vad_threshold', identifier.vad_threshold)
+        
+        return identifier
+    
+    @classmethod
+    def load_model_dir(cls, path, mmap_mode='r'):
+        """Load a model directory written by save_models()."""
+        header, arrays = load_model_arrays(path, mmap_mode)
+        
+        identifier = cls(n_components=header['n_components'])
+        identifier.feature_extractor = AudioFeatureExtractor.from_config(header['extractor'])
+        # Older directories were trained without VAD
+        vad = header.get('vad', {'training': False})
+        identifier.vad_training = vad['training']
+        identifier.vad_threshold = vad.get('threshold', identifier.vad_threshold)
+        identifier._ubm_params = (arrays['ubm_means'], arrays['ubm_covariances'], arrays['ubm_weights'])
+        if 'quantization' in header:
+            identifier.speaker_bank = QuantizedSpeakerBank(
+                arrays['ubm_means'], arrays['ubm_covariances'], arrays['ubm_weights'],
+                header['speakers'],
+                scoring_terms=(arrays['speaker_offsets'], arrays.get('speaker_scales'),
+                               arrays['speaker_constants']),
+                quantization=header['quantization']
+            )
+            identifier.bank_quantization = header['quantization']
+        else:
+            identifier.speaker_bank = SpeakerBank(
+                arrays['ubm_means'], arrays['ubm_covariances'], arrays['ubm_weights'],
+                header['speakers'], arrays['speaker_means'],
+                scoring_terms=(arrays['speaker_mean_precisions'], arrays['speaker_constants']),
+                counts=arrays.get('speaker_counts'),
+                first_order=arrays.get('speaker_first_order')
+            )
+        identifier.dtype = identifier.speaker_bank.dtype
+        if 'normalization' in header:
+            identifier.score_normalizer = ScoreNormalizer.from_arrays(header['normalization'], arrays,
+                                                                      header['speakers'])
         
-        return identifier
\ No newline at end of file
+        return identifier
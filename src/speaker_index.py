@@ -0,0 +1,109 @@
+import numpy as np
+
+class SupervectorIndex:
+    def __init__(self, bank, dtype=np.float32):
+        """
+        Coarse search index over the speakers of a SpeakerBank.
+
+        Every speaker is represented by a GMM supervector: the offsets of its
+        adapted means from the UBM means, scaled by sqrt(weight) / stddev of
+        each component and flattened. Inner products of these vectors
+        approximate the KL divergence between the models, so the candidates
+        most similar to a MAP-adapted query are the speakers most likely to
+        score best, and only those need exact likelihood scoring.
+
+        A QuantizedSpeakerBank already stores the offsets in units of the
+        UBM standard deviations, so the index reads its quantized offsets
+        block by block while searching and only keeps one norm per speaker
+        instead of a copy of every supervector.
+
+        Args:
+            bank (SpeakerBank): Enrolled speakers
+            dtype: Storage type of the supervectors of full-precision banks
+        """
+        self.dtype = np.dtype(dtype)
+        self.ubm_means = np.asarray(bank.ubm_means, dtype=np.float64)
+        self.weight_roots = np.sqrt(np.asarray(bank.weights, dtype=np.float64))
+        self.scale = self.weight_roots[:, np.newaxis] / np.sqrt(np.asarray(bank.covariances, dtype=np.float64))
+        self.speaker_names = list(bank.speaker_names)
+        # Means array and revision of the bank the index was built from, see is_stale()
+        self.source_means = bank.means
+        self.source_revision = bank.revision
+        if getattr(bank, 'quantization', None) is not None:
+            self.vectors = None
+            self.offsets = bank.offsets
+            self.offset_scales = bank.scales
+            self.norms = np.empty(len(bank), dtype=np.float32)
+            for start in range(0, len(bank), 256):
+                vectors = self._quantized_vectors(slice(start, start + 256))
+                self.norms[start:start + 256] = np.maximum(np.linalg.norm(vectors, axis=1), 1e-12)
+            return
+        self.vectors = np.empty((len(bank), bank.n_components * bank.n_features), dtype=self.dtype)
+        # Batches keep the float64 temporaries small for large banks
+        for start in range(0, len(bank), 256):
+            self.vectors[start:start + 256] = self.supervectors(bank.means[start:start + 256])
+
+    def __len__(self):
+        return len(self.speaker_names)
+
+    @property
+    def nbytes(self):
+        """Bytes held by the index besides the bank it reads from."""
+        if self.vectors is None:
+            return self.norms.nbytes
+        return self.vectors.nbytes
+
+    def _quantized_vectors(self, index):
+        """Unnormalized supervectors of the quantized speakers at index, in float32."""
+        offsets = self.offsets[index].astype(np.float32)
+        if self.offset_scales is not None:
+            offsets *= self.offset_scales[index][..., np.newaxis]
+        offsets *= self.weight_roots.astype(np.float32)[:, np.newaxis]
+        return offsets.reshape(len(offsets), -1)
+
+    def supervectors(self, means):
+        """
+        Unit-length supervectors of adapted means.
+
+        Args:
+            means (ndarray): Shape (n_components, n_features), or stacked
+                             (n, n_components, n_features)
+
+        Returns:
+            ndarray: Shape (n_components * n_features,) or (n, n_components * n_features)
+        """
+        means = np.asarray(means, dtype=np.float64)
+        offsets = (means - self.ubm_means) * self.scale
+        vectors = offsets.reshape(offsets.shape[:-2] + (-1,))
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return (vectors / np.maximum(norms, 1e-12)).astype(self.dtype)
+
+    def is_stale(self, bank):
+        """Whether speakers were added, removed or updated since the index was built."""
+        return (bank.means is not self.source_means or bank.revision != self.source_revision or
+                list(bank.speaker_names) != self.speaker_names)
+
+    def similarities(self, query_means):
+        """Cosine similarity of every speaker's supervector to the query's."""
+        query = self.supervectors(query_means)
+        if self.vectors is not None:
+            return self.vectors @ query
+        query = query.astype(np.float32)
+        similarities = np.empty(len(self), dtype=np.float32)
+        for start in range(0, len(self), 256):
+            block = slice(start, start + 256)
+            similarities[block] = self._quantized_vectors(block) @ query
+        return similarities / self.norms
+
+    def search(self, query_means, top_n):
+        """
+        Return the indices of the top_n speakers most similar to adapted
+        query means, best first.
+        """
+        similarities = self.similarities(query_means)
+        top_n = min(top_n, len(similarities))
+        if top_n < len(similarities):
+            candidates = np.argpartition(-similarities, top_n - 1)[:top_n]
+        else:
+            candidates = np.arange(len(similarities))
+        return candidates[np.argsort(-similarities[candidates])]
@@ -0,0 +1,184 @@
+import numpy as np
+#Custom
+from speaker_identification import apply_unknown_threshold
+
+class StreamingFramer:
+    def __init__(self, extractor):
+        """
+        Pre-emphasis and framing of a signal that arrives in chunks. The
+        frames are identical to framing() of the whole pre-emphasized signal.
+
+        Args:
+            extractor (AudioFeatureExtractor): Frame size, stride and pre-emphasis
+        """
+        self.extractor = extractor
+        self.reset()
+
+    def reset(self):
+        self.buffer = np.zeros(0)
+        self.last_sample = None
+        self.n_samples = 0
+        self.n_frames = 0
+
+    def _emphasize(self, signal):
+        """Pre-emphasis that carries the previous sample across chunks."""
+        previous = signal[0] if self.last_sample is None else \
+                   signal[0] - self.extractor.preemphasis_coef * self.last_sample
+        emphasized = np.append(previous, signal[1:] - self.extractor.preemphasis_coef * signal[:-1])
+        self.last_sample = signal[-1]
+        return emphasized
+
+    def feed(self, chunk):
+        """Add float samples and return every frame they complete, shape (n, frame_size)."""
+        chunk = np.asarray(chunk, dtype=np.float32)
+        frame_size = self.extractor.frame_size
+        frame_stride = self.extractor.frame_stride
+        if len(chunk) == 0:
+            return np.zeros((0, frame_size))
+        self.n_samples += len(chunk)
+        self.buffer = np.concatenate([self.buffer, self._emphasize(chunk)])
+
+        # Cut every complete frame out of the buffer
+        if len(self.buffer) < frame_size:
+            return np.zeros((0, frame_size))
+        n_new = (len(self.buffer) - frame_size) // frame_stride + 1
+        frames = np.lib.stride_tricks.sliding_window_view(self.buffer, frame_size)[::frame_stride][:n_new]
+        self.buffer = self.buffer[n_new * frame_stride:]
+        self.n_frames += n_new
+        return frames
+
+    def finish(self):
+        """Return the zero-padded tail frames that offline framing adds at the end."""
+        frame_size = self.extractor.frame_size
+        frame_stride = self.extractor.frame_stride
+        expected = int(np.ceil((self.n_samples - frame_size) / frame_stride)) + 1
+        missing = expected - self.n_frames
+        if missing <= 0:
+            return np.zeros((0, frame_size))
+        pad_length = (missing - 1) * frame_stride + frame_size
+        tail = np.pad(self.buffer, (0, max(pad_length - len(self.buffer), 0)))
+        frames = np.lib.stride_tricks.sliding_window_view(tail, frame_size)[::frame_stride][:missing]
+        self.buffer = np.zeros(0)
+        self.n_frames += missing
+        return frames
+
+class StreamingIdentifier:
+    def __init__(self, identifier, margin_threshold=2.0, min_frames=100, top_c=None):
+        """
+        Identify a speaker incrementally from a stream of PCM chunks.
+
+        Incoming samples are pre-emphasized and framed as they arrive (see
+        StreamingFramer), and only the new frames are turned into features and scored. Every
+        speaker keeps a running log-likelihood sum, so each chunk costs the
+        same no matter how long the stream has been running. Features are
+        identical to offline extraction since every feature row only depends
+        on its own frame.
+
+        Args:
+            identifier (SpeakerIdentification): Trained models
+            margin_threshold (float): Stop once the top speaker leads the
+                                      runner-up by this average log-likelihood
+            min_frames (int): Frames required before an early decision
+            top_c (int): Optional top-C fast scoring, see SpeakerBank
+        """
+        self.identifier = identifier
+        self.extractor = identifier.feature_extractor
+        self.bank = identifier.speaker_bank
+        self.margin_threshold = margin_threshold
+        self.min_frames = min_frames
+        self.top_c = top_c
+        # Voice activity detection against the loudest frame seen so far
+        self.vad = identifier.vad_scoring
+        self.vad_threshold = identifier.vad_threshold
+        # UBM sums are only needed for normalized decisions
+        self.normalizer = identifier.score_normalizer
+        self.framer = StreamingFramer(self.extractor)
+        self.reset()
+
+    def reset(self):
+        """Forget all audio fed so far."""
+        self.framer.reset()
+        self.n_frames = 0
+        self.n_speech_frames = 0
+        self.max_energy = -np.inf
+        self.score_sums = np.zeros(len(self.bank))
+        self.ubm_score_sum = 0.0
+        self.done = False
+
+    def _score_frames(self, frames):
+        if len(frames) == 0:
+            return
+        features = self.extractor.features_from_frames(frames)
+        self.n_frames += len(frames)
+        if self.vad:
+            energy = features[:, 3 * self.extractor.num_ceps]
+            self.max_energy = max(self.max_energy, energy.max())
+            features = features[energy >= self.max_energy - self.vad_threshold]
+            if len(features) == 0:
+                return
+        if self.top_c:
+            frame_scores = self.bank.score_frames_top_c(features, self.top_c)
+        else:
+            frame_scores = self.bank.score_frames(features)
+        self.score_sums += frame_scores.sum(axis=0)
+        if self.normalizer is not None:
+            self.ubm_score_sum += self.bank.score_ubm_frames(features).sum()
+        self.n_speech_frames += len(features)
+
+    def feed(self, chunk):
+        """
+        Add a chunk of audio and return the provisional result.
+
+        Args:
+            chunk: 16-bit PCM bytes, or a float array at the extractor sample rate
+        """
+        if isinstance(chunk, (bytes, bytearray)):
+            chunk = np.frombuffer(chunk, dtype='<i2').astype(np.float32) / 32768.0
+        self._score_frames(self.framer.feed(chunk))
+        return self.result()
+
+    def finish(self):
+        """Score the zero-padded tail like offline framing does, and return the final result."""
+        self._score_frames(self.framer.finish())
+        return self.result()
+
+    def result(self):
+        """
+        Return the current decision.
+
+        Returns:
+            dict: speaker, confidence (softmax weight of the top speaker over
+                  the average scores), margin to the runner-up, average scores
+                  per speaker, speech frames scored, fraction of frames kept
+                  by voice activity detection, whether the decision is final,
+                  and the decision after open-set rejection ("Unknown" below
+                  the normalized threshold, or by apply_unknown_threshold()
+                  for models without score normalization)
+        """
+        if self.n_speech_frames == 0:
+            return {'speaker': None, 'confidence': 0.0, 'margin': 0.0, 'scores': {}, 'n_frames': 0,
+                    'speech_fraction': 0.0, 'done': False, 'decision': None}
+        scores = self.score_sums / self.n_speech_frames
+        order = np.argsort(scores)[::-1]
+        margin = scores[order[0]] - scores[order[1]] if len(scores) > 1 else np.inf
+        weights = np.exp(scores - scores[order[0]])
+        if self.n_speech_frames >= self.min_frames and margin >= self.margin_threshold:
+            self.done = True
+        speaker = self.bank.speaker_names[order[0]]
+        score_dict = dict(zip(self.bank.speaker_names, scores))
+        if self.normalizer is not None:
+            ratios = scores - self.ubm_score_sum / self.n_speech_frames
+            decision = self.normalizer.decide(self.bank.speaker_names,
+                                              self.normalizer.normalize(ratios, None, self.bank))
+        else:
+            decision = apply_unknown_threshold(speaker, score_dict)
+        return {
+            'speaker': speaker,
+            'confidence': float(1.0 / weights.sum()),
+            'margin': float(margin),
+            'scores': score_dict,
+            'n_frames': self.n_speech_frames,
+            'speech_fraction': self.n_speech_frames / self.n_frames,
+            'done': self.done,
+            'decision': decision
+        }
@@ -1,17 +1,19 @@
 #Custom files######################## 
-from recorder import * 
-from speaker_identification import * 
+from speaker_identification import SpeakerIdentification
+from identification_client import IdentificationClient
+# recorder (pyaudio, pynput) and evaluation are imported by the modes that use them
 ##################################### 
 TRAIN   = "train" 
 IDENTIF = "identification"  
 TEST  = "test"
+STREAM = "stream"
 ##########
 MODE = IDENTIF
 ###########
 if __name__ == "__main__":    
     if MODE == TRAIN:     
         # Initialize speaker identification system         
-        speaker_id = SpeakerIdentification(n_components=256)   
+        speaker_id = SpeakerIdentification(n_components=256, cache_dir="feature_cache", n_jobs=-1, ubm_jobs=-1)   
         # Train the system         
         data_dir = "../audio"         
         speaker_id.train(data_dir)
@@ -19,31 +21,33 @@ if __name__ == "__main__":
         speaker_id.save_models("speaker_models.pkl")     
         
     elif  MODE == IDENTIF :
-        #speaker_id = SpeakerIdentification(n_components=256)          
-        # for loading instead of training again #         
-        speaker_id = SpeakerIdentification.load_models("speaker_models.pkl")
         test_audio = "./test_data/moetaz.wav"
-        #test_audio = record_voice() 
-        identified_speaker, scores = speaker_id.identify_speaker(test_audio)           
+        #from recorder import record_voice; test_audio = record_voice() 
+        client = IdentificationClient()
+        if client.is_available():
+            # identification_server.py already holds the models in memory
+            result = client.identify_file(test_audio)
+            identified_speaker, scores = result['decision'], result['scores']
+        else:
+            #speaker_id = SpeakerIdentification(n_components=256)          
+            # for loading instead of training again #         
+            speaker_id = SpeakerIdentification.load_models("speaker_models.pkl")
+            identified_speaker, scores = speaker_id.identify_speaker(test_audio, normalize=True)
         #print("\nScores for each speaker:") 
-        tempscore = 0    
         for speaker, score in scores.items():                
             print(f"{speaker}: {score:.2f}")
-            tempscore += abs(score)
-        if tempscore > 200 :
-            identified_speaker = "Unknown"         
         print(f"\nIdentified speaker: {identified_speaker}")
 
-    # if MODE == TEST:
-    #     speaker_id = SpeakerIdentification.load_models("speaker_models.pkl")
-
-    #     audio_path = "../audio/omar"
-    #     count = 0
-    #     for audio_file in os.listdir(audio_path):
-    #         print(audio_file)
-    #         identified_speaker, scores = speaker_id.identify_speaker(f"{audio_path}/{audio_file}")
-    #         if (identified_speaker == "omar"):
-    #             count +=1
-    #     print(f"Precision: {(count/len(os.listdir(audio_path)))*100}%")
+    elif MODE == STREAM:
+        # Identify live from the microphone and stop once the decision is clear
+        from recorder import stream_identify
+        speaker_id = SpeakerIdentification.load_models("speaker_models.pkl")
+        result = stream_identify(speaker_id)
+        print(f"\nIdentified speaker: {result['decision']}")
 
-    
\ No newline at end of file
+    elif MODE == TEST:
+        # Identify every file under the labelled directory and report metrics
+        from evaluation import BatchEvaluator
+        speaker_id = SpeakerIdentification.load_models("speaker_models.pkl")
+        evaluator = BatchEvaluator(speaker_id)
+        evaluator.evaluate("../audio", output_path="test_scores.csv")
@@ -0,0 +1,293 @@
+import os
+import time
+import numpy as np
+#Custom
+from speaker_bank import gmm_from_params
+from adaptation import top_c_posteriors
+
+class StreamingUBMTrainer:
+    def __init__(self, n_components=128, max_iter=100, tol=1e-3, reg_covar=1e-6,
+                 chunk_size=8192, reservoir_size=100000, init_max_iter=20, random_state=42,
+                 dtype=np.float64, keep_top_c=None):
+        """
+        Diagonal-covariance UBM trained by EM over a stream of feature blocks.
+
+        Each EM iteration makes one pass over the blocks and only keeps the
+        sufficient statistics (n_k, f_k, s_k), so peak memory depends on
+        chunk_size, reservoir_size and the model size, not on the corpus size
+        (except for the posteriors kept with keep_top_c).
+        Initial parameters come from a GaussianMixture fitted on a uniform
+        reservoir sample of all frames, or from a previous UBM (warm start).
+
+        Args:
+            n_components (int): Number of mixture components
+            max_iter (int): Maximum number of EM passes over the data
+            tol (float): Stop early once the average log-likelihood improves less than this
+            reg_covar (float): Added to the diagonal covariances
+            chunk_size (int): Frames processed at once inside a block
+            reservoir_size (int): Frames kept for initialization
+            init_max_iter (int): EM iterations of the initial fit on the reservoir
+            random_state (int): Seed for the reservoir and the initial fit
+            dtype: Type of the per-frame computations and of the returned
+                   UBM; the statistics are always accumulated in float64 and
+                   the initial fit always runs in float64
+            keep_top_c (int): Keep the top keep_top_c posteriors of every
+                              frame under the fitted UBM in self.posteriors, one
+                              (indices, values) pair per block, for reuse by
+                              AdaptationEngine. They are collected by one extra
+                              E-pass after EM and take O(frames * keep_top_c)
+                              memory, which grows with the corpus size.
+        """
+        self.n_components = n_components
+        self.max_iter = max_iter
+        self.tol = tol
+        self.reg_covar = reg_covar
+        self.chunk_size = chunk_size
+        self.reservoir_size = reservoir_size
+        self.init_max_iter = init_max_iter
+        self.random_state = random_state
+        self.dtype = np.dtype(dtype)
+        self.keep_top_c = keep_top_c
+        self.posteriors = None
+        self.log_likelihoods = []
+        self.history = []
+
+    def reservoir_sample(self, blocks):
+        """Draw a uniform sample of at most reservoir_size frames from the blocks."""
+        rng = np.random.RandomState(self.random_state)
+        reservoir = None
+        seen = 0
+        for block in blocks:
+            block = np.asarray(block)
+            if reservoir is None:
+                reservoir = np.empty((self.reservoir_size, block.shape[1]), dtype=block.dtype)
+
+            # Fill the reservoir first
+            n_fill = min(max(self.reservoir_size - seen, 0), len(block))
+            reservoir[seen:seen + n_fill] = block[:n_fill]
+
+            # Then replace random slots with decreasing probability (algorithm R)
+            rest = block[n_fill:]
+            if len(rest):
+                positions = seen + n_fill + np.arange(len(rest))
+                slots = (rng.random_sample(len(rest)) * (positions + 1)).astype(np.int64)
+                keep = slots < self.reservoir_size
+                reservoir[slots[keep]] = rest[keep]
+            seen += len(block)
+
+        if reservoir is None:
+            raise ValueError("No feature blocks to train the UBM on")
+        return reservoir[:min(seen, self.reservoir_size)]
+
+    def initialize(self, sample):
+        """Fit initial UBM parameters on a sample of frames."""
+        # Imported on use, so that loading models for scoring stays light
+        from sklearn.mixture import GaussianMixture
+        gmm = GaussianMixture(
+            n_components=self.n_components,
+            covariance_type='diag',
+            max_iter=self.init_max_iter,
+            reg_covar=self.reg_covar,
+            random_state=self.random_state
+        )
+        # float32 covariances collapse in scikit-learn's EM, see cast_ubm()
+        gmm.fit(np.asarray(sample, dtype=np.float64))
+        return gmm.means_, gmm.covariances_, gmm.weights_
+
+    def accumulate(self, blocks, means, covariances, weights, posteriors=None):
+        """
+        E-step over all blocks.
+        Returns the statistics (n_k, f_k, s_k), the total log-likelihood and
+        the number of frames. If posteriors is a list, the top keep_top_c
+        posteriors of every block are appended to it.
+        """
+        n_components, n_features = means.shape
+        precisions = 1.0 / covariances
+        mean_precisions = means * precisions
+        constants = np.log(weights) - 0.5 * (
+            n_features * np.log(2 * np.pi)
+            - np.sum(np.log(precisions), axis=1)
+            + np.sum(means * mean_precisions, axis=1)
+        )
+        precisions = precisions.astype(self.dtype)
+        mean_precisions = mean_precisions.astype(self.dtype)
+        constants = constants.astype(self.dtype)
+
+        n_k = np.zeros(n_components)
+        f_k = np.zeros((n_components, n_features))
+        s_k = np.zeros((n_components, n_features))
+        total_log_likelihood = 0.0
+        n_frames = 0
+        for block in blocks:
+            block_posteriors = []
+            for start in range(0, len(block), self.chunk_size):
+                chunk = np.asarray(block[start:start + self.chunk_size], dtype=self.dtype)
+                chunk_sq = chunk ** 2
+                log_prob = np.dot(chunk, mean_precisions.T) - 0.5 * np.dot(chunk_sq, precisions.T) + constants
+                if posteriors is not None:
+                    block_posteriors.append(top_c_posteriors(log_prob, self.keep_top_c))
+
+                # Responsibilities via a stable log-sum-exp
+                max_log_prob = log_prob.max(axis=1, keepdims=True)
+                resp = np.exp(log_prob - max_log_prob)
+                frame_likelihood = resp.sum(axis=1, keepdims=True)
+                resp /= frame_likelihood
+                total_log_likelihood += np.sum(np.log(frame_likelihood) + max_log_prob, dtype=np.float64)
+
+                n_k += resp.sum(axis=0, dtype=np.float64)
+                f_k += np.dot(resp.T, chunk)
+                s_k += np.dot(resp.T, chunk_sq)
+                n_frames += len(chunk)
+            if posteriors is not None:
+                if not block_posteriors:
+                    block_posteriors.append(top_c_posteriors(np.zeros((0, n_components)), self.keep_top_c))
+                posteriors.append((np.concatenate([indices for indices, _ in block_posteriors]),
+                                   np.concatenate([values for _, values in block_posteriors])))
+        return n_k, f_k, s_k, total_log_likelihood, n_frames
+
+    def maximize(self, n_k, f_k, s_k, n_frames):
+        """M-step: new (means, covariances, weights) from the statistics."""
+        safe_n_k = np.maximum(n_k, 10 * np.finfo(np.float64).eps)
+        means = f_k / safe_n_k[:, np.newaxis]
+        covariances = s_k / safe_n_k[:, np.newaxis] - means ** 2 + self.reg_covar
+        covariances = np.maximum(covariances, self.reg_covar)
+        weights = safe_n_k / n_frames
+        return means, covariances, weights / weights.sum()
+
+    def fit(self, block_source, init=None):
+        """
+        Train the UBM.
+
+        Args:
+            block_source (callable): Returns a fresh iterator over feature
+                                     blocks, one call per pass over the data
+            init (GaussianMixture): Optional previous UBM to warm-start from
+
+        Returns:
+            GaussianMixture: Fitted UBM usable by adapt_model()
+        """
+        if init is not None:
+            means, covariances, weights = init.means_, init.covariances_, init.weights_
+        else:
+            sample = self.reservoir_sample(block_source())
+            means, covariances, weights = self.initialize(sample)
+            del sample
+
+        self.log_likelihoods = []
+        self.history = []
+        self.converged_ = False
+        self.posteriors = None
+        for iteration in range(self.max_iter):
+            start = time.perf_counter()
+            n_k, f_k, s_k, log_likelihood, n_frames = self.accumulate(block_source(), means, covariances, weights)
+            log_likelihood /= n_frames
+            means, covariances, weights = self.maximize(n_k, f_k, s_k, n_frames)
+            elapsed = time.perf_counter() - start
+
+            improvement = log_likelihood - self.log_likelihoods[-1] if self.log_likelihoods else float('nan')
+            self.log_likelihoods.append(log_likelihood)
+            self.history.append({
+                'iteration': iteration + 1,
+                'log_likelihood': log_likelihood,
+                'improvement': improvement,
+                'seconds': elapsed
+            })
+            print(f"UBM iteration {iteration + 1}: average log-likelihood {log_likelihood:.4f} "
+                  f"(improvement {improvement:.5f}, {elapsed:.2f}s)")
+
+            if abs(improvement) < self.tol:
+                self.converged_ = True
+                break
+
+        ubm = gmm_from_params(means, covariances, weights)
+        ubm.converged_ = self.converged_
+        ubm.n_iter_ = len(self.log_likelihoods)
+        ubm.lower_bound_ = self.log_likelihoods[-1]
+        ubm = cast_ubm(ubm, self.dtype)
+
+        if self.keep_top_c:
+            # Collected once after EM: kept on every pass, the previous pass's
+            # posteriors would still be alive while the next were built
+            posteriors = []
+            self.accumulate(block_source(), *(np.asarray(param, dtype=np.float64)
+                                              for param in (ubm.means_, ubm.covariances_, ubm.weights_)),
+                            posteriors=posteriors)
+            self.posteriors = posteriors
+        return ubm
+
+def cast_ubm(gmm, dtype):
+    """
+    Return a fitted UBM with its parameters in dtype.
+    UBMs are always fitted in float64: scikit-learn's EM on float32 frames
+    fails with "ill-defined empirical covariance" even at 8 components.
+    """
+    dtype = np.dtype(dtype)
+    if gmm.means_.dtype == dtype:
+        return gmm
+    ubm = gmm_from_params(gmm.means_.astype(dtype), gmm.covariances_.astype(dtype),
+                          gmm.weights_.astype(dtype))
+    ubm.converged_ = gmm.converged_
+    ubm.n_iter_ = gmm.n_iter_
+    ubm.lower_bound_ = gmm.lower_bound_
+    return ubm
+
+def _fit_single_init(features, n_components, random_state, max_iter, tol):
+    """
+    Process pool entry point: one cold-start GaussianMixture fit.
+    features is an array, or the path of a .npy file that is memory-mapped
+    so every process shares the same pages instead of a pickled copy.
+    """
+    from sklearn.mixture import GaussianMixture
+    if isinstance(features, str):
+        features = np.load(features, mmap_mode='r')
+    # float32 covariances collapse in scikit-learn's EM, see cast_ubm()
+    features = np.asarray(features, dtype=np.float64)
+    start = time.perf_counter()
+    gmm = GaussianMixture(
+        n_components=n_components,
+        covariance_type='diag',
+        max_iter=max_iter,
+        tol=tol,
+        random_state=random_state
+    )
+    gmm.fit(features)
+    return gmm, time.perf_counter() - start
+
+def fit_ubm_parallel(features, n_components, n_init=5, n_jobs=-1, random_state=42, max_iter=100, tol=1e-3,
+                     dtype=np.float64):
+    """
+    Cold-start UBM fit with the independent initializations run in parallel.
+
+    Every initialization is a single-init GaussianMixture fit with its own
+    seed drawn from random_state, and the one with the highest lower bound
+    wins, like n_init does. The seeds do not depend on n_jobs, so the same
+    features and random_state give the same UBM on any number of processes;
+    n_jobs=1 runs the initializations in this process. The result differs
+    from GaussianMixture(n_init=n_init), which draws all initializations
+    from one random state.
+
+    With more than one process the features are written once to a
+    temporary .npy file that the workers memory-map.
+
+    The fits always run in float64; the parameters of the returned UBM are
+    cast to dtype.
+    """
+    seeds = np.random.RandomState(random_state).randint(np.iinfo(np.int32).max, size=n_init)
+    n_jobs = os.cpu_count() if n_jobs == -1 else n_jobs
+    if n_jobs <= 1:
+        results = [_fit_single_init(features, n_components, int(seed), max_iter, tol) for seed in seeds]
+    else:
+        import tempfile
+        from concurrent.futures import ProcessPoolExecutor
+        with tempfile.TemporaryDirectory(prefix='ubm_features_') as tmp_dir:
+            features_path = os.path.join(tmp_dir, 'features.npy')
+            np.save(features_path, np.ascontiguousarray(features))
+            with ProcessPoolExecutor(max_workers=min(n_jobs, n_init)) as executor:
+                futures = [executor.submit(_fit_single_init, features_path, n_components, int(seed), max_iter, tol)
+                           for seed in seeds]
+                results = [future.result() for future in futures]
+
+    for index, (gmm, elapsed) in enumerate(results):
+        print(f"UBM init {index + 1}: lower bound {gmm.lower_bound_:.4f} after "
+              f"{gmm.n_iter_} iterations ({elapsed:.2f}s)")
+    return cast_ubm(max((gmm for gmm, _ in results), key=lambda gmm: gmm.lower_bound_), dtype)
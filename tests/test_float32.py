@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+#Custom
+from benchmark import generate_corpus
+from speaker_identification import SpeakerIdentification
+
+@pytest.mark.parametrize('streaming', [False, True])
+def test_train_float32(tmp_path, streaming):
+    """Train the float32 pipeline end to end and compare its scores with float64."""
+    corpus = generate_corpus(str(tmp_path / 'corpus'), 3, 2, 3.0)
+    identifiers = {}
+    for dtype in (np.float64, np.float32):
+        # The synthetic pauses are digital silence, whose collapsed UBM
+        # components float32 cannot score; VAD keeps them out of the models
+        identifier = SpeakerIdentification(n_components=16, dtype=dtype, vad_training=True)
+        identifier.train(str(tmp_path / 'corpus'), streaming=streaming)
+        identifiers[dtype] = identifier
+
+    reference, identifier = identifiers[np.float64], identifiers[np.float32]
+    assert identifier.ubm.means_.dtype == np.float32
+    assert identifier.ubm.covariances_.dtype == np.float32
+    assert identifier.speaker_bank.dtype == np.float32
+    for _, audio_paths in corpus:
+        features = reference.select_speech(reference.extract_features(audio_paths[0]))
+        np.testing.assert_allclose(identifier.speaker_bank.score(features),
+                                   reference.speaker_bank.score(features), atol=1e-3)
+        assert identifier.identify_speaker(audio_paths[0])[0] in identifier.speaker_bank
+
+@pytest.mark.parametrize('streaming', [False, True])
+def test_train_float32_on_silence(tmp_path, streaming):
+    """UBM fits on frames of digital silence must not collapse in float32."""
+    generate_corpus(str(tmp_path / 'corpus'), 3, 2, 3.0)
+    identifier = SpeakerIdentification(n_components=16, dtype=np.float32)
+    identifier.train(str(tmp_path / 'corpus'), streaming=streaming)
+    assert identifier.ubm.means_.dtype == np.float32
+    assert len(identifier.speaker_bank) == 3
@@ -0,0 +1,28 @@
+import numpy as np
+#Custom
+from benchmark import generate_corpus
+from speaker_identification import SpeakerIdentification
+
+def test_enroll_and_save_to_loaded_directory(tmp_path):
+    """Load a model directory, change its speakers and save over the same path."""
+    generate_corpus(str(tmp_path / 'corpus'), 3, 2, 3.0)
+    extra = generate_corpus(str(tmp_path / 'extra'), 5, 2, 3.0)
+    identifier = SpeakerIdentification(n_components=8)
+    identifier.train(str(tmp_path / 'corpus'))
+    model_dir = str(tmp_path / 'models')
+    identifier.save_models(model_dir)
+
+    # The loaded arrays are memory-mapped from model_dir
+    loaded = SpeakerIdentification.load_models(model_dir)
+    loaded.enroll_speaker('speaker004', extra[4][1])
+    loaded.update_speaker('speaker001', extra[3][1][:1])
+    loaded.remove_speaker('speaker002')
+    loaded.save_models(model_dir)
+
+    reloaded = SpeakerIdentification.load_models(model_dir)
+    assert list(reloaded.speaker_bank.speaker_names) == list(loaded.speaker_bank.speaker_names)
+    assert list(reloaded.speaker_bank.speaker_names) == ['speaker000', 'speaker001', 'speaker004']
+    np.testing.assert_array_equal(reloaded.speaker_bank.means, loaded.speaker_bank.means)
+    np.testing.assert_array_equal(reloaded.speaker_bank.first_order, loaded.speaker_bank.first_order)
+    speaker, _ = reloaded.identify_speaker(extra[4][1][0])
+    assert speaker == 'speaker004'
@@ -0,0 +1,20 @@
+import numpy as np
+import pytest
+#Custom
+from benchmark import generate_corpus
+from score_normalization import ScoreNormalizer
+from speaker_identification import SpeakerIdentification
+
+def test_single_speaker_skips_normalization(tmp_path):
+    """One enrolled speaker has no impostor trials, decisions fall back to raw scores."""
+    corpus = generate_corpus(str(tmp_path / 'corpus'), 1, 2, 3.0)
+    identifier = SpeakerIdentification(n_components=8)
+    identifier.train(str(tmp_path / 'corpus'))
+
+    assert identifier.score_normalizer is None
+    speaker, scores = identifier.identify_speaker(corpus[0][1][0], normalize=True)
+    assert speaker == corpus[0][0]
+    assert np.isfinite(scores[speaker])
+
+    with pytest.raises(ValueError, match="at least two speakers"):
+        ScoreNormalizer().set_impostors({'speaker000': [np.zeros((10, 41))]})
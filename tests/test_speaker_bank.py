@@ -0,0 +1,29 @@
+import numpy as np
+#Custom
+from speaker_bank import SpeakerBank
+from speaker_index import SupervectorIndex
+
+def test_incremental_enrollment_matches_rebuild():
+    """Appended, overwritten and removed speakers score like a bank built at once."""
+    rng = np.random.RandomState(0)
+    ubm_means = rng.randn(8, 5)
+    covariances = rng.rand(8, 5) + 0.5
+    weights = np.full(8, 1 / 8)
+    bank = SpeakerBank(ubm_means, covariances, weights, ['a', 'b'], ubm_means + rng.randn(2, 8, 5))
+    index = SupervectorIndex(bank)
+    for name in 'cdefghijklmnopqrst':
+        bank.add_speaker(name, ubm_means + rng.randn(8, 5), rng.rand(8), rng.randn(8, 5))
+    bank.add_speaker('b', ubm_means + rng.randn(8, 5), rng.rand(8), rng.randn(8, 5))
+    bank.remove_speaker('e')
+    bank.add_speaker('u', ubm_means + rng.randn(8, 5))
+
+    rebuilt = SpeakerBank(ubm_means, covariances, weights, bank.speaker_names, bank.means)
+    np.testing.assert_array_equal(bank.mean_precisions, rebuilt.mean_precisions)
+    np.testing.assert_array_equal(bank.constants, rebuilt.constants)
+    assert bank.counts.shape == (len(bank), 8)
+    assert bank.get_stats('a') is None and bank.get_stats('u') is None
+    assert bank.get_stats('d') is not None
+
+    index = SupervectorIndex(bank)
+    bank.add_speaker('c', ubm_means + rng.randn(8, 5))
+    assert index.is_stale(bank)